@@ -1,513 +1,3100 @@
 # app.py - Servicio QR Scanner minimalista
 
-from flask import Flask, request, jsonify
-from PIL import Image, ImageEnhance, ImageFilter
-from pyzbar.pyzbar import decode
+from flask import (Flask, Response, g, has_request_context, request, jsonify,
+                   stream_with_context)
+from PIL import Image, ImageSequence
+from pyzbar.pyzbar import ZBarSymbol, decode
+from pylibdmtx.pylibdmtx import decode as decode_dmtx
+import atexit
 import base64
+import fcntl
+import functools
+import hashlib
 import io
+import ipaddress
+import json
 import numpy as np
+import queue
+import random
 import cv2
 import logging
+import socket
 import sys
+import os
+import tempfile
+import threading
 import time
+import urllib.parse
+import uuid
 import requests
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler,
+                              WatchedFileHandler)
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+                               Counter, Histogram, generate_latest, multiprocess)
+from requests.adapters import HTTPAdapter
+import sqlite3
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass
 from datetime import datetime
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('qr_scanner.log')
-    ]
-)
+try:
+    import zxingcpp  # backend QR opcional
+except ImportError:
+    zxingcpp = None
+
+
+# ======================================
+# 📝 LOGGING
+# ======================================
+
+# Procesos e hilos por proceso que atienden peticiones (gunicorn.conf.py los define
+# antes de importar app.py; 0 hilos = sin límite conocido, p. ej. el servidor de Flask)
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 1))
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 0))
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_DIR = os.environ.get('LOG_DIR', 'logs')
+# Archivo de log ('' = solo stdout); rotado por tamaño con un solo proceso. Con varios
+# workers cada uno solo agrega líneas y la rotación queda a cargo de logrotate
+# (WatchedFileHandler reabre el archivo cuando cambia)
+LOG_FILE = os.environ.get('LOG_FILE', os.path.join(LOG_DIR, 'qr_scanner.log'))
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+# Líneas en espera de escritura; si se llena se descartan en vez de bloquear requests
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+# text (legible) o json (una línea JSON por registro)
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+# Fracción de requests exitosas rápidas que dejan línea de resumen (errores siempre)
+LOG_SUCCESS_SAMPLE_RATE = float(os.environ.get('LOG_SUCCESS_SAMPLE_RATE', 1.0))
+# Requests más lentas que esto se registran siempre
+LOG_SLOW_REQUEST_SECONDS = float(os.environ.get('LOG_SLOW_REQUEST_SECONDS', 5))
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro; los resúmenes de request aportan sus propios campos"""
+
+    def format(self, record):
+        entry = {'ts': self.formatTime(record), 'level': record.levelname,
+                 'logger': record.name}
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Encola sin bloquear: con la cola llena el registro se descarta y se cuenta"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def _log_handlers():
+    """Handlers reales de salida, atendidos por el hilo del QueueListener"""
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        os.makedirs(os.path.dirname(LOG_FILE) or '.', exist_ok=True)
+        if SERVER_WORKERS > 1:
+            # Varios procesos rotando el mismo archivo pierden o mezclan líneas
+            handlers.append(WatchedFileHandler(LOG_FILE, encoding='utf-8'))
+        else:
+            handlers.append(RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES,
+                                                backupCount=LOG_BACKUP_COUNT, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+_log_output_handlers = _log_handlers()
+_log_queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+# El formateo real ocurre en el listener; aquí solo se resuelven los argumentos
+_log_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+_log_listener = None
+
+logging.basicConfig(level=LOG_LEVEL, handlers=[_log_queue_handler])
+
+
+def start_log_listener():
+    """Arranca el hilo que escribe los logs (de nuevo en cada worker tras el fork)"""
+    global _log_listener
+    _log_queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _log_listener = QueueListener(_log_queue_handler.queue, *_log_output_handlers,
+                                  respect_handler_level=True)
+    _log_listener.start()
+
+
+def stop_log_listener():
+    """Vacía la cola pendiente antes de salir"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+start_log_listener()
+os.register_at_fork(after_in_child=start_log_listener)
+atexit.register(stop_log_listener)
 
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+app = Flask(__name__)
+
+
+# ======================================
+# 📊 MÉTRICAS (PROMETHEUS)
+# ======================================
+
+# Con gunicorn, PROMETHEUS_MULTIPROC_DIR agrega las métricas de todos los workers
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+ATTEMPT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Endpoints que no se registran en las métricas de requests
+METRICS_EXCLUDED_ENDPOINTS = ('/metrics',)
+
+REQUESTS_TOTAL = Counter(
+    'qr_scanner_requests_total', 'Requests por endpoint y resultado',
+    ['endpoint', 'outcome'])
+REQUEST_DURATION = Histogram(
+    'qr_scanner_request_duration_seconds', 'Latencia de requests por endpoint',
+    ['endpoint'], buckets=LATENCY_BUCKETS)
+STAGE_DURATION = Histogram(
+    'qr_scanner_stage_duration_seconds',
+    'Tiempo por etapa (load, basic, ultra, multi) y simbología',
+    ['stage', 'symbology'], buckets=LATENCY_BUCKETS)
+VARIANTS_TRIED = Histogram(
+    'qr_scanner_variants_tried', 'Variantes probadas hasta el éxito',
+    ['symbology', 'stage'], buckets=ATTEMPT_BUCKETS)
+TECHNIQUE_WINS = Counter(
+    'qr_scanner_technique_wins_total', 'Técnica que logró la decodificación',
+    ['symbology', 'stage', 'technique'])
+CACHE_LOOKUPS = Counter(
+    'qr_scanner_cache_lookups_total', 'Consultas a la caché de resultados',
+    ['result'])
+
+ADMISSIONS_TOTAL = Counter(
+    'qr_scanner_admissions_total', 'Admisión de peticiones por endpoint y modo',
+    ['endpoint', 'mode'])
+QR_BACKEND_CALLS = Counter(
+    'qr_scanner_qr_backend_calls_total', 'Llamadas a cada backend QR por resultado',
+    ['backend', 'outcome'])
+QR_BACKEND_DURATION = Histogram(
+    'qr_scanner_qr_backend_duration_seconds', 'Latencia de cada llamada a un backend QR',
+    ['backend'], buckets=LATENCY_BUCKETS)
+JOBS_TOTAL = Counter(
+    'qr_scanner_jobs_total', 'Trabajos asíncronos terminados por carril y estado',
+    ['lane', 'status'])
+
+REQUEST_OUTCOMES = {200: 'ok', 202: 'accepted', 400: 'bad_request', 404: 'not_found',
+                    413: 'too_large', 429: 'rejected', 503: 'shed', 504: 'timed_out'}
+
+
+@contextmanager
+def timed_stage(stage, symbology):
+    """Mide con reloj monotónico el tiempo de una etapa de decodificación"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(stage=stage, symbology=symbology).observe(
+            time.perf_counter() - start)
+
+
+def record_decode_metrics(result):
+    """Registra cuántas variantes se probaron antes de un éxito"""
+    if result.text and not result.cached:
+        VARIANTS_TRIED.labels(symbology=result.symbology or 'auto',
+                              stage=result.stage).observe(result.attempts)
+
+
+request_logger = logging.getLogger(f'{__name__}.requests')
+
+
+def log_fields(**fields):
+    """Agrega campos a la línea de resumen de la request en curso (si la hay)"""
+    if has_request_context():
+        g.setdefault('log_fields', {}).update(fields)
+
+
+def log_decode_fields(result, **fields):
+    """Campos de resumen de una decodificación (sin el contenido decodificado)"""
+    log_fields(symbology=result.symbology, stage=result.stage, technique=result.technique,
+               attempts=result.attempts, cached=result.cached, timed_out=result.timed_out,
+               text_length=len(result.text) if result.text else 0,
+               advanced_skipped=result.advanced_skipped,
+               budget_exhausted=result.budget_exhausted, **fields)
+
+
+def log_request_summary(response, endpoint, outcome, duration):
+    """Una sola línea estructurada por request; las exitosas rápidas se muestrean"""
+    if not request_logger.isEnabledFor(logging.INFO):
+        return
+    status = response.status_code
+    degraded = g.get('degraded', False)
+    if (status < 400 and not degraded and duration < LOG_SLOW_REQUEST_SECONDS
+            and random.random() >= LOG_SUCCESS_SAMPLE_RATE):
+        return
+
+    fields = {'event': 'request', 'method': request.method, 'endpoint': endpoint,
+              'status': status, 'outcome': outcome, 'duration_ms': round(duration * 1000, 1),
+              'client_ip': request.environ.get('HTTP_X_REAL_IP', request.remote_addr)}
+    request_id = request.headers.get('X-Request-ID')
+    if request_id:
+        fields['request_id'] = request_id
+    if degraded:
+        fields['degraded'] = True
+    if status >= 400 and response.is_json:
+        error = (response.get_json(silent=True) or {}).get('error')
+        if error:
+            fields['error'] = error
+    fields.update(g.get('log_fields', {}))
+    request_logger.info('%s', json.dumps(fields, ensure_ascii=False, default=str),
+                        extra={'fields': fields})
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'desconocido'
+    if endpoint not in METRICS_EXCLUDED_ENDPOINTS and 'request_start' in g:
+        status = response.status_code
+        outcome = REQUEST_OUTCOMES.get(status, 'error' if status >= 500 else str(status))
+        duration = time.perf_counter() - g.request_start
+        REQUESTS_TOTAL.labels(endpoint=endpoint, outcome=outcome).inc()
+        REQUEST_DURATION.labels(endpoint=endpoint).observe(duration)
+        log_request_summary(response, endpoint, outcome, duration)
+    return response
+
+
+# Núcleo del filtro SHARPEN de PIL
+BASIC_SHARPEN_KERNEL = np.array([[-2, -2, -2],
+                                 [-2, 32, -2],
+                                 [-2, -2, -2]], dtype=np.float32) / 16.0
+
+
+def preprocess_image(image, graph=None):
+    """Genera a demanda las variantes básicas para mejorar detección de QR"""
+    # Los grises se comparten con la búsqueda ultra-avanzada a través del grafo;
+    # zbar convierte a grises de todos modos, así que no se prueba el color aparte
+    gray = graph.gray() if graph else _to_gray_array(image)
+    yield gray
+
+    # Aumentar contraste alrededor del brillo medio
+    mean = float(gray.mean())
+    for factor in (2.0, 3.0):
+        yield cv2.addWeighted(gray, factor, gray, 0.0, (1.0 - factor) * mean)
+
+    # Aumentar brillo
+    for factor in (1.5, 2.0):
+        yield cv2.convertScaleAbs(gray, alpha=factor)
+
+    # Aplicar nitidez
+    yield cv2.filter2D(gray, -1, BASIC_SHARPEN_KERNEL)
+
+
+# ======================================
+# ⏱️ MOTOR DE ESTRATEGIAS DE DECODIFICACIÓN
+# ======================================
+
+# Plazo por defecto (segundos) de cada decodificación; 0 desactiva el límite
+DECODE_TIMEOUT = float(os.environ.get('DECODE_TIMEOUT', 20))
+
+# Plazo máximo que un cliente puede solicitar por petición
+MAX_DECODE_TIMEOUT = float(os.environ.get('MAX_DECODE_TIMEOUT', 120))
+
+# Geometrías de frame además del original (0): giros rectos (transposición sin
+# pérdida) y 'deskew', un único warp que endereza la inclinación/perspectiva estimada
+DESKEW = 'deskew'
+RIGHT_ANGLE_ROTATIONS = {90: cv2.ROTATE_90_COUNTERCLOCKWISE, 180: cv2.ROTATE_180,
+                         270: cv2.ROTATE_90_CLOCKWISE}
+# Costo relativo (en pasadas completas sobre los píxeles) de cada geometría
+GEOMETRY_COSTS = {0: 0.0, 90: 0.2, 180: 0.2, 270: 0.2, DESKEW: 1.0}
+
+# Memoria máxima (MB) de nodos intermedios de preprocesamiento por petición
+PREPROCESS_CACHE_MB = float(os.environ.get('PREPROCESS_CACHE_MB', 128))
+
+# Límite duro de píxeles: por frame (las escalas que lo superan no se planifican)
+# y acumulado de lo que una petición materializa (nodos del grafo y salidas de las
+# técnicas; no incluye los buffers internos de los decodificadores)
+MAX_FRAME_PIXELS = int(os.environ.get('MAX_FRAME_PIXELS', 16_000_000))
+REQUEST_MAX_PIXELS = int(os.environ.get('REQUEST_MAX_PIXELS', 400_000_000))
+
+# Espacio de búsqueda por simbología: escalas, geometrías ('angles'), costo relativo
+# del decodificador y tamaño máximo de trabajo para la búsqueda ultra-avanzada
+SYMBOLOGIES = {
+    'qr': {
+        'label': 'QR',
+        'scales': (0.5, 1.0, 1.5, 2.0),
+        'angles': (0, DESKEW),
+        'decoder_cost': 3.0,
+        'max_dimension': None,
+    },
+    # libdmtx busca el símbolo en cualquier orientación y reduce la imagen por su
+    # cuenta (shrink): no hacen falta giros rectos ni la escala 0.5
+    'datamatrix': {
+        'label': 'DataMatrix',
+        'scales': (1.0, 2.0),
+        'angles': (0, DESKEW),
+        'decoder_cost': 25.0,
+        'max_dimension': 600,
+    },
+    # Un solo recorrido para QR, DataMatrix y códigos de barras zbar: cada imagen
+    # preprocesada pasa por zbar y, si no encuentra nada, por libdmtx. Misma geometría
+    # reducida que DataMatrix, y libdmtx solo en sus escalas (en el resto, solo zbar)
+    'any': {
+        'label': 'Código',
+        'scales': (1.0, 0.5, 2.0, 1.5),
+        'angles': (0, DESKEW),
+        'decoder_cost': 28.0,
+        'zbar_only_scales': (0.5, 1.5),
+        'zbar_only_cost': 3.0,
+        'max_dimension': 800,
+    },
+}
+
+# tags: familias ('deblur', 'denoise', 'contrast') que el triage puede relegar
+Technique = namedtuple('Technique', ['name', 'cost', 'func', 'tags'])
+
+# Registro de técnicas de preprocesamiento por simbología
+TECHNIQUES = {symbology: [] for symbology in SYMBOLOGIES}
+
+
+def register_technique(symbologies, name, cost, tags=()):
+    """Registra una técnica de preprocesamiento (en una o varias simbologías) con su costo estimado"""
+    if isinstance(symbologies, str):
+        symbologies = (symbologies,)
+
+    def decorator(func):
+        for symbology in symbologies:
+            TECHNIQUES[symbology].append(Technique(name, cost, func, frozenset(tags)))
+        return func
+    return decorator
+
+
+class Deadline:
+    """Plazo máximo de una petición medido con reloj monotónico"""
+
+    def __init__(self, seconds=None, started=None):
+        # started: instante (monotónico) de llegada, para descontar la espera en cola
+        self.seconds = DECODE_TIMEOUT if seconds is None else float(seconds)
+        self.expires_at = ((started or time.monotonic()) + self.seconds
+                           if self.seconds > 0 else None)
+
+    def remaining(self):
+        """Segundos restantes (None si no hay límite)"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def split(self, fraction):
+        """Sub-plazo con una fracción del tiempo restante"""
+        remaining = self.remaining()
+        if remaining is None:
+            return Deadline(0)
+        return Deadline(max(remaining * fraction, 0.001))
+
+    def capped(self, seconds):
+        """Plazo que vence con este o tras 'seconds' segundos, lo que ocurra primero"""
+        remaining = self.remaining()
+        if not seconds or (remaining is not None and remaining <= seconds):
+            return self
+        return Deadline(seconds)
+
+    def timeout_ms(self, cap_ms):
+        """Timeout en ms para una llamada nativa, acotado por el plazo restante"""
+        remaining = self.remaining()
+        if remaining is None:
+            return cap_ms
+        return max(1, min(cap_ms, int(remaining * 1000)))
+
+
+@dataclass
+class DecodeResult:
+    """Resultado de una decodificación con información del recorrido"""
+    text: str = None
+    timed_out: bool = False
+    attempts: int = 0
+    stage: str = None
+    technique: str = None
+    cached: bool = False
+    symbology: str = None
+    symbols: list = None
+    advanced_skipped: bool = False
+    budget_exhausted: bool = False
+    # Plazo (s) con el que se decodificó si DATAMATRIX_BUDGET acortó el pedido
+    effective_timeout: float = None
+
+
+# ======================================
+# 📈 ESTADÍSTICAS DE ÉXITO POR TÉCNICA
+# ======================================
+
+# Ordenamiento adaptativo según los éxitos registrados en producción
+ADAPTIVE_ORDERING = os.environ.get('ADAPTIVE_ORDERING', '1') == '1'
+
+# Archivo persistente con los conteos de éxito (compartido entre workers)
+TECHNIQUE_STATS_PATH = os.environ.get(
+    'TECHNIQUE_STATS_PATH', 'logs/technique_stats.json')
+
+# Cada cuántos segundos se vuelcan al disco los éxitos pendientes
+TECHNIQUE_STATS_FLUSH_INTERVAL = float(
+    os.environ.get('TECHNIQUE_STATS_FLUSH_INTERVAL', 30))
+
+# Suavizado de Laplace: éxitos "virtuales" que recibe cada combinación
+TECHNIQUE_STATS_PRIOR = 1.0
+
+
+class TechniqueStats:
+    """Conteo persistente de éxitos por (simbología, escala, ángulo, técnica)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.totals = {}
+        self.pending = {}
+        self.last_flush = time.monotonic()
+        self.load()
+
+    @staticmethod
+    def key(symbology, scale, angle, technique):
+        return f"{symbology}|{scale}|{angle}|{technique}"
+
+    def load(self):
+        """Carga los conteos desde disco (si existen)"""
+        try:
+            with open(self.path) as f:
+                hits = json.load(f)
+        except (OSError, ValueError):
+            hits = {}
+        with self.lock:
+            self._set_hits(hits)
+
+    def _set_hits(self, hits):
+        merged = dict(hits)
+        for key, count in self.pending.items():
+            merged[key] = merged.get(key, 0) + count
+        totals = {}
+        for key, count in merged.items():
+            symbology = key.split('|', 1)[0]
+            totals[symbology] = totals.get(symbology, 0) + count
+        self.hits, self.totals = merged, totals
+
+    def record(self, symbology, scale, angle, technique):
+        """Registra una decodificación exitosa"""
+        key = self.key(symbology, scale, angle, technique)
+        with self.lock:
+            self.hits[key] = self.hits.get(key, 0) + 1
+            self.totals[symbology] = self.totals.get(symbology, 0) + 1
+            self.pending[key] = self.pending.get(key, 0) + 1
+            due = time.monotonic() - self.last_flush >= TECHNIQUE_STATS_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def success_rate(self, symbology, scale, angle, technique, n_candidates):
+        """Probabilidad estimada de éxito de una combinación (con suavizado)"""
+        hits = self.hits.get(self.key(symbology, scale, angle, technique), 0)
+        total = self.totals.get(symbology, 0)
+        return ((hits + TECHNIQUE_STATS_PRIOR) /
+                (total + TECHNIQUE_STATS_PRIOR * n_candidates))
+
+    def top(self, symbology, limit=10):
+        """Combinaciones con más éxitos para una simbología"""
+        prefix = f"{symbology}|"
+        ranked = sorted(((count, key) for key, count in self.hits.items()
+                         if key.startswith(prefix)), reverse=True)[:limit]
+        return [dict(zip(('scale', 'angle', 'technique'),
+                         key.split('|')[1:]), hits=count)
+                for count, key in ranked]
+
+    def flush(self):
+        """Suma los éxitos pendientes al archivo persistente bajo bloqueo"""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, {}
+        try:
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path + '.lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    with open(self.path) as f:
+                        hits = json.load(f)
+                except (OSError, ValueError):
+                    hits = {}
+                for key, count in pending.items():
+                    hits[key] = hits.get(key, 0) + count
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(hits, f)
+                os.replace(tmp_path, self.path)
+            with self.lock:
+                self._set_hits(hits)
+        except OSError as e:
+            logger.warning("⚠️ No se pudieron guardar las estadísticas de técnicas: %s", e)
+            with self.lock:
+                for key, count in pending.items():
+                    self.pending[key] = self.pending.get(key, 0) + count
+
+
+technique_stats = TechniqueStats(TECHNIQUE_STATS_PATH)
+atexit.register(technique_stats.flush)
+
+
+# ======================================
+# 🧩 BACKENDS QR
+# ======================================
+
+# Backends QR en orden de prueba: zbar, opencv, opencv-aruco, zxing (los que no
+# estén disponibles en este proceso se omiten)
+QR_BACKENDS = [name.strip() for name in os.environ.get('QR_BACKENDS', 'zbar').split(',')
+               if name.strip()]
+# 'order': uno tras otro hasta el primer éxito; 'race': todos a la vez sobre el
+# mismo buffer, gana el primero que lee algo
+QR_BACKEND_MODE = os.environ.get('QR_BACKEND_MODE', 'order')
+
+# Mismos campos que los resultados de pyzbar, para que el resto del flujo no
+# distinga el backend
+QRSymbol = namedtuple('QRSymbol', ['data', 'type', 'rect', 'polygon'])
+Point = namedtuple('Point', ['x', 'y'])
+
+# Registro de backends QR: nombre -> función (imagen uint8 contigua, plazo) -> símbolos
+QR_BACKEND_REGISTRY = {}
+
+# Los detectores de OpenCV guardan estado interno: una instancia por hilo
+_opencv_detectors = threading.local()
+
+
+def register_qr_backend(name, available=True):
+    """Registra un backend QR (si su dependencia está disponible en este proceso)"""
+    def decorator(func):
+        if available:
+            QR_BACKEND_REGISTRY[name] = func
+        return func
+    return decorator
+
+
+def _qr_symbol(text, corners):
+    """Símbolo QR a partir del texto y sus cuatro esquinas"""
+    points = [Point(int(round(x)), int(round(y))) for x, y in np.reshape(corners, (-1, 2))]
+    xs, ys = [point.x for point in points], [point.y for point in points]
+    return QRSymbol(text.encode('utf-8'), 'QRCODE',
+                    (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)), points)
+
+
+@register_qr_backend('zbar')
+def _qr_backend_zbar(img, deadline):
+    # Todas las simbologías de zbar, como antes de los backends: /scan sigue
+    # devolviendo los códigos de barras que zbar reconozca
+    return decode(img)
+
+
+def _opencv_decode(name, factory, img):
+    detector = getattr(_opencv_detectors, name, None)
+    if detector is None:
+        detector = factory()
+        setattr(_opencv_detectors, name, detector)
+    found, texts, corners, _ = detector.detectAndDecodeMulti(img)
+    if not found or corners is None:
+        return []
+    return [_qr_symbol(text, points) for text, points in zip(texts, corners) if text]
+
+
+@register_qr_backend('opencv')
+def _qr_backend_opencv(img, deadline):
+    return _opencv_decode('opencv', cv2.QRCodeDetector, img)
+
+
+@register_qr_backend('opencv-aruco', available=hasattr(cv2, 'QRCodeDetectorAruco'))
+def _qr_backend_opencv_aruco(img, deadline):
+    return _opencv_decode('opencv-aruco', cv2.QRCodeDetectorAruco, img)
+
+
+@register_qr_backend('zxing', available=zxingcpp is not None)
+def _qr_backend_zxing(img, deadline):
+    results = zxingcpp.read_barcodes(img, formats=zxingcpp.BarcodeFormat.QRCode)
+    return [_qr_symbol(result.text,
+                       [(point.x, point.y) for point in (
+                           result.position.top_left, result.position.top_right,
+                           result.position.bottom_right, result.position.bottom_left)])
+            for result in results if result.valid]
+
+
+def _configured_qr_backends(names):
+    """Backends pedidos que existen en este proceso (zbar si no queda ninguno)"""
+    missing = [name for name in names if name not in QR_BACKEND_REGISTRY]
+    if missing:
+        logger.warning("⚠️ Backends QR no disponibles: %s", ', '.join(missing))
+    return [name for name in names if name in QR_BACKEND_REGISTRY] or ['zbar']
+
+
+QR_BACKEND_ORDER = _configured_qr_backends(QR_BACKENDS)
+
+
+class QRBackendStats:
+    """Llamadas, éxitos, errores, victorias y latencia acumulada por backend QR"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def _entry(self, name):
+        return self.counters.setdefault(
+            name, {'calls': 0, 'hits': 0, 'errors': 0, 'wins': 0, 'seconds': 0.0})
+
+    def record(self, name, outcome, seconds):
+        QR_BACKEND_CALLS.labels(backend=name, outcome=outcome).inc()
+        QR_BACKEND_DURATION.labels(backend=name).observe(seconds)
+        with self.lock:
+            entry = self._entry(name)
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            if outcome == 'hit':
+                entry['hits'] += 1
+            elif outcome == 'error':
+                entry['errors'] += 1
+
+    def record_win(self, name):
+        """El resultado de este backend fue el que se usó"""
+        with self.lock:
+            self._entry(name)['wins'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            counters = {name: dict(entry) for name, entry in self.counters.items()}
+        return {name: {'calls': entry['calls'], 'hits': entry['hits'],
+                       'errors': entry['errors'], 'wins': entry['wins'],
+                       'success_rate': round(entry['hits'] / entry['calls'], 4),
+                       'mean_latency_ms': round(entry['seconds'] * 1000 / entry['calls'], 2)}
+                for name, entry in counters.items() if entry['calls']}
+
+
+qr_backend_stats = QRBackendStats()
+
+
+def _run_qr_backend(name, img, deadline):
+    start = time.perf_counter()
+    try:
+        decoded = QR_BACKEND_REGISTRY[name](img, deadline)
+    except Exception as e:
+        qr_backend_stats.record(name, 'error', time.perf_counter() - start)
+        logger.debug("🔧 Backend QR %s falló: %s", name, e)
+        return []
+    qr_backend_stats.record(name, 'hit' if decoded else 'miss', time.perf_counter() - start)
+    return decoded
+
+
+def _race_qr_backends(backends, img, deadline):
+    """Corre los backends en paralelo y devuelve el primer resultado no vacío; las
+    llamadas nativas perdedoras no se pueden interrumpir y terminan en segundo plano"""
+    pool = get_pool('qr-backends', DECODE_POOL_SIZE * len(QR_BACKEND_REGISTRY))
+    futures = {pool.submit(_run_qr_backend, name, img, deadline): name for name in backends}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=deadline.remaining(),
+                             return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            decoded = future.result()
+            if decoded:
+                qr_backend_stats.record_win(futures[future])
+                for loser in pending:
+                    loser.cancel()
+                return decoded
+    return []
+
+
+def decode_qr_backends(processed, deadline, hints=None, backends=None, mode=None):
+    """Decodifica QR con los backends configurados (en orden o en carrera)"""
+    img = np.ascontiguousarray(processed)
+    backends = backends or QR_BACKEND_ORDER
+    if (mode or QR_BACKEND_MODE) == 'race' and len(backends) > 1:
+        return _race_qr_backends(backends, img, deadline)
+    for i, name in enumerate(backends):
+        if i and deadline.expired():
+            break
+        decoded = _run_qr_backend(name, img, deadline)
+        if decoded:
+            qr_backend_stats.record_win(name)
+            return decoded
+    return []
+
+
+# ======================================
+# 🔲 PARÁMETROS NATIVOS DE LIBDMTX
+# ======================================
+
+# libdmtx ya sabe submuestrear (shrink), acotar el tamaño del símbolo (min/max_edge),
+# ajustar el umbral de borde y detenerse en el primer símbolo (max_count): se usan
+# esas opciones en vez de multiplicar imágenes filtradas
+
+# Presupuesto total (segundos) de una decodificación DataMatrix, aun si el plazo de
+# la petición es mayor o ilimitado (0 = solo el plazo de la petición)
+DATAMATRIX_BUDGET = float(os.environ.get('DATAMATRIX_BUDGET', 10))
+# Fracción del presupuesto restante que puede consumir una sola llamada a libdmtx
+DMTX_CALL_SHARE = 0.25
+# Mínimo (ms) de una llamada mientras quede presupuesto
+DMTX_MIN_CALL_MS = 100
+# Lado mínimo (px) que debe conservar el símbolo tras el submuestreo; sin estimación
+# del símbolo se submuestrea hasta que la imagen quede en DMTX_WORK_DIMENSION
+DMTX_MIN_SHRUNK_EDGE = 160
+DMTX_WORK_DIMENSION = 800
+DMTX_MAX_SHRINK = 4
+# Margen de min_edge/max_edge respecto del tamaño estimado (la caja de una región
+# girada mide hasta √2 veces el lado del símbolo)
+DMTX_EDGE_TOLERANCE = 2.0
+# Umbral de borde de libdmtx (1-100, por defecto 10) para imágenes de bajo contraste
+DMTX_LOW_CONTRAST_THRESHOLD = 5
+
+# Pistas para el decodificador: lado esperado del símbolo en píxeles de la imagen a
+# decodificar (None = desconocido), si ese lado acota la búsqueda (solo en recortes
+# de una región localizada; en la imagen completa la región más fuerte podría no
+# ser el símbolo y solo se usa para elegir shrink), máximo de símbolos (None =
+# todos) y contraste bajo
+DecodeHints = namedtuple('DecodeHints', ['edge', 'bounded', 'max_count', 'low_contrast'])
+SINGLE_SYMBOL = DecodeHints(None, False, 1, False)
+
+
+def decode_hints(profile, scale=1.0, max_count=1, bounded=False):
+    """Pistas a partir del perfil de la fuente (el tamaño solo si se localizó el código)"""
+    if profile is None:
+        return DecodeHints(None, False, max_count, False)
+    edge = profile.code_size * scale if profile.code_located else None
+    return DecodeHints(edge, bounded, max_count,
+                       profile.contrast < TRIAGE_HIGH_CONTRAST / 2)
+
+
+def dmtx_options(shape, hints):
+    """Opciones nativas de libdmtx (shrink, min/max_edge, threshold, max_count)"""
+    hints = hints or DecodeHints(None, False, None, False)
+    if hints.edge:
+        shrink = int(hints.edge // DMTX_MIN_SHRUNK_EDGE)
+    else:
+        shrink = int(max(shape) // DMTX_WORK_DIMENSION)
+    options = {'shrink': max(1, min(DMTX_MAX_SHRINK, shrink))}
+    if hints.edge and hints.bounded:
+        # En píxeles de la imagen original: libdmtx los compara ya corregidos por shrink
+        options['min_edge'] = max(1, int(hints.edge / DMTX_EDGE_TOLERANCE))
+        options['max_edge'] = int(hints.edge * DMTX_EDGE_TOLERANCE)
+    if hints.low_contrast:
+        options['threshold'] = DMTX_LOW_CONTRAST_THRESHOLD
+    if hints.max_count:
+        options['max_count'] = hints.max_count
+    return options
+
+
+def dmtx_timeout_ms(deadline):
+    """Tiempo de una llamada: una fracción del presupuesto restante (no un valor fijo)"""
+    remaining = deadline.remaining()
+    if remaining is None:
+        # Plazo ilimitado: el presupuesto DataMatrix sigue acotando cada llamada
+        remaining = DATAMATRIX_BUDGET or None
+    if remaining is None:
+        return None
+    remaining_ms = int(remaining * 1000)
+    return max(1, min(remaining_ms, max(DMTX_MIN_CALL_MS, int(remaining_ms * DMTX_CALL_SHARE))))
+
+
+def datamatrix_budgeted(decode):
+    """Acota el plazo de la decodificación a DATAMATRIX_BUDGET; si eso acorta el plazo
+    pedido, el resultado informa el plazo efectivo"""
+    @functools.wraps(decode)
+    def wrapper(image, timeout=None, deadline=None, **kwargs):
+        requested = deadline or Deadline(timeout)
+        deadline = requested.capped(DATAMATRIX_BUDGET)
+        result = decode(image, deadline=deadline, **kwargs)
+        if deadline is not requested:
+            result.effective_timeout = DATAMATRIX_BUDGET
+        return result
+    return wrapper
+
+
+# Simbologías de zbar distintas de QR (NONE y PARTIAL no son simbologías: habilitar
+# NONE equivale a habilitarlas todas)
+ZBAR_BARCODE_SYMBOLS = [symbol for symbol in ZBarSymbol
+                        if symbol.name not in ('NONE', 'PARTIAL', 'QRCODE')]
+
+
+# pyzbar y pylibdmtx aceptan el buffer uint8 contiguo directamente, sin pasar por PIL
+def _decode_qr_or_barcode(processed, deadline, hints=None):
+    """QR con los backends configurados y, si no leen nada, códigos de barras con zbar
+    (si zbar es uno de los backends ya los reportó)"""
+    decoded = decode_qr_backends(processed, deadline, hints)
+    if decoded or 'zbar' in QR_BACKEND_ORDER or not ZBAR_BARCODE_SYMBOLS:
+        return decoded
+    return decode(np.ascontiguousarray(processed), symbols=ZBAR_BARCODE_SYMBOLS)
+
+
+def _decode_with_dmtx(processed, deadline, hints=None):
+    return decode_dmtx(np.ascontiguousarray(processed), timeout=dmtx_timeout_ms(deadline),
+                       **dmtx_options(processed.shape, hints))
+
+
+def _decode_with_any(processed, deadline, hints=None):
+    # zbar es mucho más barato: libdmtx solo si zbar no encontró nada
+    return (_decode_qr_or_barcode(processed, deadline, hints) or
+            _decode_with_dmtx(processed, deadline, hints))
+
+
+def _symbology_of(decoded):
+    """Simbología de un objeto decodificado (zbar informa el tipo, libdmtx no)"""
+    symbol_type = getattr(decoded, 'type', None)
+    if symbol_type is None:
+        return 'datamatrix'
+    return 'qr' if symbol_type == 'QRCODE' else symbol_type.lower()
+
+
+DECODERS = {
+    'qr': decode_qr_backends,
+    'datamatrix': _decode_with_dmtx,
+    'any': _decode_with_any,
+}
+
+
+def plan_candidates(symbology, profile=None, source_shape=None):
+    """Genera las combinaciones (escala, ángulo, técnica) ordenadas por costo esperado hasta el éxito"""
+    config = SYMBOLOGIES[symbology]
+    n_candidates = (len(config['scales']) * len(config['angles']) *
+                    len(TECHNIQUES[symbology]))
+    candidates = []
+    for scale in config['scales']:
+        if source_shape and (source_shape[0] * source_shape[1] * scale * scale >
+                             MAX_FRAME_PIXELS):
+            # Ampliar una foto de 12 MP a 2x materializaría 48 MP por frame
+            continue
+        if scale in config.get('zbar_only_scales', ()):
+            decoder_cost = config['zbar_only_cost']
+        else:
+            decoder_cost = config['decoder_cost']
+        for angle in config['angles']:
+            for technique in TECHNIQUES[symbology]:
+                cost = scale * scale * (
+                    decoder_cost + technique.cost +
+                    GEOMETRY_COSTS[angle])
+                if ADAPTIVE_ORDERING:
+                    # Costo / probabilidad de éxito: lo que gana en producción va primero
+                    cost /= technique_stats.success_rate(
+                        symbology, scale, angle, technique.name, n_candidates)
+                if profile:
+                    # Lo que el perfil de la imagen hace improbable pasa al final
+                    cost *= profile.penalty(scale, technique)
+                candidates.append((cost, len(candidates), scale, angle, technique))
+    candidates.sort(key=lambda candidate: candidate[:2])
+    return [candidate[2:] for candidate in candidates]
+
+
+def _to_gray_array(image):
+    if isinstance(image, Image.Image):
+        # convert('L') resuelve paletas (P) y descarta el alfa (LA, RGBA) como antes
+        return np.asarray(image if image.mode == 'L' else image.convert('L'))
+    img_array = np.asarray(image)
+    if len(img_array.shape) == 3:
+        return cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    return img_array
+
+
+def _limit_dimension(img_gray, max_dimension):
+    h, w = img_gray.shape
+    if not max_dimension or max(h, w) <= max_dimension:
+        return img_gray
+    ratio = max_dimension / max(h, w)
+    new_h, new_w = int(h * ratio), int(w * ratio)
+    logger.debug("📐 Imagen redimensionada para técnicas avanzadas: %sx%s", new_w, new_h)
+    return cv2.resize(img_gray, (new_w, new_h),
+                      interpolation=cv2.INTER_LANCZOS4)
+
+
+class PreprocessGraph:
+    """Nodos intermedios de preprocesamiento de una petición, calculados a demanda.
+
+    Grises, versiones reducidas, regiones candidatas, frames escalados/rotados y
+    filtros base (desenfoque, bilateral, morfología, histograma) se calculan una
+    sola vez y los reutilizan todas las variantes que dependen de ellos, también
+    entre la pasada básica y la ultra-avanzada y entre QR y DataMatrix en modo auto.
+    Si se supera PREPROCESS_CACHE_MB se descartan primero los nodos menos usados.
+
+    Con image_data (bytes) la imagen completa recién se decodifica al pedir gray();
+    los niveles reducidos de la pirámide pueden obtenerse antes sin materializarla.
+    """
+
+    def __init__(self, image=None, max_bytes=None, image_data=None, max_pixels=None):
+        self.image = image
+        self.image_data = image_data
+        self.reduction = 1
+        self.max_bytes = (PREPROCESS_CACHE_MB * 1024 * 1024
+                          if max_bytes is None else max_bytes)
+        self.max_pixels = REQUEST_MAX_PIXELS if max_pixels is None else max_pixels
+        self.nodes = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.building = {}
+        self.lock = threading.Lock()
+        self.stats = {'computed': 0, 'reused': 0, 'evicted': 0, 'allocated_bytes': 0}
+
+    def node(self, key, build):
+        """Devuelve el nodo 'key', calculándolo con build() solo si todavía no existe"""
+        while True:
+            with self.lock:
+                if key in self.nodes:
+                    self.nodes.move_to_end(key)
+                    self.stats['reused'] += 1
+                    return self.nodes[key]
+                pending = self.building.get(key)
+                if pending is None:
+                    pending = self.building[key] = threading.Event()
+                    break
+            # Otro hilo (modo paralelo) lo está calculando: esperar y reutilizarlo
+            pending.wait()
+
+        try:
+            value = build()
+            with self.lock:
+                self._store(key, value)
+            return value
+        finally:
+            with self.lock:
+                del self.building[key]
+            pending.set()
+
+    def _store(self, key, value):
+        # Las vistas y los nodos que devuelven a su padre no ocupan memoria propia
+        size = 0
+        if (isinstance(value, np.ndarray) and value.flags.owndata and
+                not any(value is other for other in self.nodes.values())):
+            size = value.nbytes
+        self.nodes[key] = value
+        self.sizes[key] = size
+        self.total_bytes += size
+        self.stats['computed'] += 1
+        self.stats['allocated_bytes'] += size
+        while self.total_bytes > self.max_bytes and len(self.nodes) > 1:
+            old_key, _ = self.nodes.popitem(last=False)
+            self.total_bytes -= self.sizes.pop(old_key)
+            self.stats['evicted'] += 1
+
+    def charge(self, value):
+        """Suma al límite de la petición un arreglo materializado fuera del grafo (la
+        salida de una técnica); las vistas y los nodos ya están contados"""
+        if not isinstance(value, np.ndarray) or not value.flags.owndata:
+            return
+        with self.lock:
+            if not any(value is other for other in self.nodes.values()):
+                self.stats['allocated_bytes'] += value.nbytes
+
+    def reserve(self, pixels):
+        """Verifica que materializar 'pixels' más no supere el límite de la petición"""
+        if self.max_pixels and self.stats['allocated_bytes'] + pixels > self.max_pixels:
+            raise PixelBudgetExceeded(
+                f"Límite de {self.max_pixels} píxeles por petición alcanzado")
+
+    def gray(self):
+        """Imagen completa en escala de grises"""
+        return self.node('gray', self._load_gray)
+
+    def _load_gray(self):
+        if self.image is not None:
+            return _to_gray_array(self.image)
+        img, self.reduction = load_image_array(self.image_data)
+        return img
+
+    def dimensions(self):
+        """(ancho, alto) de la imagen completa sin decodificarla"""
+        if self.image is not None:
+            gray = self.gray()
+            return gray.shape[1], gray.shape[0]
+        return self.node('dimensions', lambda: _image_dimensions(self.image_data))
+
+    def level(self, factor):
+        """Nivel 1/factor de la pirámide; en JPEG se decodifica reducido (DCT) sin
+        pasar por la imagen completa"""
+        def build():
+            if self.image is not None or 'gray' in self.nodes:
+                gray = self.gray()
+                return cv2.resize(gray, (max(1, gray.shape[1] // factor),
+                                         max(1, gray.shape[0] // factor)),
+                                  interpolation=cv2.INTER_AREA)
+            return load_image_array(self.image_data, factor=factor)[0]
+        return self.node(('level', factor), build)
+
+    def limited(self, max_dimension):
+        """(clave, imagen) en grises con el lado mayor acotado a max_dimension"""
+        gray = self.gray()
+        if not max_dimension or max(gray.shape) <= max_dimension:
+            return 'gray', gray
+        key = ('limit', max_dimension)
+        return key, self.node(key, lambda: _limit_dimension(gray, max_dimension))
+
+    def frame(self, source_key, source, scale, angle):
+        """Frame escalado y girado (o rectificado) de una fuente (imagen completa o recorte).
+
+        El frame 'deskew' es None si el símbolo ya está derecho, no se pudo estimar o
+        el resultado excede MAX_FRAME_PIXELS.
+        """
+        key = (source_key, scale, angle)
+
+        def build():
+            if angle == DESKEW:
+                geometry = self.geometry(source_key, source, scale)
+                if geometry is None:
+                    return None
+                homography, size = geometry
+                if size[0] * size[1] > MAX_FRAME_PIXELS:
+                    return None
+                self.reserve(size[0] * size[1])
+                return cv2.warpPerspective(self.frame(source_key, source, scale, 0).image,
+                                           homography, size, flags=cv2.INTER_LINEAR,
+                                           borderMode=cv2.BORDER_REPLICATE)
+            self.reserve(int(source.shape[0] * scale) * int(source.shape[1] * scale))
+            if angle:
+                # Giro recto: transposición/espejado, sin remuestrear ni recortar esquinas
+                return cv2.rotate(self.frame(source_key, source, scale, 0).image,
+                                  RIGHT_ANGLE_ROTATIONS[angle])
+            if scale != 1.0:
+                h, w = source.shape
+                return cv2.resize(source, (int(w * scale), int(h * scale)),
+                                  interpolation=cv2.INTER_CUBIC)
+            return source
+
+        return FrameView(self, key, self.node(key, build))
+
+    def geometry(self, source_key, source, scale):
+        """(homografía, tamaño) que endereza el símbolo del frame a esa escala, o None.
+
+        Se estima una sola vez por fuente, sobre una versión acotada, y se lleva a
+        cada escala.
+        """
+        def estimate():
+            work = _limit_dimension(source, DESKEW_WORK_DIMENSION)
+            return estimate_rectification(work), work.shape[1] / source.shape[1]
+
+        geometry, factor = self.node((source_key, 'geometry'), estimate)
+        if geometry is None:
+            return None
+        homography, (width, height) = geometry
+        ratio = scale / factor
+        to_frame = np.diag([ratio, ratio, 1.0])
+        return (to_frame @ homography @ np.diag([1 / ratio, 1 / ratio, 1.0]),
+                (int(round(width * ratio)), int(round(height * ratio))))
+
+    def frame_to_source(self, source_key, source, scale, angle):
+        """Matriz 3x3 que lleva coordenadas del frame a las de la fuente"""
+        h, w = source.shape
+        scaled_h, scaled_w = self.frame(source_key, source, scale, 0).image.shape
+        matrix = np.diag([w / scaled_w, h / scaled_h, 1.0])
+        if angle == DESKEW:
+            return matrix @ np.linalg.inv(self.geometry(source_key, source, scale)[0])
+        if angle == 90:
+            return matrix @ np.array([[0, -1, scaled_w], [1, 0, 0], [0, 0, 1]], dtype=np.float64)
+        if angle == 180:
+            return matrix @ np.array([[-1, 0, scaled_w], [0, -1, scaled_h], [0, 0, 1]],
+                                     dtype=np.float64)
+        if angle == 270:
+            return matrix @ np.array([[0, 1, 0], [-1, 0, scaled_h], [0, 0, 1]], dtype=np.float64)
+        return matrix
+
+
+class PixelBudgetExceeded(Exception):
+    """La petición alcanzó su límite de píxeles materializados"""
+
+
+class FrameView:
+    """Frame del grafo sobre el que trabaja una técnica"""
+    __slots__ = ('graph', 'key', 'image')
+
+    def __init__(self, graph, key, image):
+        self.graph = graph
+        self.key = key
+        self.image = image
+
+    def derive(self, name, build):
+        """Filtro base 'name' del frame (build recibe la imagen), calculado una sola vez"""
+        return self.graph.node(self.key + (name,), lambda: build(self.image))
+
+
+def _attempt_candidate(graph, source_key, source, symbology, candidate, deadline,
+                       max_count=1, bounded=False):
+    """Aplica una técnica sobre el frame (escala, ángulo) y la decodifica"""
+    scale, angle, technique = candidate
+    try:
+        view = graph.frame(source_key, source, scale, angle)
+        if view.image is None:
+            # Geometría sin efecto (p. ej. el símbolo ya está derecho)
+            return None
+        # La salida de una técnica mide como su frame: también cuenta para el límite
+        graph.reserve(view.image.size)
+        processed = technique.func(view)
+        if processed is None:
+            # Variante descartada (p. ej. umbral casi idéntico a otro ya probado)
+            return None
+        graph.charge(processed)
+        hints = decode_hints(image_profile(graph, source_key, source), scale, max_count,
+                             bounded)
+        decoder = DECODERS[symbology]
+        if scale in SYMBOLOGIES[symbology].get('zbar_only_scales', ()):
+            decoder = _decode_qr_or_barcode
+        return decoder(processed, deadline, hints)
+    except PixelBudgetExceeded:
+        # No es una falla de la técnica: las siguientes tampoco tendrían memoria
+        raise
+    except Exception as e:
+        logger.debug("🔧 Técnica %s falló: %s", technique.name, e)
+        return None
+
+
+def _record_success(result, symbology, candidate, decoded_objects, area=None):
+    scale, angle, technique = candidate
+    result.text = decoded_objects[0].data.decode('utf-8')
+    if symbology == 'any':
+        result.symbology = _symbology_of(decoded_objects[0])
+    result.technique = f"escala={scale} ángulo={angle} técnica={technique.name}"
+    if area:
+        result.technique = f"{area} {result.technique}"
+    technique_stats.record(symbology, scale, angle, technique.name)
+    TECHNIQUE_WINS.labels(symbology, 'ultra', technique.name).inc()
+    logger.debug(
+        "🎯 %s encontrado con %s (intento #%s)",
+        SYMBOLOGIES[symbology]['label'], result.technique, result.attempts)
+
+
+def _search_image(graph, source_key, img_gray, symbology, deadline, parallel, result,
+                  area=None):
+    """Recorre el plan de candidatos sobre una imagen (completa o recorte) actualizando el resultado"""
+    def attempt(candidate):
+        return _attempt_candidate(graph, source_key, img_gray, symbology,
+                                  candidate, deadline, bounded=area is not None)
+
+    plan = plan_candidates(symbology, image_profile(graph, source_key, img_gray),
+                           img_gray.shape)
+    try:
+        if parallel and DECODE_POOL_SIZE > 1:
+            _parallel_search(plan, attempt, symbology, deadline, result, area)
+        else:
+            for candidate in plan:
+                if deadline.expired():
+                    result.timed_out = True
+                    break
+                result.attempts += 1
+                decoded_objects = attempt(candidate)
+                if decoded_objects:
+                    _record_success(result, symbology, candidate, decoded_objects, area)
+                    break
+    except PixelBudgetExceeded as e:
+        result.budget_exhausted = True
+        logger.warning("🧮 Búsqueda interrumpida tras %s intentos: %s", result.attempts, e)
+
+
+def run_strategy_search(image, symbology, deadline=None, parallel=None, graph=None):
+    """Ejecuta las técnicas registradas de la más barata a la más cara hasta decodificar o agotar el plazo"""
+    deadline = deadline or Deadline()
+    parallel = PARALLEL_DECODE if parallel is None else parallel
+    graph = graph or PreprocessGraph(image)
+    config = SYMBOLOGIES[symbology]
+    result = DecodeResult(stage='ultra', symbology=symbology)
+
+    # Primero las regiones candidatas, a resolución nativa y con parte del plazo
+    for area, source_key, crop, _ in localized_crops(graph, config['max_dimension']):
+        _search_image(graph, source_key, crop, symbology,
+                      deadline.split(LOCALIZATION_BUDGET_FRACTION), parallel, result, area)
+        if result.text or result.budget_exhausted:
+            return result
+        result.timed_out = False
+        if deadline.expired():
+            result.timed_out = True
+            break
+
+    if not result.timed_out:
+        source_key, img_gray = graph.limited(config['max_dimension'])
+        _search_image(graph, source_key, img_gray, symbology, deadline, parallel, result)
+
+    if result.timed_out:
+        logger.debug(
+            "⏱️ Plazo de %.1fs agotado tras %s intentos (%s)",
+            deadline.seconds, result.attempts, config['label'])
+    return result
+
+
+# ======================================
+# 🧵 EJECUCIÓN PARALELA DE VARIANTES
+# ======================================
+
+# Modo paralelo opt-in (también puede pedirse por llamada con 'parallel')
+PARALLEL_DECODE = os.environ.get('PARALLEL_DECODE', '0') == '1'
+
+# Hilos del pool compartido por todas las peticiones del proceso; OpenCV, zbar y
+# libdmtx liberan el GIL, así que los hilos aprovechan varios núcleos
+DECODE_POOL_SIZE = int(os.environ.get(
+    'DECODE_POOL_SIZE', min(4, os.cpu_count() or 1)))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, size):
+    """Pool de hilos con nombre (se crea de forma perezosa en cada proceso)"""
+    with _pools_lock:
+        pid, pool = _pools.get(name, (None, None))
+        if pool is None or pid != os.getpid():
+            pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix=name)
+            _pools[name] = (os.getpid(), pool)
+        return pool
+
+
+def get_decode_pool():
+    """Pool de hilos de decodificación compartido por todas las peticiones"""
+    return get_pool('decode', DECODE_POOL_SIZE)
+
+
+def _parallel_search(plan, attempt, symbology, deadline, result, area=None):
+    """Reparte los candidatos en el pool y cancela el resto con el primer éxito"""
+    pool = get_decode_pool()
+    stop = threading.Event()
+    counter_lock = threading.Lock()
+
+    def run(candidate):
+        if stop.is_set() or deadline.expired():
+            return None
+        with counter_lock:
+            result.attempts += 1
+        return attempt(candidate)
+
+    # Ventana acotada para no encolar cientos de tareas por petición
+    window = DECODE_POOL_SIZE * 2
+    candidates = iter(plan)
+    pending = {}
+    try:
+        while True:
+            while len(pending) < window and not stop.is_set():
+                candidate = next(candidates, None)
+                if candidate is None:
+                    break
+                pending[pool.submit(run, candidate)] = candidate
+            if not pending:
+                break
+
+            done, _ = wait(pending, timeout=deadline.remaining(),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                result.timed_out = True
+                break
+            for future in done:
+                candidate = pending.pop(future)
+                decoded_objects = future.result()
+                if decoded_objects and not stop.is_set():
+                    stop.set()
+                    _record_success(result, symbology, candidate, decoded_objects, area)
+            if stop.is_set():
+                break
+            if deadline.expired():
+                result.timed_out = True
+                break
+    finally:
+        stop.set()
+        for future in pending:
+            future.cancel()
+
+
+# ======================================
+# 🎯 LOCALIZACIÓN DE SÍMBOLOS
+# ======================================
+
+# Propone regiones candidatas y busca primero en esos recortes a resolución nativa
+LOCALIZATION_ENABLED = os.environ.get('LOCALIZATION_ENABLED', '1') == '1'
+# Solo se localiza en imágenes cuyo lado mayor supera este tamaño
+LOCALIZATION_MIN_DIMENSION = int(os.environ.get('LOCALIZATION_MIN_DIMENSION', 800))
+LOCALIZATION_MAX_REGIONS = int(os.environ.get('LOCALIZATION_MAX_REGIONS', 4))
+# Fracción del plazo restante que puede consumir cada región
+LOCALIZATION_BUDGET_FRACTION = float(
+    os.environ.get('LOCALIZATION_BUDGET_FRACTION', 0.25))
+# Tamaño de la miniatura sobre la que se calcula la densidad de gradiente
+LOCALIZATION_WORK_DIMENSION = 640
+# Margen agregado alrededor de cada región (relativo a su lado mayor)
+LOCALIZATION_PADDING = 0.15
+
+LOCALIZATION_CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+LOCALIZATION_OPEN_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
+
+def locate_candidate_regions(img_gray, max_regions=None):
+    """Propone regiones (x, y, w, h) con alta densidad de bordes en ambas direcciones"""
+    max_regions = max_regions or LOCALIZATION_MAX_REGIONS
+    h, w = img_gray.shape
+    ratio = min(1.0, LOCALIZATION_WORK_DIMENSION / max(h, w))
+    if ratio < 1.0:
+        small = cv2.resize(img_gray, (max(1, int(w * ratio)), max(1, int(h * ratio))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = img_gray
+
+    # Los códigos 2D tienen bordes fuertes tanto horizontales como verticales
+    energy_x = cv2.blur(cv2.convertScaleAbs(cv2.Sobel(small, cv2.CV_16S, 1, 0)), (9, 9))
+    energy_y = cv2.blur(cv2.convertScaleAbs(cv2.Sobel(small, cv2.CV_16S, 0, 1)), (9, 9))
+    density = cv2.min(energy_x, energy_y)
+    _, mask = cv2.threshold(density, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, LOCALIZATION_CLOSE_KERNEL)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, LOCALIZATION_OPEN_KERNEL)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    small_area = small.shape[0] * small.shape[1]
+    scored = []
+    for contour in contours:
+        x, y, cw, ch = cv2.boundingRect(contour)
+        if min(cw, ch) < 12 or not 0.25 <= cw / ch <= 4.0:
+            continue
+        if cw * ch > 0.8 * small_area:
+            continue
+        fill = cv2.contourArea(contour) / float(cw * ch)
+        score = float(density[y:y + ch, x:x + cw].mean()) * fill
+        scored.append((score, x, y, cw, ch))
+    scored.sort(reverse=True)
+
+    regions = []
+    for _, x, y, cw, ch in scored[:max_regions]:
+        pad = LOCALIZATION_PADDING * max(cw, ch)
+        x0, y0 = max(0, int((x - pad) / ratio)), max(0, int((y - pad) / ratio))
+        x1 = min(w, int((x + cw + pad) / ratio))
+        y1 = min(h, int((y + ch + pad) / ratio))
+        regions.append((x0, y0, x1 - x0, y1 - y0))
+    return regions
+
+
+def localized_crops(graph, max_dimension=None):
+    """Recortes (etiqueta, clave, imagen, región) de las regiones candidatas de una imagen grande"""
+    img_gray = graph.gray()
+    if not LOCALIZATION_ENABLED or max(img_gray.shape) <= LOCALIZATION_MIN_DIMENSION:
+        return []
+    try:
+        regions = graph.node('regions', lambda: locate_candidate_regions(img_gray))
+    except cv2.error as e:
+        logger.debug("🔧 Localización falló: %s", e)
+        return []
+    if regions:
+        logger.debug("🎯 %s regiones candidatas localizadas", len(regions))
+
+    crops = []
+    for region in regions:
+        x, y, w, h = region
+        crop = img_gray[y:y + h, x:x + w]
+        key = ('crop', region)
+        if max_dimension and max(w, h) > max_dimension:
+            key = ('crop', region, max_dimension)
+            crop = graph.node(key, lambda crop=crop: _limit_dimension(crop, max_dimension))
+        crops.append((f"región=({x},{y},{w},{h})", key, crop, region))
+    return crops
+
+
+# ======================================
+# 📐 RECTIFICACIÓN GEOMÉTRICA
+# ======================================
+
+# Se estima la inclinación/perspectiva real del símbolo (patrones de posición del
+# QR, contorno del bloque de módulos o el borde en L del DataMatrix, y como último
+# recurso la orientación dominante de los bordes) y se endereza con un solo warp
+# Inclinación mínima (grados) que justifica un warp
+DESKEW_MIN_ANGLE = float(os.environ.get('DESKEW_MIN_ANGLE', 0.5))
+# Zona de silencio agregada alrededor del símbolo rectificado (relativa a su lado)
+DESKEW_MARGIN = 0.15
+# Área mínima del contorno del símbolo (relativa a la imagen)
+DESKEW_MIN_AREA = 0.01
+# Lado mayor de la versión sobre la que se estima la geometría
+DESKEW_WORK_DIMENSION = 1024
+
+
+def _order_corners(points):
+    """Esquinas en orden horario desde la más cercana al origen (arriba-izquierda)"""
+    points = np.asarray(points, dtype=np.float32).reshape(4, 2)
+    center = points.mean(axis=0)
+    angles = np.arctan2(points[:, 1] - center[1], points[:, 0] - center[0])
+    points = points[np.argsort(angles)]
+    return np.roll(points, -int(np.argmin(points.sum(axis=1))), axis=0)
+
+
+def _plausible_quad(quad, shape):
+    """Cuadrilátero convexo, de área razonable y con las esquinas dentro de la imagen"""
+    if quad is None:
+        return False
+    h, w = shape
+    quad = np.asarray(quad, dtype=np.float32).reshape(4, 2)
+    inside = ((quad[:, 0] >= -0.05 * w) & (quad[:, 0] <= 1.05 * w) &
+              (quad[:, 1] >= -0.05 * h) & (quad[:, 1] <= 1.05 * h))
+    return (bool(inside.all()) and cv2.isContourConvex(_order_corners(quad)) and
+            cv2.contourArea(quad) >= DESKEW_MIN_AREA * h * w)
+
+
+def _finder_pattern_quad(img_gray):
+    """Esquinas de un QR a partir de sus patrones de posición (aunque no se pueda decodificar)"""
+    try:
+        found, points = cv2.QRCodeDetector().detect(img_gray)
+    except cv2.error:
+        return None
+    if not found or points is None or cv2.contourArea(points.reshape(4, 2)) <= 0:
+        return None
+    return points.reshape(4, 2)
+
+
+def _border_quad(img_gray):
+    """Cuadrilátero del bloque de módulos tras cerrar los huecos entre ellos"""
+    _, binary = cv2.threshold(img_gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    size = max(3, min(img_gray.shape) // 40)
+    closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE,
+                              cv2.getStructuringElement(cv2.MORPH_RECT, (size, size)))
+    contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    areas = [(cv2.contourArea(contour), contour) for contour in contours]
+    areas = [(area, contour) for area, contour in areas
+             if DESKEW_MIN_AREA * img_gray.size <= area < 0.9 * img_gray.size]
+    if not areas:
+        return None
+    hull = cv2.convexHull(max(areas, key=lambda entry: entry[0])[1])
+    quad = cv2.approxPolyDP(hull, 0.04 * cv2.arcLength(hull, True), True)
+    if len(quad) == 4:
+        return quad.reshape(4, 2)
+    # Borde irregular: el rectángulo rotado mínimo conserva al menos la inclinación
+    return cv2.boxPoints(cv2.minAreaRect(hull))
+
+
+def _dominant_skew(img_gray):
+    """Inclinación dominante de los bordes en grados, en (-45, 45]"""
+    # Scharr sobre la imagen suavizada: la dirección del gradiente casi no depende
+    # de la orientación respecto de la grilla de píxeles
+    smooth = cv2.GaussianBlur(img_gray, (0, 0), 1.0)
+    gx = cv2.Scharr(smooth, cv2.CV_32F, 1, 0).ravel()
+    gy = cv2.Scharr(smooth, cv2.CV_32F, 0, 1).ravel()
+    magnitude = np.hypot(gx, gy)
+    angle = np.degrees(np.arctan2(gy, gx)) % 90
+    hist = np.bincount(angle.astype(np.int32) % 90, weights=magnitude, minlength=90)
+    peak = np.argmax(hist) + 0.5
+    # Refinamiento subgrado: promedio ponderado de las direcciones cercanas al pico
+    offset = (angle - peak + 45) % 90 - 45
+    near = np.abs(offset) < 1.5
+    if not magnitude[near].any():
+        return 0.0
+    skew = peak + np.average(offset[near], weights=magnitude[near])
+    return skew if skew <= 45 else skew - 90
+
+
+def _quad_homography(quad):
+    """Homografía que lleva el cuadrilátero a un rectángulo recto con zona de silencio"""
+    tl, tr, br, bl = _order_corners(quad)
+    width = max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))
+    height = max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))
+    margin = DESKEW_MARGIN * max(width, height)
+    target = np.array([[margin, margin], [margin + width, margin],
+                       [margin + width, margin + height], [margin, margin + height]],
+                      dtype=np.float32)
+    homography = cv2.getPerspectiveTransform(np.array([tl, tr, br, bl]), target)
+    size = (int(round(width + 2 * margin)), int(round(height + 2 * margin)))
+    return homography, size
+
+
+def _rotation_homography(shape, skew):
+    """Giro que anula la inclinación, con el lienzo ampliado para no recortar esquinas"""
+    h, w = shape
+    rotation = cv2.getRotationMatrix2D((w / 2, h / 2), skew, 1.0)
+    cos, sin = abs(rotation[0, 0]), abs(rotation[0, 1])
+    size = (int(round(h * sin + w * cos)), int(round(h * cos + w * sin)))
+    rotation[:, 2] += (size[0] / 2 - w / 2, size[1] / 2 - h / 2)
+    return np.vstack([rotation, [0, 0, 1]]), size
+
+
+def estimate_rectification(img_gray):
+    """(homografía, tamaño) que endereza el símbolo, o None si ya está derecho"""
+    # Un detector engañado por otro patrón puede dar esquinas absurdas: se descartan
+    quad = _finder_pattern_quad(img_gray)
+    if not _plausible_quad(quad, img_gray.shape):
+        quad = _border_quad(img_gray)
+    if _plausible_quad(quad, img_gray.shape):
+        homography, size = _quad_homography(quad)
+    else:
+        skew = _dominant_skew(img_gray)
+        homography, size = _rotation_homography(img_gray.shape, skew)
+
+    # Sin inclinación ni perspectiva apreciables el frame original ya cubre el caso
+    tolerance = np.tan(np.radians(DESKEW_MIN_ANGLE))
+    linear = homography[:2, :2] / homography[2, 2]
+    if (abs(linear[0, 1]) < tolerance and abs(linear[1, 0]) < tolerance and
+            np.abs(homography[2, :2]).max() < 1e-4):
+        return None
+    return homography, size
+
+
+# ======================================
+# 🩺 TRIAGE POR ESTADÍSTICAS DE LA IMAGEN
+# ======================================
+
+# Reordena el plan según un perfil barato de la imagen (nitidez, contraste, brillo,
+# ruido y tamaño estimado del código): lo improbable no se descarta, va al final
+TRIAGE_ENABLED = os.environ.get('TRIAGE_ENABLED', '1') == '1'
+# Factor por el que se multiplica el costo de cada motivo para relegar un candidato
+TRIAGE_DEMOTION = float(os.environ.get('TRIAGE_DEMOTION', 25))
+# Tamaño de la miniatura sobre la que se calculan las estadísticas
+TRIAGE_WORK_DIMENSION = 512
+# Varianza del Laplaciano a partir de la cual la imagen se considera nítida
+TRIAGE_SHARP_VARIANCE = float(os.environ.get('TRIAGE_SHARP_VARIANCE', 300))
+# Rango p5-p95 de intensidades a partir del cual el contraste es suficiente
+TRIAGE_HIGH_CONTRAST = float(os.environ.get('TRIAGE_HIGH_CONTRAST', 120))
+# Desvío estimado del ruido por debajo del cual la imagen se considera limpia
+TRIAGE_CLEAN_NOISE = float(os.environ.get('TRIAGE_CLEAN_NOISE', 3.0))
+# Brillo medio fuera de este rango: imagen sub/sobreexpuesta
+TRIAGE_BRIGHTNESS_RANGE = (50, 205)
+# Tamaño del código (px): desde LARGE no se amplía, bajo SMALL no se reduce
+TRIAGE_LARGE_CODE = int(os.environ.get('TRIAGE_LARGE_CODE', 400))
+TRIAGE_SMALL_CODE = int(os.environ.get('TRIAGE_SMALL_CODE', 160))
+
+# Estimación rápida del ruido (Immerkær): responde al ruido pero no a bordes suaves
+NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+
+@dataclass
+class ImageProfile:
+    """Estadísticas baratas de una imagen y las familias de técnicas que relega"""
+    sharpness: float
+    contrast: float
+    brightness: float
+    noise: float
+    code_size: int
+    demoted_tags: frozenset = frozenset()
+    # code_size viene de una región localizada (si no, es el tamaño de la imagen)
+    code_located: bool = False
+
+    def penalty(self, scale, technique):
+        """Multiplicador de costo: TRIAGE_DEMOTION por cada motivo para relegar el candidato"""
+        reasons = len(self.demoted_tags.intersection(technique.tags))
+        if scale > 1.0 and self.code_size >= TRIAGE_LARGE_CODE:
+            reasons += 1
+        if scale < 1.0 and self.code_size * scale < TRIAGE_SMALL_CODE:
+            reasons += 1
+        return TRIAGE_DEMOTION ** reasons
+
+
+def analyze_image(img_gray):
+    """Perfil de la imagen calculado sobre una miniatura"""
+    h, w = img_gray.shape
+    ratio = min(1.0, TRIAGE_WORK_DIMENSION / max(h, w))
+    if ratio < 1.0:
+        small = cv2.resize(img_gray, (max(3, int(w * ratio)), max(3, int(h * ratio))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = img_gray
+
+    sharpness = float(cv2.Laplacian(small, cv2.CV_64F).var())
+    sh, sw = small.shape
+    noise = float(np.abs(cv2.filter2D(small.astype(np.float32), -1, NOISE_KERNEL)).sum() *
+                  np.sqrt(0.5 * np.pi) / (6.0 * max(1, sw - 2) * max(1, sh - 2)))
+
+    # Tamaño del código: la región candidata más fuerte o, si no hay, la imagen entera;
+    # contraste y brillo se miden sobre esa región y no sobre el fondo
+    code_size = max(h, w)
+    code_area = small
+    try:
+        regions = locate_candidate_regions(small, max_regions=1)
+    except cv2.error:
+        regions = []
+    if regions:
+        rx, ry, rw, rh = regions[0]
+        code_size = int(max(rw, rh) / (1 + 2 * LOCALIZATION_PADDING) / ratio)
+        code_area = small[ry:ry + rh, rx:rx + rw]
+    low, high = np.percentile(code_area, (5, 95))
+    brightness = float(code_area.mean())
+
+    clean = noise <= TRIAGE_CLEAN_NOISE
+    demoted = set()
+    if clean:
+        demoted.add('denoise')
+        if sharpness >= TRIAGE_SHARP_VARIANCE:
+            demoted.add('deblur')
+    dark, bright = TRIAGE_BRIGHTNESS_RANGE
+    if high - low >= TRIAGE_HIGH_CONTRAST and dark <= brightness <= bright:
+        demoted.add('contrast')
+
+    profile = ImageProfile(round(sharpness, 1), float(high - low), round(brightness, 1),
+                           round(noise, 2), code_size, frozenset(demoted),
+                           code_located=bool(regions))
+    logger.debug(
+        "🩺 Perfil: nitidez=%s contraste=%.0f brillo=%s ruido=%s código≈%spx → relegadas: %s",
+        profile.sharpness, profile.contrast, profile.brightness, profile.noise, code_size,
+        ', '.join(sorted(demoted)) or 'ninguna')
+    return profile
+
+
+def image_profile(graph, source_key, source):
+    """Perfil de una fuente del grafo (imagen completa o recorte), calculado una sola vez"""
+    if not TRIAGE_ENABLED:
+        return None
+    return graph.node((source_key, 'profile'), lambda: analyze_image(source))
+
+
+# ======================================
+# 🧪 TÉCNICAS DE PREPROCESAMIENTO
+# ======================================
+
+# Umbralización global: un histograma por frame y umbrales lo más distintos posible
+BINARIZATION_PERCENTILES = (25, 50, 75)
+BINARIZATION_LEVELS = (('otsu', 'otsu_low', 'otsu_high') +
+                       tuple(f'percentile_{pct}' for pct in BINARIZATION_PERCENTILES))
+
+# Fracción mínima de píxeles que debe cambiar entre dos umbrales para probar ambos
+BINARIZATION_MIN_DIFFERENCE = float(os.environ.get('BINARIZATION_MIN_DIFFERENCE', 0.02))
+
+# Técnicas QR (costo relativo sin contar el decodificador)
+UNSHARP_QR_KERNEL = (5, 5)
+SHARPEN_EXTREME_KERNEL = np.array([[-1, -1, -1, -1, -1],
+                                   [-1, 2, 2, 2, -1],
+                                   [-1, 2, 8, 2, -1],
+                                   [-1, 2, 2, 2, -1],
+                                   [-1, -1, -1, -1, -1]]) / 8.0
+CLAHE_QR = cv2.createCLAHE(clipLimit=5.0, tileGridSize=(4, 4))
+
+
+# Filtros base compartidos por varias técnicas (y entre simbologías) vía FrameView.derive
+def _gaussian_5x5(frame):
+    return cv2.GaussianBlur(frame, UNSHARP_QR_KERNEL, 0)
+
+
+def _bilateral(frame):
+    return cv2.bilateralFilter(frame, 9, 75, 75)
+
+
+def _histogram(frame):
+    return cv2.calcHist([frame], [0], None, [256], [0, 256]).ravel()
+
+
+def _otsu_level(hist):
+    """Umbral de Otsu calculado sobre un histograma ya existente"""
+    # Conteos acumulados en float64: exactos, así la última clase vacía vale 0 y no ~1e-8
+    counts = np.cumsum(hist, dtype=np.float64)
+    sums = np.cumsum(hist * np.arange(256), dtype=np.float64)
+    total, total_sum = counts[-1], sums[-1]
+    valid = (counts > 0) & (counts < total)
+    if not valid.any():
+        return 0
+    between = np.zeros(256)
+    c, s = counts[valid], sums[valid]
+    between[valid] = (total_sum * c - total * s) ** 2 / (c * (total - c))
+    return int(np.argmax(between))
+
+
+def _multi_otsu_levels(hist):
+    """Dos umbrales de Otsu multinivel (3 clases), evaluando todos los pares a la vez"""
+    counts = np.cumsum(hist, dtype=np.float64)
+    sums = np.cumsum(hist * np.arange(256), dtype=np.float64)
+    # Clases [0, t1], (t1, t2] y (t2, 255]: se maximiza la suma de masa·media² por clase
+    w0, m0 = counts[:, None], sums[:, None]
+    w1, m1 = counts[None, :] - w0, sums[None, :] - m0
+    w2, m2 = counts[-1] - counts[None, :], sums[-1] - sums[None, :]
+    valid = (w0 > 0) & (w1 > 0) & (w2 > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = np.where(valid, m0 ** 2 / w0 + m1 ** 2 / w1 + m2 ** 2 / w2, -1.0)
+    between[np.tril_indices(256)] = -1.0
+    low, high = np.unravel_index(np.argmax(between), between.shape)
+    return int(low), int(high)
+
+
+def _binarization_levels(hist):
+    """Umbrales (nombre -> nivel) en orden de prioridad, descartando los casi idénticos"""
+    total = hist.sum()
+    if not total:
+        return {}
+    cdf = np.cumsum(hist) / total
+    low, high = _multi_otsu_levels(hist)
+    proposals = [('otsu', _otsu_level(hist)), ('otsu_low', low), ('otsu_high', high)]
+    proposals += [(f'percentile_{pct}', int(np.searchsorted(cdf, pct / 100)))
+                  for pct in BINARIZATION_PERCENTILES]
+
+    chosen = {}
+    for name, level in proposals:
+        # Una imagen casi toda blanca o negra no tiene módulos que decodificar
+        if not BINARIZATION_MIN_DIFFERENCE <= cdf[level] <= 1 - BINARIZATION_MIN_DIFFERENCE:
+            continue
+        # Entre los umbrales a < b solo cambian los píxeles con valor en (a, b]
+        if all(abs(cdf[level] - cdf[other]) >= BINARIZATION_MIN_DIFFERENCE
+               for other in chosen.values()):
+            chosen[name] = level
+    return chosen
+
+
+def _binarize(frame, levels):
+    """Todas las umbralizaciones del frame en una sola pasada vectorizada (k, alto, ancho)"""
+    thresholds = np.array(list(levels.values()))
+    luts = np.where(np.arange(256)[None, :] > thresholds[:, None], 255, 0).astype(np.uint8)
+    return luts[:, frame]
+
+
+def _binarization(name):
+    def technique(view):
+        hist = view.derive('histogram', _histogram)
+        levels = view.derive('binarization_levels', lambda frame: _binarization_levels(hist))
+        if name not in levels:
+            return None
+        binaries = view.derive('binarizations', lambda frame: _binarize(frame, levels))
+        return binaries[list(levels).index(name)]
+    return technique
+
+
+BINARIZATIONS = {name: _binarization(name) for name in BINARIZATION_LEVELS}
+
+
+@register_technique(('qr', 'any'), 'original', 0.0)
+def _qr_original(view):
+    return view.image
+
+
+@register_technique(('qr', 'any'), 'unsharp', 1.0, tags=('deblur',))
+def _qr_unsharp(view):
+    # uint8 satura en addWeighted/filter2D, no hace falta recortar ni convertir
+    blurred = view.derive('gaussian_5x5', _gaussian_5x5)
+    return cv2.addWeighted(view.image, 2.0, blurred, -1.0, 0)
+
+
+@register_technique(('qr', 'any'), 'bilateral', 8.0, tags=('denoise',))
+def _qr_bilateral(view):
+    return view.derive('bilateral', _bilateral)
+
+
+@register_technique(('qr', 'any'), 'sharpen_extreme', 1.5, tags=('deblur',))
+def _qr_sharpen_extreme(view):
+    return cv2.filter2D(view.image, -1, SHARPEN_EXTREME_KERNEL)
+
+
+for _name in BINARIZATION_LEVELS:
+    register_technique(('qr', 'any'), _name, 0.2)(BINARIZATIONS[_name])
+
+
+@register_technique(('qr', 'any'), 'clahe', 1.5, tags=('contrast',))
+def _qr_clahe(view):
+    return CLAHE_QR.apply(view.image)
+
+
+def _morphology(operation, kernel_size):
+    kernel = np.ones(kernel_size, np.uint8)
+    name = f"morph_{operation}_{kernel_size[0]}x{kernel_size[1]}"
+
+    def technique(view):
+        return view.derive(name, lambda frame: cv2.morphologyEx(frame, operation, kernel))
+    return technique
+
 
+for _kernel_size, _cost in (((2, 2), 0.5), ((3, 3), 0.8)):
+    _suffix = f"{_kernel_size[0]}x{_kernel_size[1]}"
+    register_technique(('qr', 'any'), f'opening_{_suffix}', _cost, tags=('denoise',))(
+        _morphology(cv2.MORPH_OPEN, _kernel_size))
+    register_technique(('qr', 'any'), f'closing_{_suffix}', _cost, tags=('denoise',))(
+        _morphology(cv2.MORPH_CLOSE, _kernel_size))
 
-def preprocess_image(image):
-    """Aplica múltiples técnicas para mejorar detección de QR"""
-    processed_images = [image]  # Original
 
-    if image.mode != 'L':
-        gray_image = image.convert('L')
-        processed_images.append(gray_image)
+# Técnicas DataMatrix (el orden de registro desempata a igual costo); en 'any' solo
+# se agregan las que no tienen un equivalente QR (original, umbrales, morfología 2x2
+# y bilateral ya están)
+DM_MORPH_KERNEL_SIZE = (2, 2)
+DM_SHARPEN_KERNEL = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
+CLAHE_DM = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
 
-        # Aumentar contraste
-        enhancer = ImageEnhance.Contrast(gray_image)
-        processed_images.append(enhancer.enhance(2.0))
-        processed_images.append(enhancer.enhance(3.0))
 
-        # Aumentar brillo
-        enhancer = ImageEnhance.Brightness(gray_image)
-        processed_images.append(enhancer.enhance(1.5))
-        processed_images.append(enhancer.enhance(2.0))
+for _name in BINARIZATION_LEVELS:
+    register_technique('datamatrix', _name, 0.3)(BINARIZATIONS[_name])
 
-        # Aplicar nitidez
-        processed_images.append(gray_image.filter(ImageFilter.SHARPEN))
 
-    return processed_images
+@register_technique(('datamatrix', 'any'), 'adaptive', 1.0)
+def _dm_adaptive(view):
+    return view.derive('adaptive', lambda frame: cv2.adaptiveThreshold(
+        frame, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2))
 
 
-def decode_qr(image):
+@register_technique('datamatrix', 'original', 0.0)
+def _dm_original(view):
+    return view.image
+
+
+# Mismo núcleo 2x2 que las técnicas QR: los nodos se comparten en modo auto
+register_technique('datamatrix', 'closing', 0.5, tags=('denoise',))(
+    _morphology(cv2.MORPH_CLOSE, DM_MORPH_KERNEL_SIZE))
+register_technique('datamatrix', 'opening', 0.5, tags=('denoise',))(
+    _morphology(cv2.MORPH_OPEN, DM_MORPH_KERNEL_SIZE))
+
+
+@register_technique('datamatrix', 'bilateral', 8.0, tags=('denoise',))
+def _dm_bilateral(view):
+    return view.derive('bilateral', _bilateral)
+
+
+@register_technique(('datamatrix', 'any'), 'sharpen', 0.8, tags=('deblur',))
+def _dm_sharpen(view):
+    return cv2.filter2D(view.image, -1, DM_SHARPEN_KERNEL)
+
+
+@register_technique('any', 'clahe_dm', 1.5, tags=('contrast',))
+@register_technique('datamatrix', 'clahe', 1.5, tags=('contrast',))
+def _dm_clahe(view):
+    return CLAHE_DM.apply(view.image)
+
+
+# ======================================
+# 🔍 DECODIFICACIÓN QR / DATAMATRIX
+# ======================================
+
+def decode_qr(image, timeout=None, parallel=None):
+    """Intenta decodificar QR y devuelve solo el texto (None si no se detecta)"""
+    return decode_qr_result(image, timeout=timeout, parallel=parallel).text
+
+
+def decode_qr_result(image, timeout=None, deadline=None, parallel=None, graph=None,
+                     basic_only=False):
     """Intenta decodificar QR con múltiples técnicas, incluyendo casos ultra-difíciles"""
-    logger.info("🔍 Iniciando decodificación con técnicas básicas...")
-
-    # Primero intentar técnicas básicas
-    basic_techniques = preprocess_image(image)
-    logger.info(f"🔧 Aplicando {len(basic_techniques)} técnicas básicas...")
-
-    for i, processed_img in enumerate(basic_techniques):
-        from pylibdmtx.pylibdmtx import decode as decode_datamatrix_lib
-        decoded_objects = decode_datamatrix_lib(processed_img)
-        if decoded_objects:
-            result = decoded_objects[0].data.decode('utf-8')
-            logger.info(f"✅ QR detectado con técnica básica #{i}: '{result}'")
-            return result
+    deadline = deadline or Deadline(timeout)
+    graph = graph or PreprocessGraph(image)
+    logger.debug("🔍 Iniciando decodificación con técnicas básicas...")
 
-    logger.info(
-        "⚡ Técnicas básicas fallaron, aplicando técnicas ultra-avanzadas...")
+    # Primero intentar técnicas básicas (se generan a medida que se prueban)
+    basic_attempts = 0
+    with timed_stage('basic', 'qr'):
+        for i, processed_img in enumerate(preprocess_image(image, graph)):
+            basic_attempts += 1
+            if deadline.expired():
+                logger.debug("⏱️ Plazo agotado durante las técnicas básicas")
+                return DecodeResult(timed_out=True, attempts=i, stage='basic')
+            decoded_objects = decode_qr_backends(processed_img, deadline)
+            if decoded_objects:
+                result = decoded_objects[0].data.decode('utf-8')
+                logger.debug("✅ QR detectado con técnica básica #%s: '%s'", i, result)
+                TECHNIQUE_WINS.labels('qr', 'basic', f"básica #{i}").inc()
+                return DecodeResult(text=result, attempts=i + 1, stage='basic',
+                                    technique=f"básica #{i}", symbology='qr')
+
+    if basic_only:
+        return skip_advanced_search(basic_attempts)
+
+    logger.debug("⚡ Técnicas básicas fallaron, aplicando técnicas ultra-avanzadas...")
     # Si falla, usar técnicas ultra-avanzadas
-    result = decode_qr_ultra_advanced(image)
-    if result:
-        logger.info(f"🚀 QR detectado con técnicas ultra-avanzadas: '{result}'")
-    else:
-        logger.warning("😔 Todas las técnicas fallaron - QR no detectado")
+    with timed_stage('ultra', 'qr'):
+        result = decode_qr_ultra_advanced(image, deadline, parallel, graph)
+    result.attempts += basic_attempts
+    if result.text:
+        logger.debug("🚀 QR detectado con técnicas ultra-avanzadas: '%s'", result.text)
+    elif not result.timed_out:
+        logger.debug("😔 Todas las técnicas fallaron - QR no detectado")
     return result
 
 
-def decode_qr_ultra_advanced(image):
-    """Técnicas ultra-avanzadas para QR muy desenfocados - versión completa"""
+def skip_advanced_search(attempts):
+    """Resultado del modo degradado: solo se corrió la pasada básica"""
+    logger.debug("🚦 Modo degradado: se omiten las técnicas ultra-avanzadas")
+    return DecodeResult(attempts=attempts, stage='basic', advanced_skipped=True)
+
+
+def decode_qr_ultra_advanced(image, deadline=None, parallel=None, graph=None):
+    """Técnicas ultra-avanzadas para QR muy desenfocados, ordenadas por costo"""
     try:
-        # Convertir a numpy array
-        img_array = np.array(image)
-        if len(img_array.shape) == 3:
-            img_gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            img_gray = img_array
+        return run_strategy_search(image, 'qr', deadline, parallel, graph)
+    except Exception as e:
+        logger.error("❌ Error en decode_qr_ultra_advanced: %s", e)
+        return DecodeResult(stage='ultra')
 
-        # Múltiples escalas y rotaciones (versión exhaustiva)
-        for scale in [0.5, 1.0, 1.5, 2.0]:
-            if scale != 1.0:
-                h, w = img_gray.shape
-                new_h, new_w = int(h * scale), int(w * scale)
-                scaled = cv2.resize(img_gray, (new_w, new_h),
-                                    interpolation=cv2.INTER_CUBIC)
-            else:
-                scaled = img_gray.copy()
-
-            # Múltiples rotaciones
-            for angle in [0, 1, -1, 2, -2, 5, -5]:
-                if angle != 0:
-                    center = (scaled.shape[1]//2, scaled.shape[0]//2)
-                    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
-                    rotated = cv2.warpAffine(
-                        scaled, matrix, (scaled.shape[1], scaled.shape[0]))
-                else:
-                    rotated = scaled.copy()
-
-                # Lista exhaustiva de técnicas de mejora
-                techniques = []
-
-                # Original
-                techniques.append(rotated)
-
-                # Gaussian blur + unsharp mask
-                blurred = cv2.GaussianBlur(rotated, (5, 5), 0)
-                unsharp = cv2.addWeighted(rotated, 2.0, blurred, -1.0, 0)
-                techniques.append(np.clip(unsharp, 0, 255).astype(np.uint8))
-
-                # Bilateral filter (preserva bordes)
-                techniques.append(cv2.bilateralFilter(rotated, 9, 75, 75))
-
-                # Sharpening extremo
-                kernel = np.array([[-1, -1, -1, -1, -1],
-                                  [-1, 2, 2, 2, -1],
-                                  [-1, 2, 8, 2, -1],
-                                  [-1, 2, 2, 2, -1],
-                                  [-1, -1, -1, -1, -1]]) / 8.0
-                sharp = cv2.filter2D(rotated, -1, kernel)
-                techniques.append(np.clip(sharp, 0, 255).astype(np.uint8))
-
-                # Threshold con múltiples valores
-                for thresh_val in [127, 100, 150, 80, 180]:
-                    _, thresh = cv2.threshold(
-                        rotated, thresh_val, 255, cv2.THRESH_BINARY)
-                    techniques.append(thresh)
-
-                # CLAHE extremo
-                clahe = cv2.createCLAHE(clipLimit=5.0, tileGridSize=(4, 4))
-                clahe_img = clahe.apply(rotated)
-                techniques.append(clahe_img)
-
-                # Morphological operations
-                for kernel_size in [(2, 2), (3, 3)]:
-                    kernel = np.ones(kernel_size, np.uint8)
-
-                    # Opening
-                    opening = cv2.morphologyEx(rotated, cv2.MORPH_OPEN, kernel)
-                    techniques.append(opening)
-
-                    # Closing
-                    closing = cv2.morphologyEx(
-                        rotated, cv2.MORPH_CLOSE, kernel)
-                    techniques.append(closing)
-
-                # Probar cada técnica
-                for processed in techniques:
-                    try:
-                        pil_img = Image.fromarray(processed)
-                        decoded_objects = decode(pil_img)
-                        if decoded_objects:
-                            return decoded_objects[0].data.decode('utf-8')
-                    except:
-                        continue
 
-        return None
-    except Exception:
-        return None
+def decode_datamatrix(image, timeout=None, parallel=None):
+    """Intenta decodificar DataMatrix y devuelve solo el texto (None si no se detecta)"""
+    return decode_datamatrix_result(image, timeout=timeout, parallel=parallel).text
 
 
-def decode_datamatrix(image):
+@datamatrix_budgeted
+def decode_datamatrix_result(image, deadline=None, parallel=None, graph=None, basic_only=False):
     """Intenta decodificar DataMatrix con múltiples técnicas, incluyendo casos ultra-difíciles"""
-    logger.info("🔍 Iniciando decodificación DataMatrix con técnicas básicas...")
-
-    # Optimización agresiva para imágenes grandes: redimensionar si es necesario
-    max_dimension = 800  # Límite más agresivo para velocidad
-    if max(image.size) > max_dimension:
-        ratio = max_dimension / max(image.size)
-        new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-        image = image.resize(new_size, Image.LANCZOS)
-        logger.info(
-            f"📏 Imagen redimensionada a {new_size} para optimización (agresiva)")
+    graph = graph or PreprocessGraph(image)
+    logger.debug("🔍 Iniciando decodificación DataMatrix con técnicas básicas...")
 
     # Primero intentar técnicas básicas optimizadas para DataMatrix
-    basic_techniques = preprocess_image_datamatrix(image)
-    logger.info(
-        f"🔧 Aplicando {len(basic_techniques)} técnicas básicas optimizadas para DataMatrix...")
+    hints = basic_datamatrix_hints(graph)
+    basic_attempts = 0
+    with timed_stage('basic', 'datamatrix'):
+        for i, processed_img in enumerate(preprocess_image_datamatrix(image, graph)):
+            basic_attempts += 1
+            if deadline.expired():
+                logger.debug("⏱️ Plazo agotado durante las técnicas básicas")
+                return DecodeResult(timed_out=True, attempts=i, stage='basic')
+            try:
+                decoded_objects = _decode_with_dmtx(processed_img, deadline, hints)
+                if decoded_objects:
+                    result = decoded_objects[0].data.decode('utf-8')
+                    logger.debug("✅ DataMatrix detectado con técnica básica #%s: '%s'", i, result)
+                    TECHNIQUE_WINS.labels('datamatrix', 'basic', f"básica #{i}").inc()
+                    return DecodeResult(text=result, attempts=i + 1, stage='basic',
+                                        technique=f"básica #{i}", symbology='datamatrix')
+            except Exception as e:
+                logger.debug("🔧 Técnica básica #%s falló: %s", i, e)
+                continue
 
-    for i, processed_img in enumerate(basic_techniques):
-        try:
-            from pylibdmtx.pylibdmtx import decode as decode_datamatrix_lib
-            # Añadir timeout para evitar colgarse
-            decoded_objects = decode_datamatrix_lib(
-                processed_img, timeout=3000)  # 3 segundos max
-            if decoded_objects:
-                result = decoded_objects[0].data.decode('utf-8')
-                logger.info(
-                    f"✅ DataMatrix detectado con técnica básica #{i}: '{result}'")
-                return result
-        except Exception as e:
-            logger.debug(f"🔧 Técnica básica #{i} falló: {str(e)}")
-            continue
+    if basic_only:
+        return skip_advanced_search(basic_attempts)
 
-    logger.info(
+    logger.debug(
         "⚡ Técnicas básicas fallaron, aplicando técnicas ultra-avanzadas para DataMatrix...")
     # Si falla, usar técnicas ultra-avanzadas
-    result = decode_datamatrix_ultra_advanced(image)
-    if result:
-        logger.info(
-            f"🚀 DataMatrix detectado con técnicas ultra-avanzadas: '{result}'")
-    else:
-        logger.warning(
-            "😔 Todas las técnicas fallaron - DataMatrix no detectado")
+    with timed_stage('ultra', 'datamatrix'):
+        result = decode_datamatrix_ultra_advanced(image, deadline, parallel, graph)
+    result.attempts += basic_attempts
+    if result.text:
+        logger.debug("🚀 DataMatrix detectado con técnicas ultra-avanzadas: '%s'", result.text)
+    elif not result.timed_out:
+        logger.debug("😔 Todas las técnicas fallaron - DataMatrix no detectado")
     return result
 
 
-def decode_datamatrix_ultra_advanced(image):
-    """Técnicas ultra-avanzadas para DataMatrix muy desenfocados - versión completa"""
+def decode_datamatrix_ultra_advanced(image, deadline=None, parallel=None, graph=None):
+    """Técnicas ultra-avanzadas para DataMatrix muy desenfocados, ordenadas por costo"""
     try:
-        # Convertir a numpy array
-        img_array = np.array(image)
-        if len(img_array.shape) == 3:
-            img_gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            img_gray = img_array
-
-        # Asegurar que la imagen sea pequeña para las técnicas avanzadas
-        h, w = img_gray.shape
-        if max(h, w) > 600:
-            ratio = 600 / max(h, w)
-            new_h, new_w = int(h * ratio), int(w * ratio)
-            img_gray = cv2.resize(img_gray, (new_w, new_h),
-                                  interpolation=cv2.INTER_LANCZOS4)
-            logger.info(
-                f"📐 Imagen redimensionada para técnicas avanzadas: {new_w}x{new_h}")
-
-        # DataMatrix específico: solo escalas más efectivas (menos iteraciones)
-        for scale in [1.0, 0.5, 2.0]:
-            if scale != 1.0:
-                h, w = img_gray.shape
-                new_h, new_w = int(h * scale), int(w * scale)
-                scaled = cv2.resize(img_gray, (new_w, new_h),
-                                    interpolation=cv2.INTER_CUBIC)
-            else:
-                scaled = img_gray.copy()
-
-            # DataMatrix: rotaciones ordenadas por probabilidad de éxito
-            for angle in [0, 270, 90, 180]:  # 270° fue exitoso en dm2.jpg
-                if angle != 0:
-                    center = (scaled.shape[1]//2, scaled.shape[0]//2)
-                    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
-                    rotated = cv2.warpAffine(
-                        scaled, matrix, (scaled.shape[1], scaled.shape[0]))
-                else:
-                    rotated = scaled.copy()
-
-                # Técnicas específicas para DataMatrix (ordenadas por efectividad)
-                techniques = []
-
-                # Otsu threshold PRIMERO (muy efectivo para DataMatrix)
-                _, otsu_thresh = cv2.threshold(
-                    rotated, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                techniques.append(otsu_thresh)
-                
-                # Threshold adaptativo SEGUNDO
-                adaptive_thresh = cv2.adaptiveThreshold(
-                    rotated, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-                techniques.append(adaptive_thresh)
-
-                # Original TERCERO
-                techniques.append(rotated)
-                
-                # Morphological operations (ordenadas por efectividad)
-                kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-                closing = cv2.morphologyEx(rotated, cv2.MORPH_CLOSE, kernel)
-                techniques.append(closing)
-                
-                # Opening (elimina ruido)
-                opening = cv2.morphologyEx(rotated, cv2.MORPH_OPEN, kernel)
-                techniques.append(opening)
-                
-                # Bilateral filter (muy efectivo para desenfoque)
-                bilateral = cv2.bilateralFilter(rotated, 9, 75, 75)
-                techniques.append(bilateral)
-
-                # Sharpening específico para patrones geométricos
-                kernel_sharp = np.array(
-                    [[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
-                sharp = cv2.filter2D(rotated, -1, kernel_sharp)
-                techniques.append(np.clip(sharp, 0, 255).astype(np.uint8))
-
-                # CLAHE moderado (DataMatrix es sensible a over-enhancement)
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-                clahe_img = clahe.apply(rotated)
-                techniques.append(clahe_img)
-
-                # Gaussian blur + unsharp mask (suave para DataMatrix)
-                blurred = cv2.GaussianBlur(rotated, (3, 3), 0)
-                unsharp = cv2.addWeighted(rotated, 1.5, blurred, -0.5, 0)
-                techniques.append(np.clip(unsharp, 0, 255).astype(np.uint8))
-
-                # Erosion + Dilation (redefine bordes)
-                kernel_morph = cv2.getStructuringElement(
-                    cv2.MORPH_RECT, (1, 1))
-                eroded = cv2.erode(rotated, kernel_morph, iterations=1)
-                dilated = cv2.dilate(eroded, kernel_morph, iterations=1)
-                techniques.append(dilated)
-
-                # Probar cada técnica con pylibdmtx (timeout optimizado)
-                for j, processed in enumerate(techniques[:8]):  # Limitar a 8 técnicas más efectivas
-                    try:
-                        pil_img = Image.fromarray(processed)
-                        from pylibdmtx.pylibdmtx import decode as decode_datamatrix_lib
-                        decoded_objects = decode_datamatrix_lib(
-                            pil_img, timeout=1500)  # 1.5 segundos max
-                        if decoded_objects:
-                            logger.info(
-                                f"🎯 DataMatrix encontrado con escala {scale}, ángulo {angle}, técnica {j}")
-                            return decoded_objects[0].data.decode('utf-8')
-                    except Exception as e:
-                        continue  # Continuar con la siguiente técnica
-
-        return None
+        return run_strategy_search(image, 'datamatrix', deadline, parallel, graph)
     except Exception as e:
-        logger.error(f"❌ Error en decode_datamatrix_ultra_advanced: {str(e)}")
+        logger.error("❌ Error en decode_datamatrix_ultra_advanced: %s", e)
+        return DecodeResult(stage='ultra')
+
+
+# Optimización agresiva para imágenes grandes: las variantes básicas DataMatrix se
+# calculan sobre una versión reducida
+DM_BASIC_MAX_DIMENSION = 800
+
+
+def basic_datamatrix_hints(graph):
+    """Pistas de libdmtx (tamaño del símbolo, contraste) para las variantes básicas"""
+    source_key, source = graph.limited(DM_BASIC_MAX_DIMENSION)
+    return decode_hints(image_profile(graph, source_key, source))
+
+
+def preprocess_image_datamatrix(image, graph=None):
+    """Genera a demanda las variantes básicas para DataMatrix (técnicas rápidas)"""
+    graph = graph or PreprocessGraph(image)
+    source_key, source = graph.limited(DM_BASIC_MAX_DIMENSION)
+    view = graph.frame(source_key, source, 1.0, 0)
+
+    # Solo las técnicas MÁS efectivas para DataMatrix (velocidad máxima); los
+    # umbrales quedan en el grafo y la búsqueda ultra-avanzada los reutiliza
+    yield view.image  # Original en grises
+    yield _dm_adaptive(view)  # Threshold adaptativo (muy efectivo para DataMatrix)
+    otsu = BINARIZATIONS['otsu'](view)  # Otsu threshold (súper efectivo)
+    if otsu is not None:
+        yield otsu
+
+
+# ======================================
+# 🔢 DETECCIÓN DE MÚLTIPLES CÓDIGOS
+# ======================================
+
+# Una vez encontrado algún código, intentos seguidos sin códigos nuevos antes de terminar
+MULTI_MAX_IDLE_ATTEMPTS = int(os.environ.get('MULTI_MAX_IDLE_ATTEMPTS', 40))
+
+
+def _decoded_points(decoded, frame_shape):
+    """Esquinas del símbolo en coordenadas del frame (origen arriba a la izquierda)"""
+    polygon = getattr(decoded, 'polygon', None)
+    if polygon:
+        return np.array([(point.x, point.y) for point in polygon], dtype=np.float64)
+
+    left, top, width, height = decoded.rect
+    if _symbology_of(decoded) == 'datamatrix':
+        # libdmtx mide el eje Y desde abajo
+        top = frame_shape[0] - top - height
+    return np.array([(left, top), (left + width, top),
+                     (left + width, top + height), (left, top + height)],
+                    dtype=np.float64)
+
+
+def _build_symbol(text, symbol_type, points, variant):
+    xs, ys = points[:, 0], points[:, 1]
+    left, top = int(round(xs.min())), int(round(ys.min()))
+    return {
+        'text': text,
+        'type': symbol_type,
+        'rect': {'left': left, 'top': top,
+                 'width': int(round(xs.max())) - left,
+                 'height': int(round(ys.max())) - top},
+        'polygon': [[int(round(x)), int(round(y))] for x, y in points],
+        'variant': variant,
+    }
+
+
+def _collect_symbols(graph, source_key, img_gray, symbology, region, deadline, result,
+                     seen, area=None, basic_only=False):
+    """Recorre el plan sobre una imagen agregando al resultado los códigos nuevos
+    (en modo degradado solo los candidatos a escala 1 sin rotar)"""
+    config = SYMBOLOGIES[symbology]
+    x0, y0, width, height = region
+    base = np.diag([width / img_gray.shape[1], height / img_gray.shape[0]])
+    offset = np.array([x0, y0], dtype=np.float64)
+    found_here = 0
+    idle = 0
+
+    profile = image_profile(graph, source_key, img_gray)
+    for candidate in plan_candidates(symbology, profile, img_gray.shape):
+        if deadline.expired():
+            result.timed_out = True
+            break
+        if found_here and idle >= MULTI_MAX_IDLE_ATTEMPTS:
+            break
+        if basic_only and candidate[:2] != (1.0, 0):
+            result.advanced_skipped = True
+            continue
+
+        result.attempts += 1
+        idle += 1
+        try:
+            decoded_objects = _attempt_candidate(
+                graph, source_key, img_gray, symbology, candidate, deadline, max_count=None,
+                bounded=area is not None)
+        except PixelBudgetExceeded as e:
+            result.budget_exhausted = True
+            logger.warning("🧮 Búsqueda interrumpida tras %s intentos: %s", result.attempts, e)
+            break
+        scale, angle, technique = candidate
+        for decoded in decoded_objects or []:
+            text = decoded.data.decode('utf-8', errors='replace')
+            symbol_type = getattr(decoded, 'type', None) or 'DATAMATRIX'
+            if (symbol_type, text) in seen:
+                continue
+            seen.add((symbol_type, text))
+            idle = 0
+            found_here += 1
+
+            frame = graph.frame(source_key, img_gray, scale, angle).image
+            matrix = graph.frame_to_source(source_key, img_gray, scale, angle)
+            points = cv2.perspectiveTransform(
+                _decoded_points(decoded, frame.shape).reshape(-1, 1, 2), matrix).reshape(-1, 2)
+            points = points @ base + offset
+            variant = f"escala={scale} ángulo={angle} técnica={technique.name}"
+            if area:
+                variant = f"{area} {variant}"
+            result.symbols.append(
+                _build_symbol(text, symbol_type, points, variant))
+            technique_stats.record(symbology, scale, angle, technique.name)
+            TECHNIQUE_WINS.labels(symbology, 'multi', technique.name).inc()
+            logger.debug(
+                "🎯 %s #%s encontrado con %s", config['label'], len(result.symbols), variant)
+
+
+def decode_all_result(image, symbology, timeout=None, deadline=None, parallel=None,
+                      graph=None, basic_only=False):
+    """Devuelve todos los códigos distintos de la imagen con su posición, en una sola pasada"""
+    deadline = deadline or Deadline(timeout)
+    graph = graph or PreprocessGraph(image)
+    symbologies = ('qr', 'datamatrix') if symbology == 'auto' else (symbology,)
+    result = DecodeResult(stage='multi', symbology=symbology, symbols=[])
+    seen = set()
+    img_gray_full = graph.gray()
+    full_region = (0, 0, img_gray_full.shape[1], img_gray_full.shape[0])
+
+    for current in symbologies:
+        max_dimension = SYMBOLOGIES[current]['max_dimension']
+        crops = [] if basic_only else localized_crops(graph, max_dimension)
+        for area, source_key, crop, region in crops:
+            _collect_symbols(graph, source_key, crop, current, region,
+                             deadline.split(LOCALIZATION_BUDGET_FRACTION),
+                             result, seen, area)
+            result.timed_out = deadline.expired()
+            if result.timed_out or result.budget_exhausted:
+                break
+
+        if not result.timed_out and not result.budget_exhausted:
+            source_key, img_gray = graph.limited(max_dimension)
+            _collect_symbols(graph, source_key, img_gray, current, full_region,
+                             deadline, result, seen, basic_only=basic_only)
+        if result.timed_out or result.budget_exhausted:
+            break
+
+    if result.symbols:
+        result.text = result.symbols[0]['text']
+    logger.debug("🔢 %s códigos distintos tras %s intentos", len(result.symbols), result.attempts)
+    return result
+
+
+def _scale_symbols(symbols, factor):
+    """Lleva las posiciones de los símbolos a la resolución original de la imagen"""
+    for symbol in symbols:
+        symbol['rect'] = {key: value * factor for key, value in symbol['rect'].items()}
+        symbol['polygon'] = [[x * factor, y * factor] for x, y in symbol['polygon']]
+
+
+# ======================================
+# 📥 CARGA DE IMÁGENES
+# ======================================
+
+# Imágenes con más píxeles se decodifican a resolución reducida (1/2, 1/4 u 1/8;
+# en JPEG la reducción ocurre dentro de la propia decodificación DCT)
+INGEST_MAX_PIXELS = int(os.environ.get('INGEST_MAX_PIXELS', 16_000_000))
+
+REDUCED_READ_FLAGS = ((2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+                      (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                      (8, cv2.IMREAD_REDUCED_GRAYSCALE_8))
+
+
+def _image_dimensions(image_data):
+    """(ancho, alto) leídos solo de la cabecera, sin decodificar píxeles"""
+    try:
+        with Image.open(io.BytesIO(image_data)) as header:
+            return header.size
+    except Exception:
         return None
 
 
-def preprocess_image_datamatrix(image):
-    """Preprocesamiento específico y optimizado para DataMatrix (técnicas rápidas)"""
-    processed_images = []
+def load_image_array(image_data, max_pixels=None, factor=None):
+    """Decodifica los bytes directamente a un buffer uint8 en escala de grises.
 
-    # Convertir a escala de grises si es necesario
-    if image.mode != 'L':
-        gray_image = image.convert('L')
+    Con factor (2, 4 u 8) se decodifica a esa fracción de la resolución. Devuelve
+    (imagen, factor) con el factor de reducción aplicado (1 = original).
+    """
+    max_pixels = INGEST_MAX_PIXELS if max_pixels is None else max_pixels
+    if factor in dict(REDUCED_READ_FLAGS):
+        flags, size = dict(REDUCED_READ_FLAGS)[factor], None
     else:
-        gray_image = image
+        flags, factor = cv2.IMREAD_GRAYSCALE, 1
+        size = _image_dimensions(image_data)
+    if max_pixels and size and size[0] * size[1] > max_pixels:
+        for factor, flags in REDUCED_READ_FLAGS:
+            if size[0] * size[1] / (factor * factor) <= max_pixels:
+                break
+
+    img = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), flags)
+    if img is None:
+        # Formatos que OpenCV no lee (p. ej. GIF): PIL como alternativa
+        with Image.open(io.BytesIO(image_data)) as pil_image:
+            img = np.asarray(pil_image.convert('L'))
+        if factor > 1:
+            img = cv2.resize(img, (img.shape[1] // factor, img.shape[0] // factor),
+                             interpolation=cv2.INTER_AREA)
+    return img, factor
+
+
+# ======================================
+# 🔺 PIRÁMIDE DE RESOLUCIÓN
+# ======================================
+
+# En imágenes grandes se intenta primero en niveles reducidos (de menor a mayor)
+# y solo si fallan se materializa la imagen completa
+PYRAMID_ENABLED = os.environ.get('PYRAMID_ENABLED', '1') == '1'
+# Solo se usa la pirámide en imágenes con al menos estos píxeles
+PYRAMID_MIN_PIXELS = int(os.environ.get('PYRAMID_MIN_PIXELS', 4_000_000))
+# Lado mayor mínimo de un nivel para que valga la pena decodificarlo
+PYRAMID_MIN_DIMENSION = int(os.environ.get('PYRAMID_MIN_DIMENSION', 700))
+# Fracción del plazo que pueden consumir los niveles reducidos
+PYRAMID_BUDGET_FRACTION = float(os.environ.get('PYRAMID_BUDGET_FRACTION', 0.2))
+PYRAMID_FACTORS = (8, 4, 2)
+
+# Decodificadores directos que se prueban para cada simbología pedida (pirámide y video)
+SYMBOLOGY_DECODERS = {'qr': ('qr',), 'datamatrix': ('datamatrix',),
+                    'auto': ('qr', 'datamatrix'), 'any': ('any',)}
 
-    # Solo las técnicas MÁS efectivas para DataMatrix (velocidad máxima)
-    processed_images.append(gray_image)  # Original en grises
 
+def _pyramid_sources(graph, factors):
+    """Imágenes a probar por nivel: el más grueso completo y, si en él se
+    localizaron regiones, en los niveles finos solo los recortes de esas regiones"""
+    coarse = factors[0]
+    coarse_level = graph.level(coarse)
+    yield coarse, ('level', coarse), coarse_level
     try:
-        # Threshold adaptativo (muy efectivo para DataMatrix)
-        import numpy as np
-        gray_array = np.array(gray_image)
-        adaptive_thresh = cv2.adaptiveThreshold(
-            gray_array, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-        processed_images.append(Image.fromarray(adaptive_thresh))
+        regions = graph.node(('level', coarse, 'regions'),
+                             lambda: locate_candidate_regions(coarse_level))
+    except cv2.error as e:
+        logger.debug("🔧 Localización en la pirámide falló: %s", e)
+        regions = []
+    for factor in factors[1:]:
+        level = graph.level(factor)
+        if not regions:
+            yield factor, ('level', factor), level
+            continue
+        ratio = coarse // factor
+        for x, y, w, h in regions:
+            region = (x * ratio, y * ratio, w * ratio, h * ratio)
+            crop = level[region[1]:region[1] + region[3], region[0]:region[0] + region[2]]
+            yield factor, ('level', factor, region), crop
 
-        # Otsu threshold (súper efectivo)
-        _, otsu_thresh = cv2.threshold(
-            gray_array, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        processed_images.append(Image.fromarray(otsu_thresh))
-    except Exception as e:
-        logger.debug(f"Error en preprocesamiento avanzado: {e}")
 
-    return processed_images
+def pyramid_search(graph, symbology, deadline):
+    """Prueba los niveles reducidos de la pirámide; None si la imagen es chica o no hay éxito"""
+    size = graph.dimensions()
+    if not PYRAMID_ENABLED or not size or size[0] * size[1] < PYRAMID_MIN_PIXELS:
+        return None
+    factors = [factor for factor in PYRAMID_FACTORS
+               if max(size) / factor >= PYRAMID_MIN_DIMENSION]
+    if not factors:
+        return None
+
+    budget = deadline.split(PYRAMID_BUDGET_FRACTION)
+    attempts = 0
+    for factor, key, source in _pyramid_sources(graph, factors):
+        view = graph.frame(key, source, 1.0, 0)
+        for name in ('original', 'otsu'):
+            processed = view.image if name == 'original' else BINARIZATIONS[name](view)
+            if processed is None:
+                continue
+            for current in SYMBOLOGY_DECODERS[symbology]:
+                if budget.expired():
+                    logger.debug("🔺 Pirámide sin éxito tras %s intentos", attempts)
+                    return None
+                attempts += 1
+                try:
+                    decoded_objects = DECODERS[current](processed, budget, SINGLE_SYMBOL)
+                except Exception as e:
+                    logger.debug("🔧 Nivel 1/%s falló: %s", factor, e)
+                    continue
+                if decoded_objects:
+                    found = (_symbology_of(decoded_objects[0]) if current == 'any'
+                             else current)
+                    text = decoded_objects[0].data.decode('utf-8')
+                    technique = f"nivel=1/{factor} técnica={name}"
+                    if len(key) > 2:
+                        technique = f"región={key[2]} {technique}"
+                    logger.debug(
+                        "🔺 %s detectado en la pirámide con %s: '%s'", found, technique, text)
+                    TECHNIQUE_WINS.labels(current, 'pyramid', name).inc()
+                    return DecodeResult(text=text, attempts=attempts, stage='pyramid',
+                                        technique=technique, symbology=found)
+    logger.debug("🔺 Pirámide sin éxito tras %s intentos", attempts)
+    return None
+
+
+# ======================================
+# 💾 CACHÉ DE RESULTADOS
+# ======================================
+
+# Backend de caché: 'memory' (en proceso), 'sqlite' (compartible entre réplicas) o 'none'
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# TTL en segundos de los resultados positivos (0 = sin expiración)
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 0))
+# Los "no encontrado" también se cachean, con su propio TTL (0 = no cachear)
+CACHE_NEGATIVE_TTL = float(os.environ.get('CACHE_NEGATIVE_TTL', 300))
+CACHE_SQLITE_PATH = os.environ.get(
+    'CACHE_SQLITE_PATH', 'logs/result_cache.sqlite3')
+
+
+class CacheBackend:
+    """Interfaz de los backends de caché (valores: dict serializable a JSON)"""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class LocalCacheBackend(CacheBackend):
+    """LRU en memoria acotado por cantidad de entradas y por bytes"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self.entries[key]
+                self.size -= size
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(key) + len(json.dumps(value))
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (value, size, expires_at)
+            self.size += size
+            while self.entries and (len(self.entries) > self.max_entries or
+                                    self.size > self.max_bytes):
+                _, (_, evicted_size, _) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.size}
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Caché en SQLite (modo WAL) que varias réplicas pueden compartir en un mismo volumen"""
+
+    def __init__(self, path, max_entries, max_bytes):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = None
+        self.conn_pid = None
+
+    def _connection(self):
+        # Una conexión por proceso: no se comparte a través de fork
+        if self.conn is None or self.conn_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=5,
+                                        check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                'expires_at REAL, accessed_at REAL NOT NULL)')
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)')
+            self.conn_pid = os.getpid()
+        return self.conn
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT value, expires_at FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and now >= row[1]:
+                conn.execute('DELETE FROM results WHERE key = ?', (key,))
+                conn.commit()
+                return None
+            conn.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (now, key))
+            conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        payload = json.dumps(value)
+        now = time.time()
+        with self.lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                (key, payload, len(key) + len(payload), now + ttl if ttl else None, now))
+            count, size = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+            if count > self.max_entries or size > self.max_bytes:
+                self._evict(conn, count, size)
+            conn.commit()
+
+    def _evict(self, conn, count, size):
+        conn.execute('DELETE FROM results WHERE expires_at IS NOT NULL AND expires_at <= ?',
+                     (time.time(),))
+        rows = conn.execute(
+            'SELECT key, size FROM results ORDER BY accessed_at').fetchall()
+        count = len(rows)
+        size = sum(row[1] for row in rows)
+        evicted = []
+        for key, entry_size in rows:
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            count -= 1
+            size -= entry_size
+        conn.executemany('DELETE FROM results WHERE key = ?', evicted)
+
+    def clear(self):
+        with self.lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM results')
+            conn.commit()
+
+    def stats(self):
+        with self.lock:
+            count, size = self._connection().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        return {'entries': count, 'bytes': size}
+
+
+class ResultCache:
+    """Caché de resultados por hash del contenido de la imagen y simbología"""
+
+    def __init__(self, backend, ttl=0, negative_ttl=0):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'errors': 0}
+
+    @staticmethod
+    def key(image_data, symbology):
+        return f"{symbology}:{hashlib.sha256(image_data).hexdigest()}"
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+        CACHE_LOOKUPS.labels(result=name).inc()
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning("⚠️ Error leyendo la caché de resultados: %s", e)
+            self._count('errors')
+            return None
+        if value is None:
+            self._count('misses')
+        else:
+            self._count('hits' if value.get('text') else 'negative_hits')
+        return value
+
+    def set(self, key, result):
+        """Guarda un resultado (los tiempos agotados y las búsquedas degradadas o
+        interrumpidas nunca se cachean)"""
+        if (self.backend is None or result.timed_out or result.advanced_skipped
+                or result.budget_exhausted):
+            return
+        if not result.text and not self.negative_ttl:
+            return
+        ttl = self.ttl if result.text else self.negative_ttl
+        try:
+            self.backend.set(key, {'text': result.text, 'symbology': result.symbology,
+                                   'symbols': result.symbols}, ttl)
+        except Exception as e:
+            logger.warning("⚠️ Error escribiendo la caché de resultados: %s", e)
+            self._count('errors')
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['negative_hits']) / lookups, 4) if lookups else 0.0
+        stats['backend'] = CACHE_BACKEND
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+def create_cache_backend(name):
+    if name == 'memory':
+        return LocalCacheBackend(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+    if name == 'sqlite':
+        return SQLiteCacheBackend(CACHE_SQLITE_PATH, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+    if name in ('none', '', None):
+        return None
+    raise ValueError(f"CACHE_BACKEND desconocido: {name}")
+
+
+result_cache = ResultCache(create_cache_backend(CACHE_BACKEND),
+                           ttl=CACHE_TTL, negative_ttl=CACHE_NEGATIVE_TTL)
+
+
+def decode_auto_result(image, timeout=None, deadline=None, parallel=None, graph=None,
+                       basic_only=False):
+    """Intenta QR y luego DataMatrix compartiendo un mismo plazo y los nodos de preprocesamiento"""
+    deadline = deadline or Deadline(timeout)
+    graph = graph or PreprocessGraph(image)
+    attempts = 0
+    for symbology in ('qr', 'datamatrix'):
+        result = DECODE_FUNCTIONS[symbology](image, deadline=deadline, parallel=parallel,
+                                             graph=graph, basic_only=basic_only)
+        attempts += result.attempts
+        result.attempts = attempts
+        # El tope DataMatrix acota solo esa etapa, no el plazo de la petición
+        result.effective_timeout = None
+        if result.text or result.timed_out or result.budget_exhausted:
+            return result
+    return result
+
+
+@datamatrix_budgeted
+def decode_any_result(image, deadline=None, parallel=None, graph=None, basic_only=False):
+    """Busca QR, DataMatrix y códigos de barras en un solo recorrido: cada imagen
+    preprocesada se genera una vez y pasa por todos los decodificadores"""
+    graph = graph or PreprocessGraph(image)
+    logger.debug("🔍 Iniciando decodificación de cualquier simbología...")
+
+    hints = basic_datamatrix_hints(graph)
+    basic_attempts = 0
+    with timed_stage('basic', 'any'):
+        for i, processed_img in enumerate(preprocess_image_datamatrix(image, graph)):
+            if deadline.expired():
+                logger.debug("⏱️ Plazo agotado durante las técnicas básicas")
+                return DecodeResult(timed_out=True, attempts=i, stage='basic')
+            basic_attempts += 1
+            try:
+                decoded_objects = _decode_with_any(processed_img, deadline, hints)
+            except Exception as e:
+                logger.debug("🔧 Técnica básica #%s falló: %s", i, e)
+                continue
+            if decoded_objects:
+                symbology = _symbology_of(decoded_objects[0])
+                result = decoded_objects[0].data.decode('utf-8')
+                logger.debug(
+                    "✅ Código %s detectado con técnica básica #%s: '%s'", symbology, i, result)
+                TECHNIQUE_WINS.labels('any', 'basic', f"básica #{i}").inc()
+                return DecodeResult(text=result, attempts=i + 1, stage='basic',
+                                    technique=f"básica #{i}", symbology=symbology)
+
+    if basic_only:
+        return skip_advanced_search(basic_attempts)
+
+    logger.debug("⚡ Técnicas básicas fallaron, aplicando técnicas ultra-avanzadas...")
+    with timed_stage('ultra', 'any'):
+        try:
+            result = run_strategy_search(image, 'any', deadline, parallel, graph)
+        except Exception as e:
+            logger.error("❌ Error en decode_any_result: %s", e)
+            result = DecodeResult(stage='ultra')
+    result.attempts += basic_attempts
+    if result.text:
+        logger.debug(
+            "🚀 Código %s detectado con técnicas ultra-avanzadas: '%s'",
+            result.symbology, result.text)
+    elif not result.timed_out:
+        logger.debug("😔 Todas las técnicas fallaron - ningún código detectado")
+    return result
+
+
+DECODE_FUNCTIONS = {
+    'qr': decode_qr_result,
+    'datamatrix': decode_datamatrix_result,
+    'auto': decode_auto_result,
+    'any': decode_any_result,
+}
+
+
+def decode_image_bytes(image_data, symbology, multi=False, **options):
+    """Decodifica los bytes de una imagen consultando primero la caché de resultados"""
+    key = result_cache.key(image_data, f"{symbology}:multi" if multi else symbology)
+    cached = result_cache.get(key)
+    if cached is not None:
+        logger.debug("💾 Resultado '%s' obtenido de la caché", symbology)
+        result = DecodeResult(text=cached.get('text'), stage='cache', cached=True,
+                              symbology=cached.get('symbology'),
+                              symbols=cached.get('symbols'))
+        log_decode_fields(result, image_bytes=len(image_data))
+        return result
+
+    timeout = options.pop('timeout', None)
+    deadline = options.pop('deadline', None) or Deadline(timeout)
+    graph = PreprocessGraph(image_data=image_data)
+    result = None
+    if not multi:
+        # Imágenes grandes: primero niveles reducidos, sin materializar la completa
+        with timed_stage('pyramid', symbology):
+            result = pyramid_search(graph, symbology, deadline)
+
+    if result is None:
+        with timed_stage('load', symbology):
+            img = graph.gray()
+        logger.debug("🖼️  Imagen cargada: %sx%s píxeles en grises (reducción 1/%s)",
+                     img.shape[1], img.shape[0], graph.reduction)
+        if multi:
+            with timed_stage('multi', symbology):
+                result = decode_all_result(img, symbology, deadline=deadline,
+                                           graph=graph, **options)
+        else:
+            result = DECODE_FUNCTIONS[symbology](img, deadline=deadline, graph=graph,
+                                                 **options)
+    record_decode_metrics(result)
+    if result.symbols and graph.reduction > 1:
+        _scale_symbols(result.symbols, graph.reduction)
+    if result.text and not result.symbology:
+        result.symbology = symbology
+    result_cache.set(key, result)
+    log_decode_fields(result, image_bytes=len(image_data), reduction=graph.reduction)
+    return result
+
+
+def result_payload(result):
+    """Cuerpo JSON de una decodificación exitosa"""
+    payload = {'text': result.text, 'cached': result.cached}
+    if result.symbols is not None:
+        payload['symbols'] = result.symbols
+        payload['count'] = len(result.symbols)
+    payload.update(degraded_fields(result))
+    return payload
+
+
+def degraded_fields(result):
+    """Marca las respuestas en las que se omitió la búsqueda avanzada por saturación,
+    se cortó al agotar el límite de píxeles de la petición o se acortó el plazo pedido"""
+    fields = {}
+    if result.advanced_skipped:
+        fields['advanced_skipped'] = True
+    if result.budget_exhausted:
+        fields['budget_exhausted'] = True
+    if result.effective_timeout is not None:
+        fields['effective_timeout'] = result.effective_timeout
+    return fields
+
+
+# ======================================
+# 🌐 DESCARGA DE IMÁGENES
+# ======================================
+
+# Timeouts separados de conexión y de lectura (entre bytes recibidos)
+FETCH_CONNECT_TIMEOUT = float(os.environ.get('FETCH_CONNECT_TIMEOUT', 5))
+FETCH_READ_TIMEOUT = float(os.environ.get('FETCH_READ_TIMEOUT', 15))
+# Tiempo total máximo de una descarga (evita servidores que gotean bytes)
+FETCH_TOTAL_TIMEOUT = float(os.environ.get('FETCH_TOTAL_TIMEOUT', 30))
+# Tamaño máximo de imagen descargada, verificado mientras se recibe
+FETCH_MAX_BYTES = int(os.environ.get('FETCH_MAX_BYTES', 20 * 1024 * 1024))
+# Conexiones keep-alive por host y cantidad de hosts en el pool
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', 20))
+# Envíos simultáneos en segundo plano (webhooks de trabajos)
+FETCH_WORKERS = int(os.environ.get('FETCH_WORKERS', 8))
+FETCH_CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLargeError(requests.exceptions.RequestException):
+    """La imagen remota supera FETCH_MAX_BYTES"""
+
+
+_http_session = None
+_http_session_pid = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Sesión HTTP compartida con pool de conexiones keep-alive (una por proceso)"""
+    global _http_session, _http_session_pid
+    with _http_session_lock:
+        if _http_session is None or _http_session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS,
+                                  pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session, _http_session_pid = session, os.getpid()
+        return _http_session
+
+
+def download_image(image_url, max_bytes=None):
+    """Descarga una imagen en streaming, cortando si supera el tamaño o el tiempo máximos"""
+    max_bytes = max_bytes or FETCH_MAX_BYTES
+    started = time.monotonic()
+    with get_http_session().get(image_url, stream=True,
+                                timeout=(FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT)) as response:
+        response.raise_for_status()
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ImageTooLargeError(
+                f"La imagen declara {declared} bytes (máximo {max_bytes})")
+
+        data = bytearray()
+        for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+            data += chunk
+            if len(data) > max_bytes:
+                raise ImageTooLargeError(f"La imagen supera el máximo de {max_bytes} bytes")
+            if time.monotonic() - started > FETCH_TOTAL_TIMEOUT:
+                raise requests.exceptions.Timeout(
+                    f"Descarga incompleta tras {FETCH_TOTAL_TIMEOUT:.0f}s")
+        return bytes(data)
+
+
+def raw_image_body():
+    """Bytes de una imagen enviada como cuerpo binario (None si la petición no es binaria)"""
+    mimetype = request.mimetype or ''
+    if mimetype == 'application/octet-stream' or mimetype.startswith('image/'):
+        return request.get_data(cache=False)
+    return None
+
+
+def requested_option(data, name):
+    """Opción enviada por el cliente en el JSON, el formulario o la query string"""
+    value = (data or {}).get(name)
+    if value is None:
+        value = request.values.get(name)
+    return None if value == '' else value
+
+
+def parse_flag(value):
+    if value is None or isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'si', 'sí')
+
+
+class InvalidOptionError(ValueError):
+    """Opción de la petición con un valor inválido (responde 400)"""
+
+
+def parse_timeout(value, maximum):
+    """Plazo pedido por el cliente, acotado a (0, maximum] (maximum 0 = sin tope);
+    None si no se pidió"""
+    if value is None:
+        return None
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        raise InvalidOptionError(f"'timeout' debe ser un número de segundos: {value!r}")
+    if not timeout > 0 or timeout == float('inf'):
+        raise InvalidOptionError("'timeout' debe ser mayor que 0")
+    return min(timeout, maximum) if maximum > 0 else timeout
+
+
+@app.before_request
+def validate_request_options():
+    """Rechaza con 400 un 'timeout' inválido antes de admitir la petición"""
+    data = request.get_json(silent=True) if request.is_json else None
+    try:
+        parse_timeout(requested_option(data if isinstance(data, dict) else None, 'timeout'),
+                      MAX_DECODE_TIMEOUT)
+    except InvalidOptionError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+def decode_options(data=None):
+    """Opciones de decodificación por llamada: 'timeout' (segundos), 'parallel' y 'multi'.
+
+    En los endpoints con control de admisión el plazo corre desde la llegada de la
+    petición (incluye la espera en cola) y el modo degradado pide solo la pasada básica.
+    """
+    timeout = requested_option(data, 'timeout')
+    options = {
+        'timeout': parse_timeout(timeout, MAX_DECODE_TIMEOUT),
+        'parallel': parse_flag(requested_option(data, 'parallel')),
+        'multi': bool(parse_flag(requested_option(data, 'multi'))),
+    }
+    if 'arrival' in g:
+        options['deadline'] = Deadline(options['timeout'], started=g.arrival)
+        options['basic_only'] = g.get('degraded', False)
+    return options
+
+
+# ======================================
+# 🚦 CONTROL DE ADMISIÓN
+# ======================================
+
+# Decodificaciones simultáneas por endpoint (0 = sin límite); ADMISSION_LIMITS
+# ajusta endpoints puntuales, p. ej. "/scan-any=1,/scan=4"
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 2))
+ADMISSION_LIMITS = {
+    endpoint.strip(): int(limit)
+    for endpoint, limit in (entry.split('=') for entry in
+                            os.environ.get('ADMISSION_LIMITS', '').split(',') if entry.strip())
+}
+# Peticiones que pueden esperar un lugar; con la cola llena se responde 503. Por
+# defecto lo que dejan libre los hilos del worker (uno queda reservado a /health)
+ADMISSION_MAX_WAITING = int(os.environ.get(
+    'ADMISSION_MAX_WAITING',
+    max(1, SERVER_THREADS - 1 - ADMISSION_MAX_CONCURRENT) if SERVER_THREADS else 8))
+# Peticiones admitidas (decodificando o esperando) entre todos los endpoints; por
+# defecto todos los hilos menos uno, para que /health siempre tenga dónde responder
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get(
+    'ADMISSION_MAX_IN_FLIGHT', SERVER_THREADS - 1 if SERVER_THREADS > 1 else 0))
+# Segundos de espera antes de pasar al modo degradado (solo técnicas básicas)
+ADMISSION_WAIT_TIMEOUT = float(os.environ.get('ADMISSION_WAIT_TIMEOUT', 2))
+# Segundos sugeridos en Retry-After al descartar peticiones
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 2))
+
+
+class AdmissionController:
+    """Limita las decodificaciones simultáneas de un endpoint con una cola de espera acotada"""
+
+    def __init__(self, limit, max_waiting):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout):
+        """'full' con un lugar tomado, 'degraded' si la espera se agotó o 'shed' con la cola llena"""
+        with self.condition:
+            if self.active < self.limit:
+                self.active += 1
+                return 'full'
+            if self.waiting >= self.max_waiting:
+                return 'shed'
+            self.waiting += 1
+            try:
+                admitted = self.condition.wait_for(lambda: self.active < self.limit, timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                return 'degraded'
+            self.active += 1
+            return 'full'
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def saturated(self):
+        """Todos los lugares ocupados y peticiones esperando"""
+        with self.condition:
+            return self.active >= self.limit and self.waiting > 0
+
+    def stats(self):
+        with self.condition:
+            return {'active': self.active, 'waiting': self.waiting, 'limit': self.limit,
+                    'max_waiting': self.max_waiting}
+
+
+_admission_controllers = {}
+_admission_lock = threading.Lock()
+_admission_in_flight = 0
+
+
+def _take_admission_thread():
+    """Reserva un hilo para una petición controlada (False si solo queda el de /health)"""
+    global _admission_in_flight
+    with _admission_lock:
+        if ADMISSION_MAX_IN_FLIGHT and _admission_in_flight >= ADMISSION_MAX_IN_FLIGHT:
+            return False
+        _admission_in_flight += 1
+        return True
+
+
+def _release_admission_thread():
+    global _admission_in_flight
+    with _admission_lock:
+        _admission_in_flight -= 1
+
+
+def admission_controller(endpoint):
+    """Controlador del endpoint (None si no tiene límite)"""
+    limit = ADMISSION_LIMITS.get(endpoint, ADMISSION_MAX_CONCURRENT)
+    if limit <= 0:
+        return None
+    with _admission_lock:
+        if endpoint not in _admission_controllers:
+            _admission_controllers[endpoint] = AdmissionController(limit, ADMISSION_MAX_WAITING)
+        return _admission_controllers[endpoint]
+
+
+def admission_controlled(view):
+    """Aplica el control de admisión del endpoint antes de decodificar"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        endpoint = request.url_rule.rule
+        g.arrival = time.monotonic()
+        controller = admission_controller(endpoint)
+        if controller is None:
+            return view(*args, **kwargs)
+
+        if _take_admission_thread():
+            mode = controller.acquire(ADMISSION_WAIT_TIMEOUT)
+            if mode == 'shed':
+                _release_admission_thread()
+        else:
+            mode = 'shed'
+        ADMISSIONS_TOTAL.labels(endpoint=endpoint, mode=mode).inc()
+        if mode == 'shed':
+            logger.debug("🚦 [%s] Servicio saturado, petición descartada", endpoint)
+            response = jsonify({"error": "Servicio saturado, reintenta más tarde"})
+            response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER)
+            return response, 503
+        if mode == 'degraded':
+            logger.debug(
+                "🚦 [%s] Sin lugar tras %.1fs, solo técnicas básicas",
+                endpoint, ADMISSION_WAIT_TIMEOUT)
+            g.degraded = True
+
+        def release():
+            if mode == 'full':
+                controller.release()
+            _release_admission_thread()
+
+        release_on_close = False
+        try:
+            response = view(*args, **kwargs)
+            # Las respuestas en streaming decodifican después de que la vista retorna:
+            # el lugar se libera cuando el servidor cierra la respuesta
+            if isinstance(response, Response) and response.is_streamed:
+                response.call_on_close(release)
+                release_on_close = True
+            return response
+        finally:
+            if not release_on_close:
+                release()
+    return wrapper
 
 
 @app.route('/scan', methods=['POST'])
+@admission_controlled
 def scan_qr():
     """Endpoint principal para escanear QR"""
     client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
-    logger.info(f"📥 [/scan] Nueva petición desde {client_ip}")
+    logger.debug("📥 [/scan] Nueva petición desde %s", client_ip)
 
-    if 'file' not in request.files:
-        logger.warning(
-            f"❌ [/scan] {client_ip} - No se encontró archivo en la petición")
-        return jsonify({"error": "No se encontró archivo"}), 400
+    # Cuerpo binario (application/octet-stream o image/*): sin multipart ni base64
+    image_data = raw_image_body()
+    if image_data is not None:
+        filename = 'cuerpo binario'
+        if not image_data:
+            logger.debug("❌ [/scan] %s - Cuerpo vacío", client_ip)
+            return jsonify({"error": "Archivo vacío"}), 400
+    else:
+        if 'file' not in request.files:
+            logger.debug("❌ [/scan] %s - No se encontró archivo en la petición", client_ip)
+            return jsonify({"error": "No se encontró archivo"}), 400
 
-    file = request.files['file']
-    filename = file.filename or 'sin_nombre'
+        file = request.files['file']
+        filename = file.filename or 'sin_nombre'
 
-    if file.filename == '':
-        logger.warning(f"❌ [/scan] {client_ip} - Archivo vacío")
-        return jsonify({"error": "Archivo vacío"}), 400
+        if file.filename == '':
+            logger.debug("❌ [/scan] %s - Archivo vacío", client_ip)
+            return jsonify({"error": "Archivo vacío"}), 400
 
-    logger.info(f"📸 [/scan] {client_ip} - Procesando archivo: {filename}")
+    logger.debug("📸 [/scan] %s - Procesando archivo: %s", client_ip, filename)
 
     try:
-        img = Image.open(file.stream)
-        logger.info(
-            f"🖼️  [/scan] {client_ip} - Imagen cargada: {img.size} píxeles, modo: {img.mode}")
+        if image_data is None:
+            image_data = file.read()
 
-        start_time = datetime.now()
-        qr_text = decode_qr(img)
-        processing_time = (datetime.now() - start_time).total_seconds()
+        start_time = time.perf_counter()
+        result = decode_image_bytes(image_data, 'qr', **decode_options())
+        qr_text = result.text
+        processing_time = time.perf_counter() - start_time
 
         if qr_text:
-            logger.info(
-                f"✅ [/scan] {client_ip} - QR detectado en {processing_time:.2f}s: '{qr_text}'")
-            return jsonify({"text": qr_text})
+            logger.debug("✅ [/scan] %s - QR detectado en %.2fs", client_ip, processing_time)
+            return jsonify(result_payload(result))
+        elif result.timed_out:
+            logger.debug(
+                "⏱️ [/scan] %s - Plazo de decodificación agotado después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({"error": "Tiempo de decodificación agotado", "timed_out": True}), 504
         else:
-            logger.warning(
-                f"❌ [/scan] {client_ip} - No se detectó QR después de {processing_time:.2f}s")
-            return jsonify({"error": "No se pudo detectar código QR"}), 404
+            logger.debug(
+                "❌ [/scan] %s - No se detectó QR después de %.2fs", client_ip, processing_time)
+            return jsonify({"error": "No se pudo detectar código QR", **degraded_fields(result)}), 404
 
     except Exception as e:
-        logger.error(
-            f"💥 [/scan] {client_ip} - Error procesando {filename}: {str(e)}")
+        logger.error("💥 [/scan] %s - Error procesando %s: %s", client_ip, filename, e)
         return jsonify({"error": f"Error: {str(e)}"}), 500
 
 
 @app.route('/scan-base64', methods=['POST'])
+@admission_controlled
 def scan_qr_base64():
     """Endpoint para escanear QR desde base64"""
     client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
-    logger.info(f"📥 [/scan-base64] Nueva petición desde {client_ip}")
+    logger.debug("📥 [/scan-base64] Nueva petición desde %s", client_ip)
 
     try:
         json_data = request.get_json()
         if not json_data or 'image' not in json_data:
-            logger.warning(
-                f"❌ [/scan-base64] {client_ip} - Falta campo 'image' en JSON")
+            logger.debug("❌ [/scan-base64] %s - Falta campo 'image' en JSON", client_ip)
             return jsonify({"error": "Falta el campo 'image' con datos base64"}), 400
 
         base64_string = json_data['image']
         base64_length = len(base64_string)
-        logger.info(
-            f"📊 [/scan-base64] {client_ip} - Base64 recibido: {base64_length} caracteres")
+        logger.debug(
+            "📊 [/scan-base64] %s - Base64 recibido: %s caracteres", client_ip, base64_length)
 
         # Remover prefijo data:image si existe
         if base64_string.startswith('data:image'):
             base64_string = base64_string.split(',')[1]
-            logger.info(
-                f"🔧 [/scan-base64] {client_ip} - Removido prefijo data:image")
-
-        # Decodificar base64
-        image_data = base64.b64decode(base64_string)
-        logger.info(
-            f"🔓 [/scan-base64] {client_ip} - Base64 decodificado: {len(image_data)} bytes")
+            logger.debug("🔧 [/scan-base64] %s - Removido prefijo data:image", client_ip)
 
-        # Crear imagen desde bytes
-        img = Image.open(io.BytesIO(image_data))
-        logger.info(
-            f"🖼️  [/scan-base64] {client_ip} - Imagen creada: {img.size} píxeles, modo: {img.mode}")
+        # Decodificar base64
+        image_data = base64.b64decode(base64_string)
+        logger.debug(
+            "🔓 [/scan-base64] %s - Base64 decodificado: %s bytes", client_ip, len(image_data))
 
-        start_time = datetime.now()
-        qr_text = decode_qr(img)
-        processing_time = (datetime.now() - start_time).total_seconds()
+        start_time = time.perf_counter()
+        result = decode_image_bytes(image_data, 'qr', **decode_options(json_data))
+        qr_text = result.text
+        processing_time = time.perf_counter() - start_time
 
         if qr_text:
-            logger.info(
-                f"✅ [/scan-base64] {client_ip} - QR detectado en {processing_time:.2f}s: '{qr_text}'")
-            return jsonify({"text": qr_text})
+            logger.debug("✅ [/scan-base64] %s - QR detectado en %.2fs", client_ip, processing_time)
+            return jsonify(result_payload(result))
+        elif result.timed_out:
+            logger.debug(
+                "⏱️ [/scan-base64] %s - Plazo de decodificación agotado después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({"error": "Tiempo de decodificación agotado", "timed_out": True}), 504
         else:
-            logger.warning(
-                f"❌ [/scan-base64] {client_ip} - No se detectó QR después de {processing_time:.2f}s")
-            return jsonify({"error": "No se pudo detectar código QR"}), 404
+            logger.debug(
+                "❌ [/scan-base64] %s - No se detectó QR después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({"error": "No se pudo detectar código QR", **degraded_fields(result)}), 404
 
     except Exception as e:
-        logger.error(f"💥 [/scan-base64] {client_ip} - Error: {str(e)}")
+        logger.error("💥 [/scan-base64] %s - Error: %s", client_ip, e)
         return jsonify({"error": f"Error: {str(e)}"}), 500
 
 
 @app.route('/scan-url', methods=['POST'])
+@admission_controlled
 def scan_qr_from_url():
     """Endpoint para escanear QR desde URL de imagen"""
     client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
-    logger.info(f"📥 [/scan-url] Nueva petición desde {client_ip}")
+    logger.debug("📥 [/scan-url] Nueva petición desde %s", client_ip)
 
-    start_time = datetime.now()
+    start_time = time.perf_counter()
 
     try:
         data = request.get_json()
         if not data or 'url' not in data:
-            logger.warning(
-                f"❌ [/scan-url] {client_ip} - Falta campo 'url' en JSON")
+            logger.debug("❌ [/scan-url] %s - Falta campo 'url' en JSON", client_ip)
             return jsonify({'error': 'Falta el campo "url" con la URL de la imagen'}), 400
 
         image_url = data['url']
-        logger.info(
-            f"🔗 [/scan-url] {client_ip} - Descargando desde: {image_url}")
-
-        # Descargar imagen
-        response = requests.get(image_url, timeout=30)
-        response.raise_for_status()
-        logger.info(
-            f"📥 [/scan-url] {client_ip} - Imagen descargada: {len(response.content)} bytes")
+        logger.debug("🔗 [/scan-url] %s - Descargando desde: %s", client_ip, image_url)
 
-        # Convertir a imagen PIL desde bytes
-        img = Image.open(io.BytesIO(response.content))
-        logger.info(
-            f"�️  [/scan-url] {client_ip} - Imagen creada: {img.size} píxeles, modo: {img.mode}")
+        # Descargar imagen (pool de conexiones, tamaño máximo verificado en streaming)
+        image_data = download_image(image_url)
+        logger.debug("📥 [/scan-url] %s - Imagen descargada: %s bytes", client_ip, len(image_data))
 
         # Procesar QR
-        qr_text = decode_qr(img)
-        processing_time = (datetime.now() - start_time).total_seconds()
+        result = decode_image_bytes(image_data, 'qr', **decode_options(data))
+        qr_text = result.text
+        processing_time = time.perf_counter() - start_time
 
         if qr_text:
-            logger.info(
-                f"✅ [/scan-url] {client_ip} - QR detectado en {processing_time:.2f}s: '{qr_text}'")
-            return jsonify({'text': qr_text})
+            logger.debug("✅ [/scan-url] %s - QR detectado en %.2fs", client_ip, processing_time)
+            return jsonify(result_payload(result))
+        elif result.timed_out:
+            logger.debug(
+                "⏱️ [/scan-url] %s - Plazo de decodificación agotado después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({'error': 'Tiempo de decodificación agotado', 'timed_out': True}), 504
         else:
-            logger.warning(
-                f"❌ [/scan-url] {client_ip} - No se detectó QR después de {processing_time:.2f}s")
-            return jsonify({'error': 'No se encontró código QR'}), 404
+            logger.debug(
+                "❌ [/scan-url] %s - No se detectó QR después de %.2fs", client_ip, processing_time)
+            return jsonify({'error': 'No se encontró código QR', **degraded_fields(result)}), 404
 
+    except ImageTooLargeError as e:
+        logger.debug("❌ [/scan-url] %s - %s", client_ip, e)
+        return jsonify({'error': str(e)}), 413
     except requests.exceptions.RequestException as e:
-        processing_time = (datetime.now() - start_time).total_seconds()
+        processing_time = time.perf_counter() - start_time
         logger.error(
-            f"💥 [/scan-url] {client_ip} - Error descargando imagen en {processing_time:.2f}s: {str(e)}")
+            "💥 [/scan-url] %s - Error descargando imagen en %.2fs: %s",
+            client_ip, processing_time, e)
         return jsonify({'error': f'Error descargando imagen: {str(e)}'}), 500
     except Exception as e:
-        processing_time = (datetime.now() - start_time).total_seconds()
+        processing_time = time.perf_counter() - start_time
         logger.error(
-            f"💥 [/scan-url] {client_ip} - Error procesando URL en {processing_time:.2f}s: {str(e)}")
+            "💥 [/scan-url] %s - Error procesando URL en %.2fs: %s", client_ip, processing_time, e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -516,182 +3103,1372 @@ def scan_qr_from_url():
 # ======================================
 
 @app.route('/scan-datamatrix', methods=['POST'])
+@admission_controlled
 def scan_datamatrix():
-    """Endpoint principal para escanear DataMatrix"""
+    """Endpoint principal para escanear DataMatrix
+
+    El plazo pedido ('timeout') se acota a DATAMATRIX_BUDGET; si eso lo acorta, la
+    respuesta (200, 404 o 504) incluye 'effective_timeout' con el plazo aplicado.
+    """
     client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
-    logger.info(f"📥 [/scan-datamatrix] Nueva petición desde {client_ip}")
+    logger.debug("📥 [/scan-datamatrix] Nueva petición desde %s", client_ip)
 
-    if 'file' not in request.files:
-        logger.warning(
-            f"❌ [/scan-datamatrix] {client_ip} - No se encontró archivo en la petición")
-        return jsonify({"error": "No se encontró archivo"}), 400
+    # Cuerpo binario (application/octet-stream o image/*): sin multipart ni base64
+    image_data = raw_image_body()
+    if image_data is not None:
+        filename = 'cuerpo binario'
+        if not image_data:
+            logger.debug("❌ [/scan-datamatrix] %s - Cuerpo vacío", client_ip)
+            return jsonify({"error": "Archivo vacío"}), 400
+    else:
+        if 'file' not in request.files:
+            logger.debug(
+                "❌ [/scan-datamatrix] %s - No se encontró archivo en la petición", client_ip)
+            return jsonify({"error": "No se encontró archivo"}), 400
 
-    file = request.files['file']
-    filename = file.filename or 'sin_nombre'
+        file = request.files['file']
+        filename = file.filename or 'sin_nombre'
 
-    if file.filename == '':
-        logger.warning(f"❌ [/scan-datamatrix] {client_ip} - Archivo vacío")
-        return jsonify({"error": "Archivo vacío"}), 400
+        if file.filename == '':
+            logger.debug("❌ [/scan-datamatrix] %s - Archivo vacío", client_ip)
+            return jsonify({"error": "Archivo vacío"}), 400
 
-    logger.info(
-        f"📸 [/scan-datamatrix] {client_ip} - Procesando archivo: {filename}")
+    logger.debug("📸 [/scan-datamatrix] %s - Procesando archivo: %s", client_ip, filename)
 
     try:
-        img = Image.open(file.stream)
-        logger.info(
-            f"🖼️  [/scan-datamatrix] {client_ip} - Imagen cargada: {img.size} píxeles, modo: {img.mode}")
+        if image_data is None:
+            image_data = file.read()
 
-        start_time = datetime.now()
-        datamatrix_text = decode_datamatrix(img)
-        processing_time = (datetime.now() - start_time).total_seconds()
+        start_time = time.perf_counter()
+        result = decode_image_bytes(image_data, 'datamatrix', **decode_options())
+        datamatrix_text = result.text
+        processing_time = time.perf_counter() - start_time
 
         if datamatrix_text:
-            logger.info(
-                f"✅ [/scan-datamatrix] {client_ip} - DataMatrix detectado en {processing_time:.2f}s: '{datamatrix_text}'")
-            return jsonify({"text": datamatrix_text})
+            logger.debug(
+                "✅ [/scan-datamatrix] %s - DataMatrix detectado en %.2fs",
+                client_ip, processing_time)
+            return jsonify(result_payload(result))
+        elif result.timed_out:
+            logger.debug(
+                "⏱️ [/scan-datamatrix] %s - Plazo de decodificación agotado después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({"error": "Tiempo de decodificación agotado", "timed_out": True,
+                            **degraded_fields(result)}), 504
         else:
-            logger.warning(
-                f"❌ [/scan-datamatrix] {client_ip} - No se detectó DataMatrix después de {processing_time:.2f}s")
-            return jsonify({"error": "No se pudo detectar código DataMatrix"}), 404
+            logger.debug(
+                "❌ [/scan-datamatrix] %s - No se detectó DataMatrix después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({"error": "No se pudo detectar código DataMatrix", **degraded_fields(result)}), 404
 
     except Exception as e:
-        logger.error(
-            f"💥 [/scan-datamatrix] {client_ip} - Error procesando {filename}: {str(e)}")
+        logger.error("💥 [/scan-datamatrix] %s - Error procesando %s: %s", client_ip, filename, e)
         return jsonify({"error": f"Error: {str(e)}"}), 500
 
 
 @app.route('/scan-datamatrix-base64', methods=['POST'])
+@admission_controlled
 def scan_datamatrix_base64():
-    """Endpoint para escanear DataMatrix desde base64"""
+    """Endpoint para escanear DataMatrix desde base64
+
+    El plazo pedido ('timeout') se acota a DATAMATRIX_BUDGET; si eso lo acorta, la
+    respuesta (200, 404 o 504) incluye 'effective_timeout' con el plazo aplicado.
+    """
     client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
-    logger.info(
-        f"📥 [/scan-datamatrix-base64] Nueva petición desde {client_ip}")
+    logger.debug("📥 [/scan-datamatrix-base64] Nueva petición desde %s", client_ip)
 
     try:
         json_data = request.get_json()
         if not json_data or 'image' not in json_data:
-            logger.warning(
-                f"❌ [/scan-datamatrix-base64] {client_ip} - Falta campo 'image' en JSON")
+            logger.debug("❌ [/scan-datamatrix-base64] %s - Falta campo 'image' en JSON", client_ip)
             return jsonify({"error": "Falta el campo 'image' con datos base64"}), 400
 
         base64_string = json_data['image']
         base64_length = len(base64_string)
-        logger.info(
-            f"📊 [/scan-datamatrix-base64] {client_ip} - Base64 recibido: {base64_length} caracteres")
+        logger.debug(
+            "📊 [/scan-datamatrix-base64] %s - Base64 recibido: %s caracteres",
+            client_ip, base64_length)
 
         # Remover prefijo data:image si existe
         if base64_string.startswith('data:image'):
             base64_string = base64_string.split(',')[1]
-            logger.info(
-                f"🔧 [/scan-datamatrix-base64] {client_ip} - Removido prefijo data:image")
+            logger.debug("🔧 [/scan-datamatrix-base64] %s - Removido prefijo data:image", client_ip)
 
         # Decodificar base64
         image_data = base64.b64decode(base64_string)
-        logger.info(
-            f"🔓 [/scan-datamatrix-base64] {client_ip} - Base64 decodificado: {len(image_data)} bytes")
-
-        # Crear imagen desde bytes
-        img = Image.open(io.BytesIO(image_data))
-        logger.info(
-            f"🖼️  [/scan-datamatrix-base64] {client_ip} - Imagen creada: {img.size} píxeles, modo: {img.mode}")
+        logger.debug(
+            "🔓 [/scan-datamatrix-base64] %s - Base64 decodificado: %s bytes",
+            client_ip, len(image_data))
 
         # Procesar DataMatrix
-        start_time = datetime.now()
-        datamatrix_text = decode_datamatrix(img)
-        processing_time = (datetime.now() - start_time).total_seconds()
+        start_time = time.perf_counter()
+        result = decode_image_bytes(image_data, 'datamatrix', **decode_options(json_data))
+        datamatrix_text = result.text
+        processing_time = time.perf_counter() - start_time
 
         if datamatrix_text:
-            logger.info(
-                f"✅ [/scan-datamatrix-base64] {client_ip} - DataMatrix detectado en {processing_time:.2f}s: '{datamatrix_text}'")
-            return jsonify({"text": datamatrix_text})
+            logger.debug(
+                "✅ [/scan-datamatrix-base64] %s - DataMatrix detectado en %.2fs",
+                client_ip, processing_time)
+            return jsonify(result_payload(result))
+        elif result.timed_out:
+            logger.debug(
+                "⏱️ [/scan-datamatrix-base64] %s - Plazo de decodificación agotado después de "
+                "%.2fs", client_ip, processing_time)
+            return jsonify({"error": "Tiempo de decodificación agotado", "timed_out": True,
+                            **degraded_fields(result)}), 504
         else:
-            logger.warning(
-                f"❌ [/scan-datamatrix-base64] {client_ip} - No se detectó DataMatrix después de {processing_time:.2f}s")
-            return jsonify({"error": "No se encontró código DataMatrix"}), 404
+            logger.debug(
+                "❌ [/scan-datamatrix-base64] %s - No se detectó DataMatrix después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({"error": "No se encontró código DataMatrix", **degraded_fields(result)}), 404
 
     except Exception as e:
         processing_time = (
-            datetime.now() - start_time).total_seconds() if 'start_time' in locals() else 0
+            time.perf_counter() - start_time) if 'start_time' in locals() else 0
         logger.error(
-            f"💥 [/scan-datamatrix-base64] {client_ip} - Error procesando en {processing_time:.2f}s: {str(e)}")
+            "💥 [/scan-datamatrix-base64] %s - Error procesando en %.2fs: %s",
+            client_ip, processing_time, e)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/scan-datamatrix-url', methods=['POST'])
+@admission_controlled
 def scan_datamatrix_url():
-    """Endpoint para escanear DataMatrix desde URL"""
+    """Endpoint para escanear DataMatrix desde URL
+
+    El plazo pedido ('timeout') se acota a DATAMATRIX_BUDGET; si eso lo acorta, la
+    respuesta (200, 404 o 504) incluye 'effective_timeout' con el plazo aplicado.
+    """
     client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
-    start_time = datetime.now()
-    logger.info(f"📥 [/scan-datamatrix-url] Nueva petición desde {client_ip}")
+    start_time = time.perf_counter()
+    logger.debug("📥 [/scan-datamatrix-url] Nueva petición desde %s", client_ip)
 
     try:
         data = request.get_json()
         if not data or 'url' not in data:
-            logger.warning(
-                f"❌ [/scan-datamatrix-url] {client_ip} - Falta campo 'url' en JSON")
+            logger.debug("❌ [/scan-datamatrix-url] %s - Falta campo 'url' en JSON", client_ip)
             return jsonify({'error': 'Falta el campo "url" con la URL de la imagen'}), 400
 
         image_url = data['url']
-        logger.info(
-            f"🔗 [/scan-datamatrix-url] {client_ip} - Descargando desde: {image_url}")
-
-        # Descargar imagen
-        response = requests.get(image_url, timeout=30)
-        response.raise_for_status()
-        logger.info(
-            f"📥 [/scan-datamatrix-url] {client_ip} - Imagen descargada: {len(response.content)} bytes")
+        logger.debug("🔗 [/scan-datamatrix-url] %s - Descargando desde: %s", client_ip, image_url)
 
-        # Convertir a imagen PIL desde bytes
-        img = Image.open(io.BytesIO(response.content))
-        logger.info(
-            f"🖼️  [/scan-datamatrix-url] {client_ip} - Imagen creada: {img.size} píxeles, modo: {img.mode}")
+        # Descargar imagen (pool de conexiones, tamaño máximo verificado en streaming)
+        image_data = download_image(image_url)
+        logger.debug(
+            "📥 [/scan-datamatrix-url] %s - Imagen descargada: %s bytes",
+            client_ip, len(image_data))
 
         # Procesar DataMatrix
-        datamatrix_text = decode_datamatrix(img)
-        processing_time = (datetime.now() - start_time).total_seconds()
+        result = decode_image_bytes(image_data, 'datamatrix', **decode_options(data))
+        datamatrix_text = result.text
+        processing_time = time.perf_counter() - start_time
 
         if datamatrix_text:
-            logger.info(
-                f"✅ [/scan-datamatrix-url] {client_ip} - DataMatrix detectado en {processing_time:.2f}s: '{datamatrix_text}'")
-            return jsonify({'text': datamatrix_text})
+            logger.debug(
+                "✅ [/scan-datamatrix-url] %s - DataMatrix detectado en %.2fs",
+                client_ip, processing_time)
+            return jsonify(result_payload(result))
+        elif result.timed_out:
+            logger.debug(
+                "⏱️ [/scan-datamatrix-url] %s - Plazo de decodificación agotado después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({'error': 'Tiempo de decodificación agotado', 'timed_out': True,
+                            **degraded_fields(result)}), 504
         else:
-            logger.warning(
-                f"❌ [/scan-datamatrix-url] {client_ip} - No se detectó DataMatrix después de {processing_time:.2f}s")
-            return jsonify({'error': 'No se encontró código DataMatrix'}), 404
+            logger.debug(
+                "❌ [/scan-datamatrix-url] %s - No se detectó DataMatrix después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({'error': 'No se encontró código DataMatrix', **degraded_fields(result)}), 404
 
+    except ImageTooLargeError as e:
+        logger.debug("❌ [/scan-datamatrix-url] %s - %s", client_ip, e)
+        return jsonify({'error': str(e)}), 413
     except requests.exceptions.RequestException as e:
-        processing_time = (datetime.now() - start_time).total_seconds()
+        processing_time = time.perf_counter() - start_time
         logger.error(
-            f"💥 [/scan-datamatrix-url] {client_ip} - Error descargando imagen en {processing_time:.2f}s: {str(e)}")
+            "💥 [/scan-datamatrix-url] %s - Error descargando imagen en %.2fs: %s",
+            client_ip, processing_time, e)
         return jsonify({'error': f'Error descargando imagen: {str(e)}'}), 500
     except Exception as e:
-        processing_time = (datetime.now() - start_time).total_seconds()
+        processing_time = time.perf_counter() - start_time
         logger.error(
-            f"💥 [/scan-datamatrix-url] {client_ip} - Error procesando URL en {processing_time:.2f}s: {str(e)}")
+            "💥 [/scan-datamatrix-url] %s - Error procesando URL en %.2fs: %s",
+            client_ip, processing_time, e)
         return jsonify({'error': str(e)}), 500
 
 
+# ======================================
+# 🔎 DETECCIÓN AUTOMÁTICA DE SIMBOLOGÍA
+# ======================================
+
+@app.route('/scan-any', methods=['POST'])
+@admission_controlled
+def scan_any():
+    """Escanea QR, DataMatrix o código de barras sin indicar la simbología.
+
+    Acepta cuerpo binario, multipart 'file', JSON con 'image' (base64) o JSON con 'url'.
+    El plazo pedido ('timeout') se acota a DATAMATRIX_BUDGET; si eso lo acorta, la
+    respuesta (200, 404 o 504) incluye 'effective_timeout' con el plazo aplicado.
+    """
+    client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
+    logger.debug("📥 [/scan-any] Nueva petición desde %s", client_ip)
+    start_time = time.perf_counter()
+
+    try:
+        json_data = request.get_json(silent=True) if request.is_json else None
+        image_data = raw_image_body()
+        if image_data is None:
+            if 'file' in request.files:
+                image_data = request.files['file'].read()
+            elif json_data and json_data.get('image'):
+                image_data = decode_base64_image(json_data['image'])
+            elif json_data and json_data.get('url'):
+                logger.debug(
+                    "🔗 [/scan-any] %s - Descargando desde: %s", client_ip, json_data['url'])
+                image_data = download_image(json_data['url'])
+            else:
+                logger.debug("❌ [/scan-any] %s - Petición sin imagen", client_ip)
+                return jsonify({"error": "Envía la imagen como cuerpo binario, archivo 'file' o JSON con 'image' (base64) o 'url'"}), 400
+        if not image_data:
+            return jsonify({"error": "Archivo vacío"}), 400
+
+        result = decode_image_bytes(image_data, 'any', **decode_options(json_data))
+        processing_time = time.perf_counter() - start_time
+
+        if result.text:
+            logger.debug(
+                "✅ [/scan-any] %s - %s detectado en %.2fs",
+                client_ip, result.symbology, processing_time)
+            return jsonify(symbology=result.symbology, **result_payload(result))
+        elif result.timed_out:
+            logger.debug(
+                "⏱️ [/scan-any] %s - Plazo de decodificación agotado después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({"error": "Tiempo de decodificación agotado", "timed_out": True,
+                            **degraded_fields(result)}), 504
+        else:
+            logger.debug(
+                "❌ [/scan-any] %s - No se detectó ningún código después de %.2fs",
+                client_ip, processing_time)
+            return jsonify({"error": "No se detectó ningún código", **degraded_fields(result)}), 404
+
+    except ImageTooLargeError as e:
+        logger.debug("❌ [/scan-any] %s - %s", client_ip, e)
+        return jsonify({"error": str(e)}), 413
+    except requests.exceptions.RequestException as e:
+        logger.error("💥 [/scan-any] %s - Error descargando imagen: %s", client_ip, e)
+        return jsonify({"error": f"Error descargando imagen: {str(e)}"}), 500
+    except Exception as e:
+        logger.error("💥 [/scan-any] %s - Error: %s", client_ip, e)
+        return jsonify({"error": f"Error: {str(e)}"}), 500
+
+
+# ======================================
+# 📦 BATCH ENDPOINTS
+# ======================================
+
+# Máximo de imágenes por petición batch
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 500))
+
+# Imágenes de un batch que se procesan a la vez (pool compartido por el proceso)
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+
+# Plazo total (segundos) de una petición batch desde su llegada: el plazo de cada
+# imagen se acota al restante y las que no alcanzan a empezar quedan 'timed_out'
+# (0 = sin límite)
+BATCH_TIMEOUT = float(os.environ.get('BATCH_TIMEOUT', 120))
+
+
+def decode_base64_image(base64_string):
+    """Decodifica base64 (con o sin prefijo data:image) a bytes"""
+    if base64_string.startswith('data:image'):
+        base64_string = base64_string.split(',')[1]
+    return base64.b64decode(base64_string)
+
+
+class BatchTooLargeError(ValueError):
+    """El batch supera BATCH_MAX_ITEMS"""
+
+
+def collect_batch_items(json_data):
+    """Arma la lista de (nombre, cargador de bytes) desde multipart o JSON.
+
+    El límite de imágenes se verifica antes de leer nada, y las URLs se descargan
+    recién cuando un hilo del batch toma la imagen: a lo sumo BATCH_WORKERS
+    descargas en vuelo, y ninguna si el batch se rechaza.
+    """
+    files = request.files.getlist('files') + request.files.getlist('file')
+    entries = files or (json_data or {}).get('images') or []
+    if len(entries) > BATCH_MAX_ITEMS:
+        raise BatchTooLargeError(f"Máximo {BATCH_MAX_ITEMS} imágenes por batch")
+    if files:
+        # Los archivos se leen aquí: en modo streaming la petición ya pudo cerrarlos
+        return [(file.filename or f'archivo_{i}', lambda data=file.read(): data)
+                for i, file in enumerate(files)]
+
+    items = []
+    for i, entry in enumerate(entries):
+        if isinstance(entry, dict):
+            url, image = entry.get('url'), entry.get('image')
+            name = entry.get('name') or url or f'imagen_{i}'
+        elif isinstance(entry, str) and entry.startswith(('http://', 'https://')):
+            url, image, name = entry, None, entry
+        else:
+            url, image, name = None, entry, f'imagen_{i}'
+
+        if url:
+            # Se descarga en el hilo del batch, solapada con la decodificación de otras
+            items.append((name, functools.partial(download_image, url)))
+        elif isinstance(image, str):
+            items.append((name, functools.partial(decode_base64_image, image)))
+        else:
+            items.append((name, None))
+    return items
+
+
+def scan_batch_item(index, name, loader, symbology, options, batch_deadline=None):
+    """Procesa una imagen del batch y devuelve su resultado con tiempo y estado"""
+    start = time.perf_counter()
+    item = {'index': index, 'name': name}
+    try:
+        if loader is None:
+            raise ValueError("Elemento inválido: se espera base64, URL o {'image'|'url': ...}")
+        deadline = Deadline(options.get('timeout'))
+        if batch_deadline is not None:
+            if batch_deadline.expired():
+                item.update(status='timed_out', error='Plazo del batch agotado',
+                            processing_time=0.0)
+                return item
+            deadline = deadline.capped(batch_deadline.remaining())
+        result = decode_image_bytes(loader(), symbology, **dict(options, deadline=deadline))
+        if result.text:
+            item.update(status='ok', symbology=result.symbology, **result_payload(result))
+        elif result.timed_out:
+            item.update(status='timed_out', error='Tiempo de decodificación agotado',
+                        **degraded_fields(result))
+        else:
+            item.update(status='not_found', error='No se detectó código',
+                        **degraded_fields(result))
+    except requests.exceptions.RequestException as e:
+        item.update(status='error', error=f'Error descargando imagen: {str(e)}')
+    except Exception as e:
+        item.update(status='error', error=str(e))
+    item['processing_time'] = round(time.perf_counter() - start, 4)
+    return item
+
+
+def scan_batch(endpoint, symbology):
+    """Decodifica muchas imágenes en una sola petición, en paralelo"""
+    client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
+    logger.debug("📥 [%s] Nueva petición desde %s", endpoint, client_ip)
+    start_time = time.perf_counter()
+
+    try:
+        json_data = request.get_json(silent=True) if request.is_json else None
+        symbology = requested_option(json_data, 'symbology') or symbology
+        if symbology not in DECODE_FUNCTIONS:
+            return jsonify({"error": f"Simbología desconocida: {symbology}"}), 400
+
+        try:
+            items = collect_batch_items(json_data)
+        except BatchTooLargeError as e:
+            return jsonify({"error": str(e)}), 413
+        if not items:
+            logger.debug("❌ [%s] %s - Batch vacío", endpoint, client_ip)
+            return jsonify({"error": "Envía archivos 'files' (multipart) o un JSON con 'images'"}), 400
+
+        options = decode_options(json_data)
+        # El plazo pedido es por imagen, acotado por el del batch completo
+        options.pop('deadline', None)
+        batch_deadline = Deadline(BATCH_TIMEOUT, started=g.get('arrival'))
+        stream = parse_flag(requested_option(json_data, 'stream'))
+        logger.debug(
+            "📦 [%s] %s - Batch de %s imágenes (%s)", endpoint, client_ip, len(items), symbology)
+
+        pool = get_pool('batch', BATCH_WORKERS)
+        futures = [pool.submit(scan_batch_item, i, name, loader, symbology, options,
+                               batch_deadline)
+                   for i, (name, loader) in enumerate(items)]
+
+        if stream:
+            # NDJSON: cada resultado se envía apenas termina; si el cliente se
+            # desconecta, las imágenes que no empezaron se cancelan
+            def generate():
+                try:
+                    for future in as_completed(futures):
+                        yield json.dumps(future.result()) + '\n'
+                finally:
+                    for future in futures:
+                        future.cancel()
+            return Response(stream_with_context(generate()),
+                            mimetype='application/x-ndjson')
+
+        try:
+            results = [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+        processing_time = time.perf_counter() - start_time
+        found = sum(1 for item in results if item['status'] == 'ok')
+        logger.debug(
+            "✅ [%s] %s - %s/%s códigos detectados en %.2fs",
+            endpoint, client_ip, found, len(results), processing_time)
+        return jsonify({"count": len(results), "found": found,
+                        "processing_time": round(processing_time, 4),
+                        "results": results})
+
+    except Exception as e:
+        logger.error("💥 [%s] %s - Error: %s", endpoint, client_ip, e)
+        return jsonify({"error": f"Error: {str(e)}"}), 500
+
+
+@app.route('/scan-batch', methods=['POST'])
+@admission_controlled
+def scan_qr_batch():
+    """Endpoint batch para QR (acepta 'symbology': qr | datamatrix | auto | any)"""
+    return scan_batch('/scan-batch', 'qr')
+
+
+@app.route('/scan-datamatrix-batch', methods=['POST'])
+@admission_controlled
+def scan_datamatrix_batch():
+    """Endpoint batch para DataMatrix"""
+    return scan_batch('/scan-datamatrix-batch', 'datamatrix')
+
+
+@app.route('/scan-auto-batch', methods=['POST'])
+@admission_controlled
+def scan_auto_batch():
+    """Endpoint batch que prueba QR y luego DataMatrix en cada imagen"""
+    return scan_batch('/scan-auto-batch', 'auto')
+
+
+# ======================================
+# 🗂️ TRABAJOS ASÍNCRONOS
+# ======================================
+
+# Estado de los trabajos: 'memory' (un solo proceso) o 'sqlite' (consultable desde
+# cualquier worker de gunicorn; el trabajo se ejecuta en el worker que lo aceptó).
+# Por defecto 'sqlite' con varios workers
+JOBS_BACKEND = os.environ.get('JOBS_BACKEND') or ('sqlite' if SERVER_WORKERS > 1 else 'memory')
+JOBS_SQLITE_PATH = os.environ.get('JOBS_SQLITE_PATH', 'logs/jobs.sqlite3')
+# Trabajos en espera por carril; al superarlo se responde 429
+JOBS_MAX_QUEUED = int(os.environ.get('JOBS_MAX_QUEUED', 50))
+# Hilos por carril: 'fast' para imágenes chicas y 'slow' para las grandes, así las
+# baratas no esperan detrás de las difíciles
+JOBS_WORKERS = {'fast': int(os.environ.get('JOBS_FAST_WORKERS', 2)),
+                'slow': int(os.environ.get('JOBS_SLOW_WORKERS', 1))}
+# Imágenes de hasta estos píxeles van al carril rápido
+JOBS_FAST_MAX_PIXELS = int(os.environ.get('JOBS_FAST_MAX_PIXELS', 2_000_000))
+# Segundos que se conservan los trabajos terminados
+JOBS_TTL = float(os.environ.get('JOBS_TTL', 3600))
+# Un trabajo 'queued'/'running' cuyo worker no renovó su latido en este tiempo se da
+# por perdido (el worker se recicló o terminó) y pasa a 'failed'
+JOBS_STALE_AFTER = float(os.environ.get('JOBS_STALE_AFTER', 1800))
+# Cada cuántos segundos el worker dueño renueva 'heartbeat_at' de sus trabajos sin
+# terminar (bastante menos que JOBS_STALE_AFTER): esperar en un carril ocupado no
+# los vuelve perdidos
+JOBS_HEARTBEAT_INTERVAL = float(os.environ.get('JOBS_HEARTBEAT_INTERVAL', 60))
+# Segundos sugeridos en Retry-After cuando la cola está llena
+JOBS_RETRY_AFTER = int(os.environ.get('JOBS_RETRY_AFTER', 5))
+JOBS_WEBHOOK_TIMEOUT = float(os.environ.get('JOBS_WEBHOOK_TIMEOUT', 10))
+JOBS_WEBHOOK_RETRIES = int(os.environ.get('JOBS_WEBHOOK_RETRIES', 3))
+# Hosts de callback_url admitidos aunque resuelvan a direcciones privadas o locales
+# (servicios internos); cualquier otro debe resolver solo a direcciones públicas
+JOBS_CALLBACK_HOSTS = {host.strip().lower() for host in
+                       os.environ.get('JOBS_CALLBACK_HOSTS', '').split(',') if host.strip()}
+
+JOB_FINISHED_STATUSES = ('done', 'failed')
+
+
+class JobStore:
+    """Interfaz de los backends de estado de trabajos (registros: dict serializable a JSON)"""
+
+    def create(self, job):
+        raise NotImplementedError
+
+    def update(self, job_id, unfinished_only=False, **fields):
+        """Actualiza campos y devuelve el registro completo (None si no existe o, con
+        unfinished_only, si el trabajo ya terminó)"""
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def delete(self, job_id):
+        raise NotImplementedError
+
+
+class LocalJobStore(JobStore):
+    """Trabajos en memoria del proceso"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def create(self, job):
+        now = time.time()
+        with self.lock:
+            expired = [job_id for job_id, entry in self.jobs.items()
+                       if (entry.get('finished_at') and now - entry['finished_at'] > self.ttl)
+                       or now - job_last_seen(entry) > JOBS_STALE_AFTER + self.ttl]
+            for job_id in expired:
+                del self.jobs[job_id]
+            self.jobs[job['id']] = dict(job)
+
+    def update(self, job_id, unfinished_only=False, **fields):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or (unfinished_only and job['status'] in JOB_FINISHED_STATUSES):
+                return None
+            job.update(fields)
+            return dict(job)
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def delete(self, job_id):
+        with self.lock:
+            self.jobs.pop(job_id, None)
+
+
+class SQLiteJobStore(JobStore):
+    """Trabajos en SQLite (modo WAL), compartidos por todos los workers de un volumen"""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = None
+        self.conn_pid = None
+
+    def _connection(self):
+        # Una conexión por proceso: no se comparte a través de fork
+        if self.conn is None or self.conn_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=5,
+                                        check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, data TEXT NOT NULL, finished_at REAL)')
+            self.conn_pid = os.getpid()
+        return self.conn
+
+    def create(self, job):
+        with self.lock:
+            conn = self._connection()
+            now = time.time()
+            conn.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?',
+                         (now - self.ttl,))
+            # Trabajos perdidos que nadie consultó
+            conn.execute("DELETE FROM jobs WHERE finished_at IS NULL "
+                         "AND COALESCE(json_extract(data, '$.heartbeat_at'), "
+                         "json_extract(data, '$.created_at')) < ?",
+                         (now - JOBS_STALE_AFTER - self.ttl,))
+            conn.execute('INSERT INTO jobs VALUES (?, ?, ?)',
+                         (job['id'], json.dumps(job), job.get('finished_at')))
+            conn.commit()
+
+    def update(self, job_id, unfinished_only=False, **fields):
+        # Lectura y escritura en una sola transacción: un GET en otro worker que da
+        # el trabajo por perdido no se pisa con el worker que lo termina
+        with self.lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT data, finished_at FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                if row is None or (unfinished_only and row[1] is not None):
+                    conn.rollback()
+                    return None
+                job = json.loads(row[0])
+                job.update(fields)
+                conn.execute('UPDATE jobs SET data = ?, finished_at = ? WHERE id = ?',
+                             (json.dumps(job), job.get('finished_at'), job_id))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            row = self._connection().execute(
+                'SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def delete(self, job_id):
+        with self.lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            conn.commit()
+
+
+def create_job_store(name):
+    if name == 'memory':
+        if SERVER_WORKERS > 1:
+            raise ValueError(
+                f"JOBS_BACKEND=memory no sirve con {SERVER_WORKERS} workers: cada uno "
+                "tendría sus propios trabajos; usa JOBS_BACKEND=sqlite")
+        return LocalJobStore(JOBS_TTL)
+    if name == 'sqlite':
+        return SQLiteJobStore(JOBS_SQLITE_PATH, JOBS_TTL)
+    raise ValueError(f"JOBS_BACKEND desconocido: {name}")
+
+
+class JobQueueFull(Exception):
+    """El carril no admite más trabajos en espera"""
+
+
+class JobQueue:
+    """Carriles de prioridad con profundidad acotada sobre pools de hilos con nombre"""
+
+    def __init__(self, max_queued):
+        self.max_queued = max_queued
+        self.waiting = {lane: 0 for lane in JOBS_WORKERS}
+        self.lock = threading.Lock()
+
+    def submit(self, lane, task, force=False):
+        """Encola una tarea; force la admite aunque el carril esté lleno (reencolados)"""
+        with self.lock:
+            if not force and self.waiting[lane] >= self.max_queued:
+                raise JobQueueFull(f"Cola '{lane}' llena ({self.max_queued} trabajos en espera)")
+            self.waiting[lane] += 1
+        get_pool(f'jobs-{lane}', JOBS_WORKERS[lane]).submit(self._run, lane, task)
+
+    def _run(self, lane, task):
+        with self.lock:
+            self.waiting[lane] -= 1
+        try:
+            task()
+        except Exception as e:
+            logger.error("💥 Trabajo en carril '%s' falló: %s", lane, e)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.waiting)
+
+
+class JobHeartbeat:
+    """Renueva 'heartbeat_at' de los trabajos sin terminar de este proceso"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.jobs = set()
+        self.lock = threading.Lock()
+        self.thread_pid = None
+
+    def track(self, job_id):
+        with self.lock:
+            self.jobs.add(job_id)
+            # Un hilo por proceso, creado en el worker (no en el master antes del fork)
+            if self.thread_pid != os.getpid():
+                self.thread_pid = os.getpid()
+                threading.Thread(target=self._run, name='jobs-heartbeat',
+                                 daemon=True).start()
+
+    def untrack(self, job_id):
+        with self.lock:
+            self.jobs.discard(job_id)
+
+    def beat(self):
+        with self.lock:
+            jobs = list(self.jobs)
+        now = time.time()
+        for job_id in jobs:
+            try:
+                if job_store.update(job_id, unfinished_only=True, heartbeat_at=now) is None:
+                    self.untrack(job_id)
+            except Exception as e:
+                logger.warning("⚠️ No se pudo renovar el trabajo %s: %s", job_id, e)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.beat()
+
+
+def job_last_seen(job):
+    """Último latido del worker dueño del trabajo (o su creación)"""
+    return job.get('heartbeat_at') or job['created_at']
+
+
+job_store = create_job_store(JOBS_BACKEND)
+job_queue = JobQueue(JOBS_MAX_QUEUED)
+job_heartbeat = JobHeartbeat(JOBS_HEARTBEAT_INTERVAL)
+
+
+def job_lane(image_data):
+    """Carril según los píxeles declarados en la cabecera (sin decodificar)"""
+    size = _image_dimensions(image_data)
+    if size and size[0] * size[1] <= JOBS_FAST_MAX_PIXELS:
+        return 'fast'
+    return 'slow'
+
+
+def run_job(job_id, symbology, image_data, image_url, options, lane):
+    """Ejecuta un trabajo: descarga si hace falta, decodifica y notifica"""
+    now = time.time()
+    if job_store.update(job_id, unfinished_only=True, status='running', started_at=now,
+                        heartbeat_at=now) is None:
+        # Ya se dio por perdido (o se borró) mientras esperaba en el carril
+        job_heartbeat.untrack(job_id)
+        logger.info("🗂️ Trabajo %s omitido: ya no está pendiente", job_id)
+        return
+    if image_data is None:
+        try:
+            image_data = download_image(image_url)
+        except requests.exceptions.RequestException as e:
+            finish_job(job_id, lane, {'status': 'error',
+                                      'error': f'Error descargando imagen: {str(e)}'})
+            return
+        # Las URL entran al carril rápido; si la imagen resulta grande se pasa al lento
+        if lane == 'fast' and job_lane(image_data) == 'slow':
+            job_store.update(job_id, unfinished_only=True, status='queued', lane='slow')
+            job_queue.submit('slow', functools.partial(
+                run_job, job_id, symbology, image_data, None, options, 'slow'), force=True)
+            return
+
+    item = scan_batch_item(0, job_id, lambda: image_data, symbology, options)
+    del item['index'], item['name']
+    finish_job(job_id, lane, item)
+
+
+def finish_job(job_id, lane, result):
+    status = 'failed' if result['status'] == 'error' else 'done'
+    job = job_store.update(job_id, unfinished_only=True, status=status, result=result,
+                           finished_at=time.time())
+    job_heartbeat.untrack(job_id)
+    JOBS_TOTAL.labels(lane=lane, status=result['status']).inc()
+    if job is None:
+        logger.warning("⚠️ Trabajo %s ya no estaba pendiente: se descarta su resultado", job_id)
+        return
+    logger.info("🗂️ Trabajo %s terminado (%s)", job_id, result['status'])
+    if job.get('callback_url'):
+        get_pool('webhooks', FETCH_WORKERS).submit(send_job_webhook, job)
+
+
+def validate_callback_url(url):
+    """callback_url http(s) cuyo host está en JOBS_CALLBACK_HOSTS o resuelve solo a
+    direcciones públicas (el servidor no debe servir para llamar a su red interna)"""
+    if not isinstance(url, str):
+        raise InvalidOptionError("'callback_url' debe ser una URL http(s)")
+    try:
+        parsed = urllib.parse.urlsplit(url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    except ValueError:
+        raise InvalidOptionError(f"'callback_url' inválida: {url!r}")
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise InvalidOptionError("'callback_url' debe ser una URL http(s)")
+    host = parsed.hostname.lower()
+    if host in JOBS_CALLBACK_HOSTS:
+        return url
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(
+            host, port, type=socket.SOCK_STREAM)}
+    except (socket.gaierror, UnicodeError):
+        raise InvalidOptionError(f"'callback_url': no se pudo resolver {host}")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            raise InvalidOptionError(
+                f"'callback_url' apunta a una dirección no pública ({address})")
+    return url
+
+
+def send_job_webhook(job):
+    """POST del trabajo terminado al callback_url, con reintentos y espera creciente"""
+    try:
+        # Se vuelve a resolver: el DNS pudo cambiar desde que se aceptó el trabajo
+        validate_callback_url(job['callback_url'])
+    except InvalidOptionError as e:
+        logger.warning("⚠️ Webhook del trabajo %s rechazado: %s", job['id'], e)
+        job_store.update(job['id'], callback='rejected')
+        return
+    for attempt in range(1, JOBS_WEBHOOK_RETRIES + 1):
+        try:
+            # Sin seguir redirecciones: podrían llevar a una dirección interna
+            response = get_http_session().post(job['callback_url'], json=job_payload(job),
+                                               timeout=JOBS_WEBHOOK_TIMEOUT,
+                                               allow_redirects=False)
+            response.raise_for_status()
+            if response.is_redirect:
+                raise requests.exceptions.HTTPError(
+                    f"Redirección no admitida ({response.status_code})")
+            job_store.update(job['id'], callback='delivered')
+            return
+        except requests.exceptions.RequestException as e:
+            logger.warning(
+                "⚠️ Webhook del trabajo %s falló (intento %s): %s", job['id'], attempt, e)
+            time.sleep(2 ** (attempt - 1))
+    job_store.update(job['id'], callback='failed')
+
+
+def job_payload(job):
+    """Vista pública de un trabajo"""
+    payload = {key: job.get(key) for key in
+               ('id', 'status', 'symbology', 'lane', 'created_at', 'started_at',
+                'finished_at', 'result', 'callback')}
+    return {key: value for key, value in payload.items() if value is not None}
+
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Encola un escaneo y devuelve su id de inmediato (202).
+
+    Acepta cuerpo binario, multipart 'file', JSON con 'image' (base64) o JSON con 'url';
+    opcionales: 'symbology' (default any), 'callback_url', 'priority' ('low' va al
+    carril lento) y las opciones de decodificación habituales.
+    """
+    client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
+    logger.debug("📥 [/jobs] Nueva petición desde %s", client_ip)
+
+    try:
+        json_data = request.get_json(silent=True) if request.is_json else None
+        symbology = requested_option(json_data, 'symbology') or 'any'
+        if symbology not in DECODE_FUNCTIONS:
+            return jsonify({"error": f"Simbología desconocida: {symbology}"}), 400
+
+        image_data, image_url = raw_image_body(), None
+        if image_data is None:
+            if 'file' in request.files:
+                image_data = request.files['file'].read()
+            elif json_data and json_data.get('image'):
+                image_data = decode_base64_image(json_data['image'])
+            elif json_data and json_data.get('url'):
+                image_url = json_data['url']
+            else:
+                logger.debug("❌ [/jobs] %s - Petición sin imagen", client_ip)
+                return jsonify({"error": "Envía la imagen como cuerpo binario, archivo 'file' o JSON con 'image' (base64) o 'url'"}), 400
+        if image_url is None and not image_data:
+            return jsonify({"error": "Archivo vacío"}), 400
+
+        callback_url = requested_option(json_data, 'callback_url')
+        if callback_url is not None:
+            try:
+                validate_callback_url(callback_url)
+            except InvalidOptionError as e:
+                return jsonify({"error": str(e)}), 400
+
+        if requested_option(json_data, 'priority') == 'low':
+            lane = 'slow'
+        else:
+            lane = job_lane(image_data) if image_data else 'fast'
+        now = time.time()
+        job = {'id': uuid.uuid4().hex, 'status': 'queued', 'symbology': symbology,
+               'lane': lane, 'created_at': now, 'heartbeat_at': now,
+               'callback_url': callback_url}
+        task = functools.partial(run_job, job['id'], symbology, image_data, image_url,
+                                 decode_options(json_data), lane)
+        job_store.create(job)
+        try:
+            job_queue.submit(lane, task)
+        except JobQueueFull as e:
+            job_store.delete(job['id'])
+            logger.debug("🚦 [/jobs] %s - %s", client_ip, e)
+            response = jsonify({"error": str(e)})
+            response.headers['Retry-After'] = str(JOBS_RETRY_AFTER)
+            return response, 429
+        job_heartbeat.track(job['id'])
+
+        logger.debug(
+            "🗂️ [/jobs] %s - Trabajo %s encolado (%s, carril %s)",
+            client_ip, job['id'], symbology, lane)
+        response = jsonify(status_url=f"/jobs/{job['id']}", **job_payload(job))
+        response.headers['Location'] = f"/jobs/{job['id']}"
+        return response, 202
+
+    except Exception as e:
+        logger.error("💥 [/jobs] %s - Error: %s", client_ip, e)
+        return jsonify({"error": f"Error: {str(e)}"}), 500
+
+
+def expire_stale_job(job):
+    """Marca como fallido un trabajo sin terminar cuyo worker no late hace más de
+    JOBS_STALE_AFTER (un trabajo que solo espera en su carril sigue latiendo)"""
+    if (job['status'] not in JOB_FINISHED_STATUSES
+            and time.time() - job_last_seen(job) > JOBS_STALE_AFTER):
+        error = 'Trabajo perdido: el worker que lo ejecutaba terminó'
+        expired = job_store.update(job['id'], unfinished_only=True, status='failed',
+                                   finished_at=time.time(),
+                                   result={'status': 'error', 'error': error})
+        # Si terminó justo ahora, vale su resultado
+        job = expired or job_store.get(job['id']) or job
+    return job
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Estado y resultado de un trabajo"""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(job_payload(expire_stale_job(job)))
+
+
+# ======================================
+# 🎞️ VIDEO Y SECUENCIAS DE FRAMES
+# ======================================
+
+# Frames por segundo que se analizan (0 = todos); el resto ni se convierte a grises
+VIDEO_SAMPLE_FPS = float(os.environ.get('VIDEO_SAMPLE_FPS', 5))
+# Diferencia media (niveles de gris, sobre una miniatura) por debajo de la cual un
+# frame se considera repetido y se omite
+VIDEO_DUPLICATE_THRESHOLD = float(os.environ.get('VIDEO_DUPLICATE_THRESHOLD', 2.0))
+VIDEO_THUMBNAIL_SIZE = (64, 64)
+# Con códigos seguidos, cada cuántos frames analizados se vuelve a buscar en el
+# frame completo (códigos nuevos que entran en escena)
+VIDEO_FULL_SCAN_INTERVAL = int(os.environ.get('VIDEO_FULL_SCAN_INTERVAL', 5))
+# Frames analizados sin leer un código en su región antes de dejar de seguirlo
+VIDEO_TRACK_MAX_MISSES = int(os.environ.get('VIDEO_TRACK_MAX_MISSES', 3))
+# Margen de la región seguida (relativo al tamaño del código) para cubrir el movimiento
+VIDEO_ROI_PADDING = 0.5
+# Plazo de la búsqueda en cada frame completo y del video entero (segundos)
+VIDEO_FRAME_TIMEOUT = float(os.environ.get('VIDEO_FRAME_TIMEOUT', 1.0))
+VIDEO_TIMEOUT = float(os.environ.get('VIDEO_TIMEOUT', 300))
+# Plazo máximo que un cliente puede pedir con 'timeout' en /scan-video
+MAX_VIDEO_TIMEOUT = float(os.environ.get('MAX_VIDEO_TIMEOUT', VIDEO_TIMEOUT))
+VIDEO_MAX_BYTES = int(os.environ.get('VIDEO_MAX_BYTES', 512 * 1024 * 1024))
+# Tipos de cuerpo que se leen como stream MJPEG en vivo (sin esperar al final)
+MJPEG_STREAM_MIMETYPES = ('multipart/x-mixed-replace', 'video/x-motion-jpeg')
+
+
+def iter_capture_frames(path):
+    """Frames de un video (OpenCV/FFmpeg): solo los que se piden se decodifican por completo"""
+    capture = cv2.VideoCapture(path)
+    try:
+        while capture.grab():
+            timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+            def load():
+                _, frame = capture.retrieve()
+                return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            yield timestamp, load
+    finally:
+        capture.release()
+
+
+def iter_sequence_frames(path):
+    """Frames de un GIF animado o un TIFF multipágina (tiempos según la duración del GIF)"""
+    with Image.open(path) as sequence:
+        elapsed = 0.0
+        for frame in ImageSequence.Iterator(sequence):
+            duration = frame.info.get('duration')
+            yield (elapsed if duration is not None else None,
+                   lambda frame=frame: np.asarray(frame.convert('L')))
+            elapsed += (duration or 0) / 1000
+
+
+def iter_mjpeg_frames(chunks, live=False):
+    """Frames JPEG concatenados (MJPEG) a medida que llegan los bytes; en vivo el
+    tiempo de cada frame es el de su llegada"""
+    started = time.monotonic()
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            start = buffer.find(b'\xff\xd8')
+            if start < 0:
+                del buffer[:-1]
+                break
+            end = buffer.find(b'\xff\xd9', start + 2)
+            if end < 0:
+                del buffer[:start]
+                break
+            jpeg = bytes(buffer[start:end + 2])
+            del buffer[:end + 2]
+            yield (time.monotonic() - started if live else None,
+                   lambda jpeg=jpeg: cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8),
+                                                  cv2.IMREAD_GRAYSCALE))
+
+
+def iter_file_frames(path):
+    """Elige el lector según la firma del archivo: GIF/TIFF, MJPEG o video"""
+    with open(path, 'rb') as f:
+        header = f.read(4)
+    if header.startswith(b'GIF8') or header in (b'II*\x00', b'MM\x00*'):
+        return iter_sequence_frames(path)
+    if header.startswith(b'\xff\xd8'):
+        def chunks():
+            with open(path, 'rb') as f:
+                yield from iter(lambda: f.read(FETCH_CHUNK_SIZE), b'')
+        return iter_mjpeg_frames(chunks())
+    return iter_capture_frames(path)
+
+
+class VideoScanner:
+    """Procesa frames en orden: muestrea, omite repetidos, sigue cada código por su
+    región y solo cada tanto busca en el frame completo. Cada código se informa una
+    vez, con el momento en que apareció."""
+
+    def __init__(self, symbology='any', sample_fps=None, thorough=False):
+        self.symbology = symbology
+        sample_fps = VIDEO_SAMPLE_FPS if sample_fps is None else sample_fps
+        self.interval = 1 / sample_fps if sample_fps > 0 else 0
+        self.thorough = thorough
+        self.codes = {}
+        self.tracks = {}
+        self.last_sampled = None
+        self.previous = None
+        self.since_full_scan = 0
+        self.stats = {'read': 0, 'sampled': 0, 'duplicates': 0, 'roi_hits': 0,
+                      'full_scans': 0}
+
+    def feed(self, timestamp, load):
+        """Procesa un frame y devuelve los códigos vistos por primera vez en él"""
+        index = self.stats['read']
+        self.stats['read'] += 1
+        if timestamp is not None and self.last_sampled is not None:
+            if timestamp - self.last_sampled < self.interval:
+                return []
+        self.last_sampled = timestamp
+
+        frame = load()
+        if frame is None:
+            return []
+        thumbnail = cv2.resize(frame, VIDEO_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        if (self.previous is not None and
+                cv2.absdiff(thumbnail, self.previous).mean() < VIDEO_DUPLICATE_THRESHOLD):
+            self.stats['duplicates'] += 1
+            return []
+        self.previous = thumbnail
+        self.stats['sampled'] += 1
+
+        new_codes = []
+        seen = self._scan_tracks(frame, index, timestamp, new_codes)
+        self.since_full_scan += 1
+        if not seen or self.since_full_scan >= VIDEO_FULL_SCAN_INTERVAL:
+            self.since_full_scan = 0
+            self.stats['full_scans'] += 1
+            result = decode_all_result(frame, self.symbology,
+                                       deadline=Deadline(VIDEO_FRAME_TIMEOUT),
+                                       basic_only=not self.thorough)
+            for symbol in result.symbols:
+                if (symbol['type'], symbol['text']) not in seen:
+                    self._register(symbol, index, timestamp, new_codes)
+        return new_codes
+
+    def _scan_tracks(self, frame, index, timestamp, new_codes):
+        """Decodifica solo la región de cada código seguido; devuelve las claves leídas"""
+        seen = set()
+        for key, track in list(self.tracks.items()):
+            if key in seen:
+                continue
+            x0, y0, crop = self._roi(frame, track['rect'])
+            for symbol in self._decode_roi(crop, x0, y0):
+                symbol_key = (symbol['type'], symbol['text'])
+                if symbol_key not in seen:
+                    seen.add(symbol_key)
+                    self._register(symbol, index, timestamp, new_codes)
+            if key in seen:
+                self.stats['roi_hits'] += 1
+            else:
+                track['misses'] += 1
+                if track['misses'] > VIDEO_TRACK_MAX_MISSES:
+                    del self.tracks[key]
+        return seen
+
+    @staticmethod
+    def _roi(frame, rect):
+        pad_x = int(rect['width'] * VIDEO_ROI_PADDING)
+        pad_y = int(rect['height'] * VIDEO_ROI_PADDING)
+        x0, y0 = max(0, rect['left'] - pad_x), max(0, rect['top'] - pad_y)
+        x1 = min(frame.shape[1], rect['left'] + rect['width'] + pad_x)
+        y1 = min(frame.shape[0], rect['top'] + rect['height'] + pad_y)
+        return x0, y0, frame[y0:y1, x0:x1]
+
+    def _decode_roi(self, crop, x0, y0):
+        if crop.size == 0:
+            return []
+        deadline = Deadline(VIDEO_FRAME_TIMEOUT)
+        for variant in ('original', 'otsu'):
+            processed = crop if variant == 'original' else cv2.threshold(
+                crop, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+            symbols = []
+            for current in SYMBOLOGY_DECODERS[self.symbology]:
+                try:
+                    decoded_objects = DECODERS[current](processed, deadline)
+                except Exception as e:
+                    logger.debug("🔧 Decodificación de la región falló: %s", e)
+                    continue
+                for decoded in decoded_objects or []:
+                    points = _decoded_points(decoded, crop.shape) + (x0, y0)
+                    symbol_type = getattr(decoded, 'type', None) or 'DATAMATRIX'
+                    symbols.append(_build_symbol(
+                        decoded.data.decode('utf-8', errors='replace'), symbol_type,
+                        points, 'región seguida'))
+            if symbols:
+                return symbols
+        return []
+
+    def _register(self, symbol, index, timestamp, new_codes):
+        key = (symbol['type'], symbol['text'])
+        self.tracks[key] = {'rect': symbol['rect'], 'misses': 0}
+        code = self.codes.get(key)
+        if code is None:
+            code = {'text': symbol['text'], 'type': symbol['type'],
+                    'first_frame': index, 'first_seen': _round_time(timestamp),
+                    'rect': symbol['rect'], 'frames': 0}
+            self.codes[key] = code
+            new_codes.append(code)
+            logger.debug("🎞️ Código nuevo en el frame %s: '%s'", index, symbol['text'])
+        code['frames'] += 1
+        code['last_frame'] = index
+        code['last_seen'] = _round_time(timestamp)
+
+    def summary(self):
+        return {'codes': list(self.codes.values()), 'count': len(self.codes),
+                'frames': dict(self.stats)}
+
+
+def _round_time(timestamp):
+    return None if timestamp is None else round(timestamp, 3)
+
+
+def scan_frames(frames, scanner, deadline):
+    """Alimenta el scanner con los frames hasta agotarlos o agotar el plazo; genera
+    los códigos nuevos a medida que aparecen"""
+    for timestamp, load in frames:
+        if deadline.expired():
+            scanner.stats['timed_out'] = True
+            logger.debug("⏱️ Plazo agotado tras %s frames", scanner.stats['read'])
+            return
+        yield from scanner.feed(timestamp, load)
+
+
+def remove_spooled(path):
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+
+def spool_upload(stream, max_bytes=None):
+    """Copia el cuerpo a un archivo temporal (OpenCV y PIL leen videos desde disco)"""
+    max_bytes = max_bytes or VIDEO_MAX_BYTES
+    spooled = tempfile.NamedTemporaryFile(prefix='qr_scanner_video_', delete=False)
+    try:
+        size = 0
+        for chunk in iter(lambda: stream.read(FETCH_CHUNK_SIZE), b''):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ImageTooLargeError(f"El video supera el máximo de {max_bytes} bytes")
+            spooled.write(chunk)
+        spooled.close()
+        return spooled.name
+    except Exception:
+        spooled.close()
+        os.unlink(spooled.name)
+        raise
+
+
+def parse_fps(value):
+    """Frames por segundo pedidos por el cliente (0 = todos); None si no se pidió"""
+    if value is None:
+        return None
+    try:
+        fps = float(value)
+    except (TypeError, ValueError):
+        raise InvalidOptionError(f"'fps' debe ser un número de frames por segundo: {value!r}")
+    if not 0 <= fps < float('inf'):
+        raise InvalidOptionError("'fps' debe ser 0 (todos los frames) o mayor")
+    return fps
+
+
+@app.route('/scan-video', methods=['POST'])
+@admission_controlled
+def scan_video():
+    """Escanea un video, GIF animado, TIFF multipágina o stream MJPEG.
+
+    Acepta cuerpo binario o multipart 'file'; opciones: 'symbology' (default any),
+    'fps' (frames analizados por segundo, 0 = todos; 400 si no es un número ≥ 0),
+    'thorough' (búsqueda completa en cada frame), 'timeout' y 'stream' (NDJSON con
+    cada código apenas aparece).
+    """
+    client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
+    logger.debug("📥 [/scan-video] Nueva petición desde %s", client_ip)
+    start_time = time.perf_counter()
+    path = None
+
+    try:
+        symbology = requested_option(None, 'symbology') or 'any'
+        if symbology not in SYMBOLOGY_DECODERS:
+            return jsonify({"error": f"Simbología desconocida: {symbology}"}), 400
+        try:
+            fps = parse_fps(requested_option(None, 'fps'))
+            timeout = parse_timeout(requested_option(None, 'timeout'), MAX_VIDEO_TIMEOUT)
+        except InvalidOptionError as e:
+            return jsonify({"error": str(e)}), 400
+        scanner = VideoScanner(symbology, fps,
+                               thorough=bool(parse_flag(requested_option(None, 'thorough')))
+                               and not g.get('degraded', False))
+        deadline = Deadline(timeout or VIDEO_TIMEOUT, started=g.arrival)
+
+        if request.mimetype in MJPEG_STREAM_MIMETYPES:
+            # Stream en vivo: se procesa mientras llegan los bytes
+            frames = iter_mjpeg_frames(iter(lambda: request.stream.read(FETCH_CHUNK_SIZE), b''),
+                                       live=True)
+        else:
+            if 'file' in request.files:
+                path = spool_upload(request.files['file'].stream)
+            elif request.content_length:
+                path = spool_upload(request.stream)
+            else:
+                logger.debug("❌ [/scan-video] %s - Petición sin video", client_ip)
+                return jsonify({"error": "Envía el video como cuerpo binario o archivo 'file'"}), 400
+            frames = iter_file_frames(path)
+
+        def finish():
+            summary = scanner.summary()
+            summary['processing_time'] = round(time.perf_counter() - start_time, 4)
+            summary['timed_out'] = scanner.stats.pop('timed_out', False)
+            logger.debug(
+                "🎞️ [/scan-video] %s - %s códigos en %s frames (%s analizados, %s búsquedas "
+                "completas) en %.2fs",
+                client_ip, summary['count'], scanner.stats['read'], scanner.stats['sampled'],
+                scanner.stats['full_scans'], summary['processing_time'])
+            return summary
+
+        if parse_flag(requested_option(None, 'stream')):
+            def generate():
+                try:
+                    for code in scan_frames(frames, scanner, deadline):
+                        yield json.dumps({'event': 'code', **code}) + '\n'
+                    yield json.dumps({'event': 'summary', **finish()}) + '\n'
+                finally:
+                    remove_spooled(path)
+            return Response(stream_with_context(generate()),
+                            mimetype='application/x-ndjson')
+
+        try:
+            for _ in scan_frames(frames, scanner, deadline):
+                pass
+        finally:
+            remove_spooled(path)
+        summary = finish()
+        if summary['count']:
+            return jsonify(summary)
+        if summary['timed_out']:
+            return jsonify({"error": "Tiempo de decodificación agotado", **summary}), 504
+        return jsonify({"error": "No se detectó ningún código", **summary}), 404
+
+    except ImageTooLargeError as e:
+        logger.debug("❌ [/scan-video] %s - %s", client_ip, e)
+        remove_spooled(path)
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        logger.error("💥 [/scan-video] %s - Error: %s", client_ip, e)
+        remove_spooled(path)
+        return jsonify({"error": f"Error: {str(e)}"}), 500
+
+
+@app.route('/technique-stats', methods=['GET'])
+def technique_stats_endpoint():
+    """Combinaciones (escala, ángulo, técnica) con más éxitos en producción
+    ('limit': cuántas por simbología, entero ≥ 1; 400 si no lo es)"""
+    limit = request.args.get('limit', '10')
+    if not limit.isdigit() or int(limit) < 1:
+        return jsonify({"error": f"'limit' debe ser un entero mayor que 0: {limit!r}"}), 400
+    limit = int(limit)
+    return jsonify({symbology: technique_stats.top(symbology, limit)
+                    for symbology in SYMBOLOGIES})
+
+
+@app.route('/backend-stats', methods=['GET'])
+def backend_stats_endpoint():
+    """Éxitos y latencia de cada backend QR en este proceso"""
+    return jsonify({'order': QR_BACKEND_ORDER, 'mode': QR_BACKEND_MODE,
+                    'backends': qr_backend_stats.snapshot()})
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats_endpoint():
+    """Contadores de aciertos/fallos y ocupación de la caché de resultados"""
+    return jsonify(result_cache.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas en formato Prometheus"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check"""
+    """Health check; responde 503 si algún endpoint está saturado para que el balanceador
+    derive el tráfico a otra réplica"""
     client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
-    logger.info(f"💚 [/health] Health check desde {client_ip}")
-    return jsonify({"status": "healthy", "service": "qr-scanner", "timestamp": datetime.now().isoformat()})
+    logger.debug("💚 [/health] Health check desde %s", client_ip)
+    with _admission_lock:
+        controllers = dict(_admission_controllers)
+    saturated = any(controller.saturated() for controller in controllers.values())
+    payload = {"status": "saturated" if saturated else "healthy", "service": "qr-scanner",
+               "timestamp": datetime.now().isoformat(),
+               "admission": {endpoint: controller.stats()
+                             for endpoint, controller in controllers.items()},
+               "jobs_waiting": job_queue.stats(),
+               "logs_dropped": DroppingQueueHandler.dropped}
+    return jsonify(payload), 503 if saturated else 200
+
+
+# ======================================
+# 🔥 WARM-UP
+# ======================================
+
+def warm_up():
+    """Carga pyzbar/pylibdmtx/cv2 y ejecuta una decodificación de prueba para evitar el arranque en frío"""
+    start = time.perf_counter()
+    try:
+        rng = np.random.default_rng(0)
+        dummy = (rng.random((LOCALIZATION_MIN_DIMENSION + 1, 64)) * 255).astype(np.uint8)
+        deadline = Deadline(5)
+        locate_candidate_regions(dummy)
+        view = PreprocessGraph().frame('warm-up', dummy[:64], 1.0, 0)
+        for symbology, techniques in TECHNIQUES.items():
+            for technique in techniques:
+                technique.func(view)
+            DECODERS[symbology](view.image, deadline)
+        logger.info(
+            "🔥 Warm-up completado en %.2fs (pid %s)", time.perf_counter() - start, os.getpid())
+    except Exception as e:
+        logger.warning("⚠️ Warm-up incompleto: %s", e)
 
 
 if __name__ == '__main__':
-    import os
     port = int(os.environ.get('PORT', 5000))
-    logger.info(f"🚀 Iniciando QR Scanner Service en puerto {port}")
-    logger.info(f"📋 Endpoints disponibles:")
-    logger.info(f"   🔲 QR CODES:")
-    logger.info(f"   • POST /scan - Multipart form-data")
-    logger.info(f"   • POST /scan-base64 - JSON base64")
-    logger.info(f"   • POST /scan-url - JSON con URL de imagen")
-    logger.info(f"   🔲 DATAMATRIX:")
-    logger.info(f"   • POST /scan-datamatrix - Multipart form-data")
-    logger.info(f"   • POST /scan-datamatrix-base64 - JSON base64")
-    logger.info(f"   • POST /scan-datamatrix-url - JSON con URL de imagen")
-    logger.info(f"   💚 HEALTH:")
-    logger.info(f"   • GET /health - Health check")
-    app.run(host='0.0.0.0', port=port, debug=False)
+    logger.info("🚀 Iniciando QR Scanner Service en puerto %s", port)
+    logger.info("📋 Endpoints disponibles:")
+    logger.info("   🔲 QR CODES:")
+    logger.info("   • POST /scan - Multipart form-data")
+    logger.info("   • POST /scan-base64 - JSON base64")
+    logger.info("   • POST /scan-url - JSON con URL de imagen")
+    logger.info("   🔲 DATAMATRIX:")
+    logger.info("   • POST /scan-datamatrix - Multipart form-data")
+    logger.info("   • POST /scan-datamatrix-base64 - JSON base64")
+    logger.info("   • POST /scan-datamatrix-url - JSON con URL de imagen")
+    logger.info("   🔎 CUALQUIER SIMBOLOGÍA:")
+    logger.info("   • POST /scan-any - QR, DataMatrix o código de barras (file, base64 o URL)")
+    logger.info("   🎞️ VIDEO:")
+    logger.info("   • POST /scan-video - Video, GIF, TIFF multipágina o stream MJPEG")
+    logger.info("   📦 BATCH:")
+    logger.info("   • POST /scan-batch - Multipart 'files' o JSON 'images' (QR)")
+    logger.info("   • POST /scan-datamatrix-batch - Batch DataMatrix")
+    logger.info("   • POST /scan-auto-batch - Batch QR + DataMatrix")
+    logger.info("   🗂️ TRABAJOS:")
+    logger.info("   • POST /jobs - Encola un escaneo (file, base64 o URL) y devuelve su id")
+    logger.info("   • GET /jobs/<id> - Estado y resultado de un trabajo")
+    logger.info("   💚 HEALTH:")
+    logger.info("   • GET /health - Health check")
+    logger.info("   • GET /technique-stats - Técnicas con más éxitos")
+    logger.info("   • GET /backend-stats - Éxitos y latencia de cada backend QR")
+    logger.info("   • GET /cache-stats - Estadísticas de la caché de resultados")
+    logger.info("   • GET /metrics - Métricas Prometheus")
+    warm_up()
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
@@ -0,0 +1,314 @@
+# benchmark.py - Benchmark de velocidad y precisión de los decodificadores
+#
+# Uso:
+#   python benchmark.py run imagenes/ --symbology auto --synthetic 5 -o base.json
+#   python benchmark.py run imagenes/ -o nuevo.json
+#   python benchmark.py run imagenes/ --symbology qr --qr-backends zxing,zbar --qr-backend-mode race
+#   python benchmark.py diff base.json nuevo.json
+#
+# Etiquetas (opcionales) en imagenes/labels.json:
+#   {"qr.jpg": {"symbology": "qr", "text": "..."}, "dm1.jpg": {"symbology": "datamatrix"}}
+# o en imagenes/labels.csv con columnas filename,symbology,text. Sin "text", cualquier
+# decodificación cuenta como acierto.
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# El benchmark no debe contaminar la caché ni las estadísticas de producción
+os.environ.setdefault('CACHE_BACKEND', 'none')
+os.environ.setdefault('ADAPTIVE_ORDERING', '0')
+os.environ.setdefault('TECHNIQUE_STATS_PATH', os.path.join(
+    tempfile.gettempdir(), 'qr_scanner_benchmark_stats.json'))
+
+import cv2
+import numpy as np
+import app
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+
+def load_labels(directory):
+    """Lee labels.json o labels.csv del directorio (nombre de archivo -> etiqueta)"""
+    labels = {}
+    json_path = os.path.join(directory, 'labels.json')
+    csv_path = os.path.join(directory, 'labels.csv')
+    if os.path.exists(json_path):
+        with open(json_path) as f:
+            for name, label in json.load(f).items():
+                labels[name] = label if isinstance(label, dict) else {'text': label}
+    elif os.path.exists(csv_path):
+        with open(csv_path, newline='') as f:
+            for row in csv.DictReader(f):
+                labels[row['filename']] = {'symbology': row.get('symbology') or None,
+                                           'text': row.get('text') or None}
+    return labels
+
+
+def perturb(image, rng):
+    """Genera una variante sintética con desenfoque, ruido, rotación y escala aleatorios"""
+    gray = image
+    params = {
+        'blur': round(rng.uniform(0, 2.5), 2),
+        'noise': round(rng.uniform(0, 12), 1),
+        'rot': round(rng.uniform(-8, 8), 1),
+        'scale': round(rng.uniform(0.5, 1.5), 2),
+    }
+    h, w = gray.shape
+    out = cv2.resize(gray, (max(1, int(w * params['scale'])), max(1, int(h * params['scale']))),
+                     interpolation=cv2.INTER_AREA)
+    h, w = out.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), params['rot'], 1.0)
+    out = cv2.warpAffine(out, matrix, (w, h), borderValue=255)
+    if params['blur'] > 0:
+        out = cv2.GaussianBlur(out, (0, 0), params['blur'])
+    if params['noise'] > 0:
+        noise = np.random.default_rng(rng.randrange(2**32)).normal(0, params['noise'], out.shape)
+        out = np.clip(out + noise, 0, 255).astype(np.uint8)
+    suffix = ','.join(f"{key}={value}" for key, value in params.items())
+    return out, suffix
+
+
+def iter_corpus(directory, default_symbology, synthetic, seed):
+    """Genera (nombre, imagen en grises, etiqueta) para cada imagen y sus variantes sintéticas"""
+    labels = load_labels(directory)
+    rng = random.Random(seed)
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        label = dict(labels.get(name, {}))
+        label.setdefault('symbology', None)
+        label['symbology'] = label['symbology'] or default_symbology
+        label.setdefault('text', None)
+        with open(os.path.join(directory, name), 'rb') as f:
+            image_data = f.read()
+        # Misma carga que el servicio: bytes -> buffer uint8 en grises
+        image, _ = app.load_image_array(image_data)
+        yield name, image, label
+        for _ in range(synthetic):
+            variant, suffix = perturb(image, rng)
+            yield f"{name}#{suffix}", variant, label
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    return round(float(np.percentile(values, pct)), 4)
+
+
+def mean_of(records, field):
+    values = [r[field] for r in records if field in r]
+    return round(float(np.mean(values)), 1) if values else None
+
+
+def summarize(records):
+    """Tasa de decodificación, latencias, intentos hasta el éxito y memoria"""
+    latencies = [r['latency'] for r in records]
+    successes = [r for r in records if r['status'] == 'ok']
+    attempts = [r['attempts'] for r in successes]
+    return {
+        'images': len(records),
+        'decoded': len(successes),
+        'wrong': sum(1 for r in records if r['status'] == 'wrong'),
+        'timed_out': sum(1 for r in records if r['status'] == 'timed_out'),
+        'decode_rate': round(len(successes) / len(records), 4) if records else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+        'latency_p99': percentile(latencies, 99),
+        'latency_mean': round(float(np.mean(latencies)), 4) if latencies else None,
+        'attempts_mean': round(float(np.mean(attempts)), 2) if attempts else None,
+        'attempts_p50': percentile(attempts, 50),
+        'attempts_p95': percentile(attempts, 95),
+        'peak_memory_max': max((r['peak_memory'] for r in records), default=0),
+        # Nodos intermedios calculados/reutilizados y bytes asignados por el preprocesamiento
+        'preprocess_nodes_mean': mean_of(records, 'preprocess_nodes'),
+        'preprocess_reused_mean': mean_of(records, 'preprocess_reused'),
+        'preprocess_bytes_mean': mean_of(records, 'preprocess_bytes'),
+    }
+
+
+def run_benchmark(args):
+    records = []
+    if args.qr_backends:
+        app.QR_BACKEND_ORDER = app._configured_qr_backends(args.qr_backends.split(','))
+    if args.qr_backend_mode:
+        app.QR_BACKEND_MODE = args.qr_backend_mode
+    print(f"🏁 Benchmark sobre {args.directory} (timeout {args.timeout}s, "
+          f"{args.synthetic} variantes sintéticas por imagen)")
+    for name, image, label in iter_corpus(args.directory, args.symbology,
+                                          args.synthetic, args.seed):
+        decode = app.DECODE_FUNCTIONS[label['symbology']]
+        graph = app.PreprocessGraph(image)
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = decode(image, timeout=args.timeout, parallel=args.parallel, graph=graph)
+        latency = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if result.text is None:
+            status = 'timed_out' if result.timed_out else 'not_found'
+        elif label['text'] is not None and result.text != label['text']:
+            status = 'wrong'
+        else:
+            status = 'ok'
+        records.append({
+            'name': name,
+            'symbology': label['symbology'],
+            'status': status,
+            'latency': round(latency, 4),
+            'attempts': result.attempts,
+            'stage': result.stage,
+            'technique': result.technique,
+            'peak_memory': peak,
+            'preprocess_nodes': graph.stats['computed'],
+            'preprocess_reused': graph.stats['reused'],
+            'preprocess_bytes': graph.stats['allocated_bytes'],
+        })
+        icon = {'ok': '✅', 'wrong': '⚠️', 'timed_out': '⏱️'}.get(status, '❌')
+        print(f"{icon} {name}: {status} en {latency:.3f}s ({result.attempts} intentos)")
+
+    by_symbology = {}
+    for record in records:
+        by_symbology.setdefault(record['symbology'], []).append(record)
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'settings': {'directory': args.directory, 'timeout': args.timeout,
+                     'synthetic': args.synthetic, 'seed': args.seed,
+                     'parallel': args.parallel, 'qr_backends': app.QR_BACKEND_ORDER,
+                     'qr_backend_mode': app.QR_BACKEND_MODE},
+        'summary': summarize(records),
+        'by_symbology': {symbology: summarize(items)
+                         for symbology, items in sorted(by_symbology.items())},
+        'qr_backends': app.qr_backend_stats.snapshot(),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'records': records,
+    }
+    print_summary(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados guardados en {args.output}")
+    return 0
+
+
+def print_summary(report):
+    print("\n📊 Resumen")
+    rows = [('total', report['summary'])] + list(report['by_symbology'].items())
+    for label, summary in rows:
+        print(f"   {label:<11} tasa={summary['decode_rate']:.1%} "
+              f"({summary['decoded']}/{summary['images']})  "
+              f"p50={summary['latency_p50']}s p95={summary['latency_p95']}s "
+              f"p99={summary['latency_p99']}s  intentos={summary['attempts_mean']}  "
+              f"pico_mem={summary['peak_memory_max'] / 1e6:.1f}MB  "
+              f"nodos={summary['preprocess_nodes_mean']} "
+              f"reusos={summary['preprocess_reused_mean']} "
+              f"asignado={(summary['preprocess_bytes_mean'] or 0) / 1e6:.1f}MB")
+    for name, stats in report.get('qr_backends', {}).items():
+        print(f"   backend {name:<13} llamadas={stats['calls']} éxitos={stats['hits']} "
+              f"victorias={stats['wins']} errores={stats['errors']} "
+              f"tasa={stats['success_rate']:.1%} latencia_media={stats['mean_latency_ms']}ms")
+    print(f"   RSS máximo: {report['max_rss_kb'] / 1024:.1f}MB")
+
+
+def relative_change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old
+
+
+def diff_runs(args):
+    """Compara dos corridas y falla (exit 1) si hay regresiones"""
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    regressions = []
+    print(f"🔎 {args.base} → {args.new}")
+    groups = ['summary'] + sorted(set(base['by_symbology']) & set(new['by_symbology']))
+    for group in groups:
+        old_summary = base['summary'] if group == 'summary' else base['by_symbology'][group]
+        new_summary = new['summary'] if group == 'summary' else new['by_symbology'][group]
+        label = 'total' if group == 'summary' else group
+        rate_delta = new_summary['decode_rate'] - old_summary['decode_rate']
+        print(f"   {label:<11} tasa {old_summary['decode_rate']:.1%} → "
+              f"{new_summary['decode_rate']:.1%} ({rate_delta:+.1%})")
+        if rate_delta < -args.max_rate_drop:
+            regressions.append(f"{label}: tasa de decodificación {rate_delta:+.1%}")
+
+        for metric in ('latency_p50', 'latency_p95', 'latency_p99', 'attempts_mean',
+                       'preprocess_bytes_mean'):
+            change = relative_change(old_summary.get(metric), new_summary.get(metric))
+            if change is None:
+                continue
+            print(f"   {'':<11} {metric} {old_summary[metric]} → {new_summary[metric]} "
+                  f"({change:+.1%})")
+            if metric.startswith('latency') and change > args.max_latency_regression:
+                regressions.append(f"{label}: {metric} {change:+.1%}")
+
+    old_status = {r['name']: r['status'] for r in base['records']}
+    lost = [r['name'] for r in new['records']
+            if old_status.get(r['name']) == 'ok' and r['status'] != 'ok']
+    for name in lost:
+        print(f"   ❌ Ya no se decodifica: {name}")
+    if lost and not args.allow_lost:
+        regressions.append(f"{len(lost)} imágenes dejaron de decodificarse")
+
+    if regressions:
+        print("\n🚨 Regresiones:")
+        for regression in regressions:
+            print(f"   • {regression}")
+        return 1
+    print("\n✅ Sin regresiones")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de decodificadores QR/DataMatrix')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='Ejecuta el benchmark sobre un directorio de imágenes')
+    run.add_argument('directory')
+    run.add_argument('--symbology', default='auto', choices=sorted(app.DECODE_FUNCTIONS),
+                     help='Simbología para imágenes sin etiqueta (default: auto)')
+    run.add_argument('--synthetic', type=int, default=0,
+                     help='Variantes sintéticas (blur, ruido, rotación, escala) por imagen')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--timeout', type=float, default=app.DECODE_TIMEOUT)
+    run.add_argument('--parallel', action='store_true')
+    run.add_argument('--qr-backends',
+                     help='Backends QR separados por coma, en orden (default: QR_BACKENDS)')
+    run.add_argument('--qr-backend-mode', choices=('order', 'race'),
+                     help='Orden secuencial o carrera entre backends (default: QR_BACKEND_MODE)')
+    run.add_argument('-o', '--output', help='Archivo JSON con los resultados')
+
+    diff = subparsers.add_parser('diff', help='Compara dos corridas')
+    diff.add_argument('base')
+    diff.add_argument('new')
+    diff.add_argument('--max-latency-regression', type=float, default=0.10,
+                      help='Aumento relativo de latencia tolerado (default: 0.10)')
+    diff.add_argument('--max-rate-drop', type=float, default=0.0,
+                      help='Caída absoluta de la tasa de decodificación tolerada')
+    diff.add_argument('--allow-lost', action='store_true',
+                      help='No fallar si alguna imagen deja de decodificarse')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run_benchmark(args)
+    return diff_runs(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
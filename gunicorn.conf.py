@@ -0,0 +1,68 @@
+# gunicorn.conf.py - Modo producción del QR Scanner
+#
+# Workers pre-forkeados (gthread) con reciclado periódico y warm-up de los
+# decodificadores en cada worker. Todo se ajusta por variables de entorno.
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Métricas Prometheus compartidas entre workers; debe definirse antes de importar app.py
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(
+    tempfile.gettempdir(), 'qr_scanner_metrics'))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Procesos worker: cada uno decodifica de forma independiente
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY', min(4, multiprocessing.cpu_count())))
+# app.py elige con esto los backends compartidos entre procesos (trabajos)
+os.environ['SERVER_WORKERS'] = str(workers)
+
+# Hilos por worker: un request lento no bloquea /health ni al resto
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# El control de admisión de app.py deja uno de estos hilos libre para /health
+os.environ['SERVER_THREADS'] = str(threads)
+
+# Reciclar workers tras N requests para acotar el crecimiento de memoria de OpenCV/PIL
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 500))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 50))
+
+# Debe superar el plazo máximo de decodificación (MAX_DECODE_TIMEOUT)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 150))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Importar app.py (cv2, pyzbar, pylibdmtx) una sola vez en el master
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """Limpia las métricas de ejecuciones anteriores"""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def post_fork(server, worker):
+    """Calienta los decodificadores en cada worker antes de aceptar tráfico"""
+    from app import warm_up
+    warm_up()
+
+
+def worker_exit(server, worker):
+    """Guarda las estadísticas de técnicas pendientes al reciclar un worker"""
+    from app import technique_stats
+    technique_stats.flush()
+
+
+def child_exit(server, worker):
+    """Descarta las métricas en vivo (gauges) de un worker terminado"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
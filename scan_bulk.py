@@ -0,0 +1,285 @@
+# scan_bulk.py - Escaneo masivo offline de imágenes con varios procesos
+#
+# Uso:
+#   python scan_bulk.py fotos/ -o resultados.jsonl
+#   python scan_bulk.py 'archivo/2023-*/*.jpg' etiquetas.tar.gz -o resultados.csv --symbology datamatrix
+#   python scan_bulk.py lote.zip --files-from pendientes.txt -o resultados.jsonl --resume
+#
+# Entradas: directorios (recursivos), patrones glob, archivos .tar/.tar.gz/.tgz/.zip
+# o listas de rutas (una por línea, '-' = stdin). Escribe una fila por imagen (CSV o
+# JSONL según la extensión de la salida) con el texto, la etapa y el tiempo de cada una.
+# La salida hace de checkpoint: con --resume se omiten las imágenes ya registradas.
+
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import signal
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# El reprocesamiento masivo no debe llenar la caché de resultados ni tocar las
+# estadísticas de producción, y sus logs van a stderr (sin crear logs/ en el CWD)
+os.environ.setdefault('CACHE_BACKEND', 'none')
+os.environ.setdefault('ADAPTIVE_ORDERING', '0')
+os.environ.setdefault('TECHNIQUE_STATS_PATH', os.path.join(
+    tempfile.gettempdir(), 'qr_scanner_bulk_stats.json'))
+os.environ.setdefault('LOG_FILE', '')
+
+import app
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+ARCHIVE_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz', '.zip')
+# Separador entre el archivo contenedor y el miembro en el identificador de cada imagen
+MEMBER_SEPARATOR = '!'
+CSV_FIELDS = ('item', 'status', 'symbology', 'text', 'count', 'symbols', 'stage',
+              'technique', 'attempts', 'bytes', 'seconds', 'error')
+
+
+def is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_directory(directory):
+    """Rutas de imágenes del árbol, en orden estable para que las corridas sean comparables"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if is_image(name):
+                yield os.path.join(root, name)
+
+
+def iter_tar(path):
+    """Miembros de un tar leídos en streaming (sin índice previo ni extracción a disco)"""
+    with tarfile.open(path, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile() and is_image(member.name):
+                yield f"{path}{MEMBER_SEPARATOR}{member.name}", archive.extractfile(member).read()
+
+
+def iter_zip(path):
+    """Miembros de un zip, descomprimidos de a uno"""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and is_image(info.filename):
+                yield f"{path}{MEMBER_SEPARATOR}{info.filename}", archive.read(info)
+
+
+def iter_file_list(path):
+    """Rutas listadas en un archivo de texto ('-' = stdin), expandidas como cualquier entrada"""
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield from iter_source(line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def iter_source(source):
+    """Genera (identificador, ruta o bytes) para cada imagen de una entrada.
+
+    Las imágenes sueltas viajan como ruta y las lee el proceso que las decodifica;
+    las de un tar/zip se leen aquí de a una y viajan como bytes."""
+    if os.path.isdir(source):
+        for path in iter_directory(source):
+            yield path, path
+    elif source.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(source):
+        yield from (iter_zip if source.lower().endswith('.zip') else iter_tar)(source)
+    elif os.path.isfile(source):
+        yield source, source
+    else:
+        matches = sorted(glob.glob(source, recursive=True))
+        if not matches:
+            app.logger.warning("⚠️ Entrada sin imágenes: %s", source)
+        for match in matches:
+            yield from iter_source(match)
+
+
+def iter_items(sources, files_from=None):
+    for source in sources:
+        yield from iter_source(source)
+    if files_from:
+        yield from iter_file_list(files_from)
+
+
+def init_worker(verbose):
+    # Ctrl+C lo atiende el proceso principal, que deja el checkpoint consistente
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if not verbose:
+        app.logger.setLevel(logging.WARNING)
+
+
+def scan_item(item, payload, symbology, timeout, multi):
+    """Decodifica una imagen en el proceso del pool y devuelve su fila de resultados"""
+    start = time.perf_counter()
+    row = {'item': item}
+    try:
+        if isinstance(payload, bytes):
+            image_data = payload
+        else:
+            with open(payload, 'rb') as f:
+                image_data = f.read()
+        row['bytes'] = len(image_data)
+        result = app.decode_image_bytes(image_data, symbology, multi=multi, timeout=timeout)
+        if result.text:
+            row['status'] = 'ok'
+        else:
+            row['status'] = 'timed_out' if result.timed_out else 'not_found'
+        row.update(symbology=result.symbology, text=result.text, stage=result.stage,
+                   technique=result.technique, attempts=result.attempts)
+        if result.symbols is not None:
+            row.update(symbols=result.symbols, count=len(result.symbols))
+    except Exception as e:
+        row.update(status='error', error=str(e))
+    row['seconds'] = round(time.perf_counter() - start, 4)
+    return row
+
+
+class ResultWriter:
+    """Escribe filas JSONL o CSV a medida que llegan; el archivo sirve de checkpoint"""
+
+    def __init__(self, path, fmt, resume):
+        self.path = path
+        self.fmt = fmt
+        self.done = set()
+        if path == '-':
+            self.stream = sys.stdout
+        else:
+            if resume and os.path.exists(path):
+                self.done = self._load_checkpoint()
+            self.stream = open(path, 'a' if resume else 'w', encoding='utf-8', newline='')
+        self.csv = None
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(self.stream, CSV_FIELDS, extrasaction='ignore')
+            if self.stream is sys.stdout or self.stream.tell() == 0:
+                self.csv.writeheader()
+
+    def _load_checkpoint(self):
+        """Imágenes ya registradas; descarta una última línea cortada por una interrupción"""
+        with open(self.path, 'rb+') as f:
+            content = f.read()
+            complete = content.rfind(b'\n') + 1
+            if complete < len(content):
+                f.truncate(complete)
+        lines = content[:complete].decode('utf-8').splitlines()
+        if self.fmt == 'csv':
+            return {row['item'] for row in csv.DictReader(lines)}
+        return {json.loads(line)['item'] for line in lines if line.strip()}
+
+    def write(self, row):
+        if self.csv:
+            if 'symbols' in row:
+                row = dict(row, symbols=json.dumps(row['symbols'], ensure_ascii=False))
+            self.csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+    def close(self):
+        if self.stream is not sys.stdout:
+            self.stream.close()
+
+
+def run_bulk(args):
+    fmt = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    writer = ResultWriter(args.output, fmt, args.resume)
+    workers = args.workers or os.cpu_count() or 1
+    # Tareas en vuelo acotadas: la memoria no crece con el tamaño del lote
+    max_pending = workers * args.queue_factor
+    counts = {'ok': 0, 'not_found': 0, 'timed_out': 0, 'error': 0}
+    skipped = 0
+    start = time.perf_counter()
+    reported = 0
+
+    def collect(futures):
+        nonlocal reported
+        for future in futures:
+            row = future.result()
+            counts[row['status']] += 1
+            writer.write(row)
+        done = sum(counts.values())
+        if args.progress and done - reported >= args.progress:
+            reported = done
+            print(f"⏳ {done} imágenes ({counts['ok']} con código) en "
+                  f"{time.perf_counter() - start:.1f}s", file=sys.stderr, flush=True)
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                               initargs=(args.verbose,))
+    pending = set()
+    try:
+        for item, payload in iter_items(args.sources, args.files_from):
+            if item in writer.done:
+                skipped += 1
+                continue
+            pending.add(pool.submit(scan_item, item, payload, args.symbology,
+                                    args.timeout, args.multi))
+            if len(pending) >= max_pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+    except KeyboardInterrupt:
+        for future in pending:
+            future.cancel()
+        print("🛑 Interrumpido: vuelve a ejecutar con --resume para continuar",
+              file=sys.stderr)
+        return 130
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+
+    summary = {'event': 'summary', **counts, 'skipped': skipped,
+               'processing_time': round(time.perf_counter() - start, 4)}
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return 0 if counts['ok'] else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Escaneo masivo de directorios, globs, tar/zip o listas de archivos')
+    parser.add_argument('sources', nargs='*',
+                        help='Directorios, patrones glob, archivos de imagen o tar/zip')
+    parser.add_argument('--files-from', metavar='LISTA',
+                        help="Archivo con una entrada por línea ('-' = stdin)")
+    parser.add_argument('-o', '--output', default='-',
+                        help="Archivo de resultados .jsonl o .csv ('-' = stdout en JSONL)")
+    parser.add_argument('--format', choices=('jsonl', 'csv'),
+                        help='Formato de salida (default: según la extensión de --output)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continúa una corrida interrumpida omitiendo lo ya registrado')
+    parser.add_argument('--symbology', default='auto', choices=sorted(app.DECODE_FUNCTIONS))
+    parser.add_argument('--multi', action='store_true',
+                        help='Todos los códigos de cada imagen (no solo el primero)')
+    parser.add_argument('--timeout', type=float, default=app.DECODE_TIMEOUT,
+                        help='Plazo por imagen en segundos (0 = sin límite)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Procesos decodificadores (default: todos los núcleos)')
+    parser.add_argument('--queue-factor', type=int, default=4,
+                        help='Imágenes en vuelo por proceso (default: 4)')
+    parser.add_argument('--progress', type=int, default=100,
+                        help='Informar el avance por stderr cada N imágenes (0 = nunca)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Mostrar los logs del servicio')
+
+    args = parser.parse_args(argv)
+    if not args.sources and not args.files_from:
+        parser.error('indica al menos una entrada o --files-from')
+    if args.resume and args.output == '-':
+        parser.error('--resume necesita un archivo de salida (-o)')
+    if not args.verbose:
+        app.logger.setLevel(logging.WARNING)
+    return run_bulk(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
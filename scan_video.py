@@ -0,0 +1,72 @@
+# scan_video.py - Escaneo de videos y secuencias de frames desde la línea de comandos
+#
+# Uso:
+#   python scan_video.py cinta.mp4 --symbology qr --fps 10
+#   python scan_video.py animacion.gif paginas.tif captura.mjpeg
+#   curl -s http://camara/stream.mjpg | python scan_video.py - --live
+#
+# Imprime una línea JSON por cada código nuevo (con el momento en que apareció) y
+# un resumen por archivo al final.
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+# Los frames de un video no deben llenar la caché de resultados
+os.environ.setdefault('CACHE_BACKEND', 'none')
+
+import app
+
+
+def scan_source(source, args):
+    """Escanea un archivo (o stdin con '-') e imprime los códigos a medida que aparecen"""
+    start = time.perf_counter()
+    if source == '-':
+        frames = app.iter_mjpeg_frames(
+            iter(lambda: sys.stdin.buffer.read(app.FETCH_CHUNK_SIZE), b''), live=args.live)
+    else:
+        frames = app.iter_file_frames(source)
+
+    scanner = app.VideoScanner(args.symbology, args.fps, thorough=args.thorough)
+    deadline = app.Deadline(args.timeout)
+    for code in app.scan_frames(frames, scanner, deadline):
+        print(json.dumps({'event': 'code', 'source': source, **code}, ensure_ascii=False),
+              flush=True)
+
+    summary = scanner.summary()
+    summary.pop('codes')
+    summary['timed_out'] = scanner.stats.pop('timed_out', False)
+    summary['processing_time'] = round(time.perf_counter() - start, 4)
+    print(json.dumps({'event': 'summary', 'source': source, **summary}, ensure_ascii=False),
+          flush=True)
+    return summary['count']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Escanea videos, GIF animados, TIFF multipágina o streams MJPEG')
+    parser.add_argument('sources', nargs='+', help="Archivos a escanear ('-' = MJPEG por stdin)")
+    parser.add_argument('--symbology', default='any', choices=sorted(app.SYMBOLOGY_DECODERS))
+    parser.add_argument('--fps', type=float, default=app.VIDEO_SAMPLE_FPS,
+                        help='Frames analizados por segundo (0 = todos)')
+    parser.add_argument('--thorough', action='store_true',
+                        help='Búsqueda completa (no solo básica) en cada frame completo')
+    parser.add_argument('--timeout', type=float, default=app.VIDEO_TIMEOUT,
+                        help='Plazo por archivo en segundos (0 = sin límite)')
+    parser.add_argument('--live', action='store_true',
+                        help='Stream en vivo por stdin: tiempos según la llegada de cada frame')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Mostrar los logs del servicio (salen por stdout, mezclados con el JSON)')
+
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        app.logger.setLevel(logging.WARNING)
+    found = sum(scan_source(source, args) for source in args.sources)
+    return 0 if found else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
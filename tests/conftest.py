@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Las pruebas no deben escribir logs, caché ni estadísticas en el directorio del servicio
+os.environ.setdefault('LOG_FILE', '')
+os.environ.setdefault('CACHE_BACKEND', 'none')
+os.environ.setdefault('ADAPTIVE_ORDERING', '0')
+os.environ.setdefault('TECHNIQUE_STATS_PATH', os.path.join(
+    tempfile.gettempdir(), 'qr_scanner_test_stats.json'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
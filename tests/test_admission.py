@@ -0,0 +1,36 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def test_last_thread_is_kept_for_health(client, monkeypatch):
+    monkeypatch.setattr(app, 'ADMISSION_MAX_IN_FLIGHT', 1)
+    assert app._take_admission_thread()
+    try:
+        response = client.post('/scan', data=b'x', content_type='image/jpeg')
+        assert response.status_code == 503
+        assert response.headers['Retry-After']
+        assert client.get('/health').status_code == 200
+    finally:
+        app._release_admission_thread()
+    assert app._admission_in_flight == 0
+
+
+@pytest.mark.parametrize('endpoint', ['/scan-batch', '/scan-datamatrix-batch',
+                                      '/scan-auto-batch'])
+def test_batch_endpoints_are_admission_controlled(client, monkeypatch, endpoint):
+    controller = app.admission_controller(endpoint)
+    monkeypatch.setattr(controller, 'max_waiting', 0)
+    taken = [controller.acquire(0) for _ in range(controller.limit)]
+    assert taken == ['full'] * controller.limit
+    try:
+        response = client.post(endpoint, json={'images': ['AAAA']})
+        assert response.status_code == 503
+    finally:
+        for _ in taken:
+            controller.release()
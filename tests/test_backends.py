@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def blank_png():
+    return cv2.imencode('.png', np.full((120, 120), 255, np.uint8))[1].tobytes()
+
+
+@pytest.fixture
+def stub_backend(monkeypatch):
+    calls = []
+
+    def backend(img, deadline):
+        calls.append(img.shape)
+        return [app._qr_symbol('desde-stub', [(10, 10), (50, 10), (50, 50), (10, 50)])]
+
+    monkeypatch.setitem(app.QR_BACKEND_REGISTRY, 'stub', backend)
+    monkeypatch.setattr(app, 'QR_BACKEND_ORDER', ['stub'])
+    return calls
+
+
+@pytest.mark.parametrize('endpoint', ['/scan', '/scan-any'])
+def test_scan_endpoints_use_configured_qr_backends(client, stub_backend, endpoint):
+    response = client.post(endpoint, data=blank_png(), content_type='image/png')
+    assert response.status_code == 200
+    assert response.get_json()['text'] == 'desde-stub'
+    assert stub_backend
+    assert app.qr_backend_stats.snapshot()['stub']['wins'] >= 1
+
+
+def test_any_skips_zbar_when_it_is_not_a_backend(monkeypatch):
+    monkeypatch.setitem(app.QR_BACKEND_REGISTRY, 'empty', lambda img, deadline: [])
+    monkeypatch.setattr(app, 'QR_BACKEND_ORDER', ['empty'])
+    monkeypatch.setattr(app, 'ZBAR_BARCODE_SYMBOLS', ['CODE128'])
+    calls = []
+    monkeypatch.setattr(app, 'decode',
+                        lambda img, symbols=None: calls.append(symbols) or [])
+    assert app._decode_qr_or_barcode(np.zeros((20, 20), np.uint8), app.Deadline()) == []
+    # Solo la llamada de códigos de barras: el QR quedó a cargo del backend configurado
+    assert calls == [['CODE128']]
+
+
+def test_zbar_backend_reports_every_symbology(monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, 'decode', lambda img, **kwargs: calls.append(kwargs) or [])
+    app._qr_backend_zbar(np.zeros((20, 20), np.uint8), app.Deadline())
+    assert calls == [{}]
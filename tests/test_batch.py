@@ -0,0 +1,135 @@
+import base64
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+with open(os.path.join(ROOT, 'qr.jpg'), 'rb') as f:
+    QR_JPG = f.read()
+
+
+class ImageServer(ThreadingHTTPServer):
+    """Servidor local que sirve qr.jpg y cuenta las descargas simultáneas"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ImageHandler)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server_address[1]}{path}'
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path == '/missing.jpg':
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(QR_JPG)))
+            self.end_headers()
+            self.wfile.write(QR_JPG)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ImageServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def test_oversized_batch_is_rejected_without_downloading(client, server):
+    urls = [server.url(f'/{i}.jpg') for i in range(app.BATCH_MAX_ITEMS + 1)]
+    response = client.post('/scan-batch', json={'images': urls})
+    assert response.status_code == 413
+    assert server.requests == 0
+
+
+def test_batch_downloads_urls_with_bounded_concurrency(client, server):
+    urls = [server.url(f'/{i}.jpg') for i in range(6)]
+    response = client.post('/scan-batch', json={'images': urls + [server.url('/missing.jpg')]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [item['status'] for item in results] == ['ok'] * 6 + ['error']
+    assert server.requests == 7
+    assert server.max_active <= app.BATCH_WORKERS
+
+
+def test_batch_item_over_fetch_limit_fails_alone(client, server, monkeypatch):
+    monkeypatch.setattr(app, 'FETCH_MAX_BYTES', len(QR_JPG) - 1)
+    response = client.post('/scan-batch', json={'images': [server.url('/a.jpg')]})
+    assert response.get_json()['results'][0]['status'] == 'error'
+
+
+@pytest.fixture
+def slow_decode(monkeypatch):
+    """decode_image_bytes falso que tarda 0.1s y registra el plazo recibido"""
+    deadlines = []
+
+    def decode(image_data, symbology, deadline=None, **options):
+        deadlines.append(deadline)
+        time.sleep(0.1)
+        return app.DecodeResult(stage='ultra', symbology=symbology)
+
+    monkeypatch.setattr(app, 'decode_image_bytes', decode)
+    return deadlines
+
+
+def test_batch_items_are_capped_by_the_batch_deadline(client, slow_decode, monkeypatch):
+    monkeypatch.setattr(app, 'BATCH_TIMEOUT', 0.25)
+    images = [base64.b64encode(b'imagen').decode()] * (app.BATCH_WORKERS * 4)
+    start = time.monotonic()
+    response = client.post('/scan-batch', json={'images': images, 'timeout': 30})
+    elapsed = time.monotonic() - start
+
+    results = response.get_json()['results']
+    skipped = [item for item in results if item.get('error') == 'Plazo del batch agotado']
+    assert skipped and all(item['status'] == 'timed_out' for item in skipped)
+    assert len(slow_decode) + len(skipped) == len(images)
+    assert all(deadline.seconds <= 0.25 for deadline in slow_decode)
+    assert elapsed < 1.0
+
+
+def test_streamed_batch_cancels_pending_items_on_disconnect(client, slow_decode):
+    images = [base64.b64encode(b'imagen').decode()] * (app.BATCH_WORKERS * 10)
+    response = client.post('/scan-batch', json={'images': images, 'stream': True},
+                           buffered=False)
+    first = next(response.response)
+    assert json.loads(first)['status'] == 'not_found'
+    response.close()
+    time.sleep(0.3)
+    started = len(slow_decode)
+    time.sleep(0.3)
+    # Solo terminan las que ya estaban en curso al desconectarse
+    assert len(slow_decode) == started < len(images)
@@ -0,0 +1,158 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = ('qr.jpg', 'wsp.jpeg', 'dm1.jpg', 'dm2.jpg')
+
+
+def bimodal(low, high, size=(64, 64), seed=0):
+    rng = np.random.default_rng(seed)
+    image = np.where(rng.random(size) < 0.4, low, high).astype(np.float64)
+    return np.clip(image + rng.normal(0, 8, size), 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('name', SAMPLES)
+def test_otsu_level_matches_opencv_on_samples(name):
+    gray = cv2.imread(os.path.join(ROOT, name), cv2.IMREAD_GRAYSCALE)
+    expected, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    assert app._otsu_level(app._histogram(gray)) == int(expected)
+
+
+@pytest.mark.parametrize('low,high', [(30, 200), (90, 140), (0, 255)])
+def test_otsu_level_matches_opencv_on_synthetic(low, high):
+    gray = bimodal(low, high)
+    expected, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    assert app._otsu_level(app._histogram(gray)) == int(expected)
+
+
+def test_otsu_level_of_flat_image():
+    assert app._otsu_level(app._histogram(np.full((8, 8), 128, np.uint8))) == 0
+
+
+def reference_otsu(hist):
+    """Otsu por fuerza bruta en float64, con el mismo desempate que OpenCV (primer máximo)"""
+    hist = hist.astype(np.float64)
+    levels = np.arange(256)
+    best, best_level = -1.0, 0
+    for t in range(255):
+        w0, w1 = hist[:t + 1].sum(), hist[t + 1:].sum()
+        if not w0 or not w1:
+            continue
+        m0 = (hist[:t + 1] * levels[:t + 1]).sum() / w0
+        m1 = (hist[t + 1:] * levels[t + 1:]).sum() / w1
+        between = w0 * w1 * (m0 - m1) ** 2
+        if between > best * (1 + 1e-12):
+            best, best_level = between, t
+    return best_level
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_otsu_level_on_float32_histograms_with_rounding(seed):
+    # Conteos grandes en float32: la suma acumulada final no coincide con hist.sum()
+    rng = np.random.default_rng(seed)
+    hist = (rng.random(256) * 1e7).astype(np.float32)
+    assert app._otsu_level(hist) == reference_otsu(hist)
+
+
+def trimodal(modes=(40, 128, 215), size=(96, 96), seed=0):
+    rng = np.random.default_rng(seed)
+    image = rng.choice(np.array(modes, dtype=np.float64), size=size, p=(0.3, 0.3, 0.4))
+    return np.clip(image + rng.normal(0, 6, size), 0, 255).astype(np.uint8)
+
+
+def reference_multi_otsu(hist):
+    """Multi-Otsu de 3 clases por fuerza bruta; desempate por el primer par (t1, t2)"""
+    hist = hist.astype(np.float64)
+    weighted = hist * np.arange(256)
+    best, best_levels = -1.0, (0, 0)
+    for t1 in range(255):
+        w0, s0 = hist[:t1 + 1].sum(), weighted[:t1 + 1].sum()
+        if not w0:
+            continue
+        for t2 in range(t1 + 1, 255):
+            w1, s1 = hist[t1 + 1:t2 + 1].sum(), weighted[t1 + 1:t2 + 1].sum()
+            w2, s2 = hist[t2 + 1:].sum(), weighted[t2 + 1:].sum()
+            if not w1 or not w2:
+                continue
+            between = s0 ** 2 / w0 + s1 ** 2 / w1 + s2 ** 2 / w2
+            if between > best * (1 + 1e-12):
+                best, best_levels = between, (t1, t2)
+    return best_levels
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_multi_otsu_levels_match_brute_force(seed):
+    hist = app._histogram(trimodal(seed=seed))
+    assert app._multi_otsu_levels(hist) == reference_multi_otsu(hist)
+
+
+def test_multi_otsu_levels_separate_the_three_modes():
+    low, high = app._multi_otsu_levels(app._histogram(trimodal()))
+    assert 40 < low < 128 < high < 215
+
+
+def test_multi_otsu_levels_on_sparse_histogram():
+    # Solo tres niveles presentes: cada clase debe quedar con uno
+    hist = np.zeros(256, np.float32)
+    hist[[10, 100, 200]] = (50, 30, 20)
+    low, high = app._multi_otsu_levels(hist)
+    assert 10 <= low < 100 <= high < 200
+
+
+def test_binarization_levels_of_empty_and_flat_images():
+    assert app._binarization_levels(np.zeros(256, np.float32)) == {}
+    assert app._binarization_levels(app._histogram(np.full((8, 8), 128, np.uint8))) == {}
+
+
+@pytest.mark.parametrize('name', SAMPLES)
+def test_binarization_levels_are_distinct_and_in_priority_order(name):
+    gray = cv2.imread(os.path.join(ROOT, name), cv2.IMREAD_GRAYSCALE)
+    hist = app._histogram(gray)
+    levels = app._binarization_levels(hist)
+    assert levels
+    names = list(levels)
+    assert names == [level for level in app.BINARIZATION_LEVELS if level in levels]
+
+    cdf = np.cumsum(hist) / hist.sum()
+    fractions = [cdf[level] for level in levels.values()]
+    for i, fraction in enumerate(fractions):
+        assert (app.BINARIZATION_MIN_DIFFERENCE <= fraction
+                <= 1 - app.BINARIZATION_MIN_DIFFERENCE)
+        for other in fractions[:i]:
+            assert abs(fraction - other) >= app.BINARIZATION_MIN_DIFFERENCE
+
+
+def test_binarization_levels_keep_otsu_first_on_bimodal_image():
+    hist = app._histogram(bimodal(30, 200))
+    levels = app._binarization_levels(hist)
+    assert next(iter(levels)) == 'otsu'
+    assert levels['otsu'] == app._otsu_level(hist)
+
+
+def test_binarize_matches_opencv_threshold():
+    gray = trimodal()
+    levels = app._binarization_levels(app._histogram(gray))
+    binaries = app._binarize(gray, levels)
+    assert binaries.shape == (len(levels),) + gray.shape
+    assert binaries.dtype == np.uint8
+    for binary, level in zip(binaries, levels.values()):
+        _, expected = cv2.threshold(gray, level, 255, cv2.THRESH_BINARY)
+        assert np.array_equal(binary, expected)
+
+
+def test_binarization_technique_returns_its_level():
+    gray = trimodal()
+    view = app.PreprocessGraph(gray).frame('gray', gray, 1.0, 0)
+    levels = app._binarization_levels(app._histogram(gray))
+    for name in app.BINARIZATION_LEVELS:
+        binary = app.BINARIZATIONS[name](view)
+        if name not in levels:
+            assert binary is None
+            continue
+        _, expected = cv2.threshold(gray, levels[name], 255, cv2.THRESH_BINARY)
+        assert np.array_equal(binary, expected)
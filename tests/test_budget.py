@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import app
+
+
+def blank_image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (300, 300), dtype=np.uint8)
+
+
+def test_pixel_budget_ends_the_search():
+    image = blank_image()
+    unbounded = app.run_strategy_search(image, 'qr', parallel=False,
+                                        graph=app.PreprocessGraph(image, max_pixels=0))
+    assert not unbounded.budget_exhausted
+
+    graph = app.PreprocessGraph(image, max_pixels=4 * image.size)
+    result = app.run_strategy_search(image, 'qr', parallel=False, graph=graph)
+    assert result.budget_exhausted
+    assert result.text is None
+    assert result.attempts < unbounded.attempts
+    assert app.degraded_fields(result) == {'budget_exhausted': True}
+
+
+def test_pixel_budget_ends_the_multi_search():
+    image = blank_image()
+    graph = app.PreprocessGraph(image, max_pixels=4 * image.size)
+    result = app.decode_all_result(image, 'auto', graph=graph)
+    assert result.budget_exhausted
+    assert result.symbols == []
+
+
+def test_budget_exhausted_results_are_not_cached():
+    backend = app.LocalCacheBackend(16, 1 << 20)
+    cache = app.ResultCache(backend, ttl=60, negative_ttl=60)
+    cache.set('key', app.DecodeResult(stage='ultra', budget_exhausted=True))
+    assert backend.get('key') is None
+
+
+
+def test_technique_outputs_count_towards_the_budget():
+    image = blank_image()
+    graph = app.PreprocessGraph(image, max_pixels=0)
+    view = graph.frame('gray', image, 1.0, 0)
+    copy = app.Technique('copia', 0.0, lambda view: view.image.copy(), frozenset())
+    before = graph.stats['allocated_bytes']
+    app._attempt_candidate(graph, 'gray', image, 'qr', (1.0, 0, copy), app.Deadline())
+    assert graph.stats['allocated_bytes'] - before == view.image.size
+
+    # Los nodos del grafo no se cuentan dos veces
+    original = app.Technique('original', 0.0, lambda view: view.image, frozenset())
+    before = graph.stats['allocated_bytes']
+    app._attempt_candidate(graph, 'gray', image, 'qr', (1.0, 0, original), app.Deadline())
+    assert graph.stats['allocated_bytes'] == before
+
+
+def test_technique_output_that_does_not_fit_ends_the_search():
+    image = blank_image()
+    graph = app.PreprocessGraph(image, max_pixels=0)
+    graph.frame('gray', image, 1.0, 0)
+    # Queda lugar para el frame ya calculado pero no para la salida de la técnica
+    graph.max_pixels = graph.stats['allocated_bytes'] + image.size - 1
+    called = []
+    copy = app.Technique('copia', 0.0, lambda view: called.append(1) or view.image.copy(),
+                         frozenset())
+    with pytest.raises(app.PixelBudgetExceeded):
+        app._attempt_candidate(graph, 'gray', image, 'qr', (1.0, 0, copy), app.Deadline())
+    assert called == []
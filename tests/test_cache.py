@@ -0,0 +1,125 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import app
+
+
+def qr_png(text='hola'):
+    code = cv2.QRCodeEncoder.create().encode(text)
+    code = cv2.resize(code, None, fx=6, fy=6, interpolation=cv2.INTER_NEAREST)
+    return cv2.imencode('.png', np.pad(code, 24, constant_values=255))[1].tobytes()
+
+
+def found(text='hola'):
+    return app.DecodeResult(text=text, stage='basic', symbology='qr')
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return app.LocalCacheBackend(100, 1 << 20)
+    return app.SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'), 100, 1 << 20)
+
+
+def test_hit_and_miss(backend):
+    cache = app.ResultCache(backend, ttl=60)
+    key = cache.key(b'imagen', 'qr')
+    assert cache.get(key) is None
+    cache.set(key, found())
+    assert cache.get(key) == {'text': 'hola', 'symbology': 'qr', 'symbols': None}
+    assert cache.get(cache.key(b'otra imagen', 'qr')) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+
+def test_entries_expire_after_ttl(backend):
+    cache = app.ResultCache(backend, ttl=0.05)
+    cache.set('k', found())
+    assert cache.get('k') is not None
+    time.sleep(0.1)
+    assert cache.get('k') is None
+
+
+def test_negative_entries_use_their_own_ttl(backend):
+    cache = app.ResultCache(backend, ttl=60, negative_ttl=0.05)
+    cache.set('k', app.DecodeResult(stage='ultra', symbology='qr'))
+    assert cache.get('k') == {'text': None, 'symbology': 'qr', 'symbols': None}
+    assert cache.stats()['negative_hits'] == 1
+    time.sleep(0.1)
+    assert cache.get('k') is None
+
+
+def test_negative_entries_are_skipped_without_negative_ttl(backend):
+    cache = app.ResultCache(backend, ttl=60, negative_ttl=0)
+    cache.set('k', app.DecodeResult(stage='ultra'))
+    assert backend.get('k') is None
+
+
+def test_timed_out_and_degraded_results_are_not_cached(backend):
+    cache = app.ResultCache(backend, ttl=60, negative_ttl=60)
+    cache.set('a', app.DecodeResult(timed_out=True))
+    cache.set('b', app.DecodeResult(advanced_skipped=True))
+    assert backend.get('a') is None and backend.get('b') is None
+
+
+def test_lru_eviction_by_bytes(backend):
+    value = {'text': 'x' * 100}
+    entry_size = len('k0') + len(app.json.dumps(value))
+    backend.max_bytes = 2 * entry_size
+    backend.set('k0', value, 60)
+    if isinstance(backend, app.SQLiteCacheBackend):
+        time.sleep(0.01)  # accessed_at con resolución de reloj
+    backend.set('k1', value, 60)
+    time.sleep(0.01)
+    assert backend.get('k0') == value  # k0 pasa a ser el más reciente
+    time.sleep(0.01)
+    backend.set('k2', value, 60)
+    assert backend.get('k1') is None
+    assert backend.get('k0') == value and backend.get('k2') == value
+    assert backend.stats() == {'entries': 2, 'bytes': 2 * entry_size}
+
+
+def test_lru_eviction_by_entries():
+    backend = app.LocalCacheBackend(2, 1 << 20)
+    for key in ('a', 'b', 'c'):
+        backend.set(key, {'text': key}, 0)
+    assert backend.get('a') is None
+    assert backend.stats()['entries'] == 2
+
+
+def test_sqlite_round_trip_across_instances(tmp_path):
+    path = str(tmp_path / 'shared' / 'cache.sqlite3')
+    symbols = [{'text': 'a', 'type': 'QRCODE', 'polygon': [[0, 0], [1, 1]]}]
+    app.SQLiteCacheBackend(path, 10, 1 << 20).set(
+        'k', {'text': 'a', 'symbology': 'qr', 'symbols': symbols}, 60)
+    other = app.SQLiteCacheBackend(path, 10, 1 << 20)
+    assert other.get('k') == {'text': 'a', 'symbology': 'qr', 'symbols': symbols}
+    other.clear()
+    assert other.stats() == {'entries': 0, 'bytes': 0}
+
+
+def test_keys_depend_on_content_and_symbology():
+    key = app.ResultCache.key(b'imagen', 'qr')
+    assert key == app.ResultCache.key(b'imagen', 'qr')
+    assert key != app.ResultCache.key(b'imagen', 'datamatrix')
+    assert key != app.ResultCache.key(b'imagen2', 'qr')
+
+
+def test_decode_image_bytes_uses_the_cache_per_option(monkeypatch):
+    cache = app.ResultCache(app.LocalCacheBackend(100, 1 << 20), ttl=60)
+    monkeypatch.setattr(app, 'result_cache', cache)
+    monkeypatch.setattr(app, 'MULTI_MAX_IDLE_ATTEMPTS', 1)
+    image = qr_png()
+
+    first = app.decode_image_bytes(image, 'qr')
+    assert first.text and not first.cached
+    again = app.decode_image_bytes(image, 'qr')
+    assert again.cached and again.text == first.text
+
+    # El modo múltiple es otra clave: no reutiliza el resultado de un solo código
+    multi = app.decode_image_bytes(image, 'qr', multi=True)
+    assert not multi.cached and multi.symbols
+    assert app.decode_image_bytes(image, 'qr', multi=True).cached
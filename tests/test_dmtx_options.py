@@ -0,0 +1,52 @@
+import pytest
+
+import app
+
+
+def hints(edge=None, bounded=False, max_count=1, low_contrast=False):
+    return app.DecodeHints(edge, bounded, max_count, low_contrast)
+
+
+@pytest.mark.parametrize('shape, expected', [((300, 400), 1), ((1600, 1200), 2),
+                                             ((6000, 8000), app.DMTX_MAX_SHRINK)])
+def test_shrink_without_symbol_estimate_follows_image_size(shape, expected):
+    assert app.dmtx_options(shape, hints())['shrink'] == expected
+
+
+@pytest.mark.parametrize('edge, expected', [(50, 1), (400, 2), (5000, app.DMTX_MAX_SHRINK)])
+def test_shrink_keeps_the_symbol_above_the_minimum_edge(edge, expected):
+    assert app.dmtx_options((4000, 4000), hints(edge=edge))['shrink'] == expected
+
+
+def test_edges_bound_the_search_only_in_localized_crops():
+    unbounded = app.dmtx_options((1000, 1000), hints(edge=300))
+    assert 'min_edge' not in unbounded and 'max_edge' not in unbounded
+    bounded = app.dmtx_options((1000, 1000), hints(edge=300, bounded=True))
+    assert bounded['min_edge'] == int(300 / app.DMTX_EDGE_TOLERANCE)
+    assert bounded['max_edge'] == int(300 * app.DMTX_EDGE_TOLERANCE)
+    assert app.dmtx_options((1000, 1000), hints(edge=1, bounded=True))['min_edge'] == 1
+
+
+def test_threshold_and_max_count():
+    assert 'threshold' not in app.dmtx_options((500, 500), hints())
+    assert (app.dmtx_options((500, 500), hints(low_contrast=True))['threshold'] ==
+            app.DMTX_LOW_CONTRAST_THRESHOLD)
+    assert app.dmtx_options((500, 500), hints(max_count=3))['max_count'] == 3
+    assert 'max_count' not in app.dmtx_options((500, 500), hints(max_count=None))
+    assert app.dmtx_options((500, 500), None) == {'shrink': 1}
+
+
+def test_call_timeout_is_a_share_of_the_remaining_budget():
+    assert app.dmtx_timeout_ms(app.Deadline(8)) == pytest.approx(
+        8000 * app.DMTX_CALL_SHARE, abs=20)
+    # Cerca del vencimiento se usa el mínimo por llamada, sin pasarse del plazo
+    assert app.dmtx_timeout_ms(app.Deadline(0.2)) == app.DMTX_MIN_CALL_MS
+    assert app.dmtx_timeout_ms(app.Deadline(0.05)) <= 50
+    assert app.dmtx_timeout_ms(app.Deadline(0.001)) >= 1
+
+
+def test_unlimited_deadline_is_bounded_by_the_datamatrix_budget(monkeypatch):
+    monkeypatch.setattr(app, 'DATAMATRIX_BUDGET', 4)
+    assert app.dmtx_timeout_ms(app.Deadline(0)) == 4000 * app.DMTX_CALL_SHARE
+    monkeypatch.setattr(app, 'DATAMATRIX_BUDGET', 0)
+    assert app.dmtx_timeout_ms(app.Deadline(0)) is None
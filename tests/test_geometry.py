@@ -0,0 +1,86 @@
+import cv2
+import numpy as np
+import pytest
+
+import app
+
+
+def module_block(size=400, modules=12, seed=0):
+    """Bloque de módulos aleatorios con borde sólido y zona de silencio blanca"""
+    rng = np.random.default_rng(seed)
+    grid = np.where(rng.random((modules, modules)) < 0.5, 0, 255).astype(np.uint8)
+    grid[0, :] = grid[:, 0] = grid[-1, :] = grid[:, -1] = 0
+    side = size // 2
+    block = cv2.resize(grid, (side, side), interpolation=cv2.INTER_NEAREST)
+    image = np.full((size, size), 255, np.uint8)
+    start = (size - side) // 2
+    image[start:start + side, start:start + side] = block
+    return image
+
+
+def rotated(image, degrees):
+    h, w = image.shape
+    rotation = cv2.getRotationMatrix2D((w / 2, h / 2), degrees, 1.0)
+    return cv2.warpAffine(image, rotation, (w, h), flags=cv2.INTER_LINEAR,
+                          borderValue=255)
+
+
+def test_plausible_quad_accepts_a_symbol_inside_the_image():
+    quad = [(100, 100), (300, 110), (290, 300), (95, 290)]
+    assert app._plausible_quad(quad, (400, 400))
+
+
+@pytest.mark.parametrize('quad', [
+    None,
+    # Fuera de la imagen
+    [(-100, 100), (300, 100), (300, 300), (-100, 300)],
+    # Cóncavo
+    [(0, 0), (300, 0), (60, 60), (0, 300)],
+    # Demasiado chico
+    [(100, 100), (110, 100), (110, 110), (100, 110)],
+])
+def test_plausible_quad_rejects_implausible_corners(quad):
+    assert not app._plausible_quad(quad, (400, 400))
+
+
+def test_estimate_rectification_skips_upright_symbols():
+    assert app.estimate_rectification(module_block()) is None
+
+
+@pytest.mark.parametrize('degrees', [8, -15, 30])
+def test_estimate_rectification_straightens_a_rotated_block(degrees):
+    image = rotated(module_block(), degrees)
+    assert abs(app._dominant_skew(image)) > 5
+
+    geometry = app.estimate_rectification(image)
+    assert geometry is not None
+    homography, size = geometry
+    straightened = cv2.warpPerspective(image, homography, size, borderValue=255)
+    assert abs(app._dominant_skew(straightened)) < app.DESKEW_MIN_ANGLE + 1
+
+
+@pytest.mark.parametrize('angle', [90, 180, 270])
+def test_frame_to_source_maps_pixel_centers_back(angle):
+    source = np.zeros((30, 50), np.uint8)
+    source[7, 41] = 255
+    graph = app.PreprocessGraph(source)
+    frame = graph.frame('gray', source, 1.0, angle).image
+    fy, fx = np.argwhere(frame == 255)[0]
+
+    matrix = graph.frame_to_source('gray', source, 1.0, angle)
+    point = np.array([[[fx + 0.5, fy + 0.5]]], dtype=np.float64)
+    x, y = cv2.perspectiveTransform(point, matrix).ravel()
+    assert (x, y) == pytest.approx((41.5, 7.5))
+
+
+@pytest.mark.parametrize('angle', [0, 90, 180, 270])
+@pytest.mark.parametrize('scale', [0.5, 2.0])
+def test_frame_to_source_maps_frame_corners_to_source_corners(angle, scale):
+    source = np.zeros((30, 50), np.uint8)
+    graph = app.PreprocessGraph(source)
+    h, w = graph.frame('gray', source, scale, angle).image.shape
+    matrix = graph.frame_to_source('gray', source, scale, angle)
+    corners = np.array([[[0, 0]], [[w, 0]], [[w, h]], [[0, h]]], dtype=np.float64)
+    mapped = cv2.perspectiveTransform(corners, matrix).reshape(-1, 2)
+    expected = {(0, 0), (50, 0), (50, 30), (0, 30)}
+    assert {(round(x, 6), round(y, 6)) for x, y in mapped} == expected
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import app
+
+
+def gradient():
+    return np.tile(np.arange(0, 256, 4, dtype=np.uint8), (16, 1))
+
+
+@pytest.mark.parametrize('mode', ['L', 'LA', 'P', 'RGB', 'RGBA', '1'])
+def test_pil_images_match_convert_l(mode):
+    image = Image.fromarray(gradient()).convert(mode)
+    gray = app._to_gray_array(image)
+    assert gray.dtype == np.uint8 and gray.ndim == 2
+    assert np.array_equal(gray, np.asarray(image.convert('L')))
+
+
+def test_palette_image_uses_gray_values_not_indices():
+    image = Image.fromarray(gradient()).convert('RGB').quantize(8)
+    gray = app._to_gray_array(image)
+    assert gray.max() > 8
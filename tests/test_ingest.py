@@ -0,0 +1,76 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def qr_image(text='cuerpo', module=8):
+    code = cv2.QRCodeEncoder.create().encode(text)
+    return cv2.resize(code, None, fx=module, fy=module, interpolation=cv2.INTER_NEAREST)
+
+
+def encode(image, extension='.png'):
+    return cv2.imencode(extension, image)[1].tobytes()
+
+
+@pytest.mark.parametrize('content_type', ['image/png', 'application/octet-stream'])
+def test_scan_accepts_raw_body(client, content_type):
+    response = client.post('/scan', data=encode(qr_image()), content_type=content_type)
+    assert response.status_code == 200
+    assert response.get_json()['text'] == 'cuerpo'
+
+
+def test_scan_rejects_empty_raw_body(client):
+    response = client.post('/scan', data=b'', content_type='image/png')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Archivo vacío'
+
+
+def test_multipart_upload_still_works(client):
+    response = client.post('/scan', data={'file': (io.BytesIO(encode(qr_image())), 'qr.png')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.get_json()['text'] == 'cuerpo'
+
+
+@pytest.mark.parametrize('max_pixels, factor', [(0, 1), (4_000_000, 1), (1_000_000, 2),
+                                                (100_000, 8)])
+def test_large_jpeg_is_decoded_at_reduced_resolution(max_pixels, factor):
+    data = encode(np.full((2000, 2000), 200, np.uint8), '.jpg')
+    img, applied = app.load_image_array(data, max_pixels=max_pixels)
+    assert applied == factor
+    assert img.shape == (2000 // factor, 2000 // factor)
+    assert img.dtype == np.uint8
+
+
+def test_explicit_factor_skips_the_header_probe(monkeypatch):
+    monkeypatch.setattr(app, '_image_dimensions', lambda data: pytest.fail('leyó la cabecera'))
+    img, factor = app.load_image_array(encode(np.zeros((800, 600), np.uint8), '.jpg'), factor=4)
+    assert (img.shape, factor) == ((200, 150), 4)
+
+
+def test_formats_opencv_cannot_read_are_reduced_through_pil():
+    buffer = io.BytesIO()
+    Image.new('L', (1600, 1200), 128).save(buffer, format='GIF')
+    img, factor = app.load_image_array(buffer.getvalue(), max_pixels=500_000)
+    assert factor == 2
+    assert img.shape == (600, 800)
+
+
+def test_reduced_read_still_decodes(client, monkeypatch):
+    image = np.full((2400, 2400), 255, np.uint8)
+    code = qr_image('reducido', module=24)
+    image[300:300 + code.shape[0], 300:300 + code.shape[1]] = code
+    monkeypatch.setattr(app, 'INGEST_MAX_PIXELS', 1_500_000)
+    response = client.post('/scan', data=encode(image, '.jpg'), content_type='image/jpeg')
+    assert response.status_code == 200
+    assert response.get_json()['text'] == 'reducido'
@@ -0,0 +1,101 @@
+import os
+import time
+
+import pytest
+
+import app
+
+QR_JPG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'qr.jpg')
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = app.SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'), ttl=60)
+    monkeypatch.setattr(app, 'job_store', store)
+    return store
+
+
+def test_memory_backend_is_refused_with_several_workers(monkeypatch):
+    monkeypatch.setattr(app, 'SERVER_WORKERS', 4)
+    with pytest.raises(ValueError):
+        app.create_job_store('memory')
+
+
+def test_stale_running_job_is_reported_failed(store, monkeypatch):
+    monkeypatch.setattr(app, 'JOBS_STALE_AFTER', 10)
+    store.create({'id': 'viejo', 'status': 'running', 'created_at': time.time() - 11})
+    store.create({'id': 'nuevo', 'status': 'running', 'created_at': time.time()})
+    client = app.app.test_client()
+    assert client.get('/jobs/viejo').get_json()['status'] == 'failed'
+    assert store.get('viejo')['finished_at']
+    assert client.get('/jobs/nuevo').get_json()['status'] == 'running'
+
+
+def test_low_priority_url_job_stays_in_slow_lane(store, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app, 'download_image', lambda url: open(QR_JPG, 'rb').read())
+    monkeypatch.setattr(app.job_queue, 'submit', lambda lane, task, force=False:
+                        submitted.append(lane))
+    monkeypatch.setattr(app, 'scan_batch_item', lambda *args: {
+        'index': 0, 'name': 'x', 'status': 'not_found'})
+    store.create({'id': 'lento', 'status': 'queued', 'created_at': time.time()})
+    app.run_job('lento', 'qr', None, 'http://ejemplo/qr.jpg', {}, 'slow')
+    assert submitted == []
+    assert store.get('lento')['status'] == 'done'
+
+
+def test_waiting_job_with_recent_heartbeat_is_not_stale(store, monkeypatch):
+    monkeypatch.setattr(app, 'JOBS_STALE_AFTER', 10)
+    store.create({'id': 'espera', 'status': 'queued', 'created_at': time.time() - 60,
+                  'heartbeat_at': time.time() - 60})
+    app.job_heartbeat.track('espera')
+    try:
+        app.job_heartbeat.beat()
+    finally:
+        app.job_heartbeat.untrack('espera')
+    client = app.app.test_client()
+    assert client.get('/jobs/espera').get_json()['status'] == 'queued'
+
+
+def test_expired_job_is_not_run_or_overwritten(store, monkeypatch):
+    monkeypatch.setattr(app, 'JOBS_STALE_AFTER', 10)
+    scanned = []
+    monkeypatch.setattr(app, 'scan_batch_item', lambda *args: scanned.append(args) or {
+        'index': 0, 'name': 'x', 'status': 'ok', 'text': 'tarde'})
+    store.create({'id': 'perdido', 'status': 'queued', 'created_at': time.time() - 11})
+    client = app.app.test_client()
+    assert client.get('/jobs/perdido').get_json()['status'] == 'failed'
+
+    app.run_job('perdido', 'qr', b'imagen', None, {}, 'fast')
+    assert scanned == []
+    app.finish_job('perdido', 'fast', {'status': 'ok', 'text': 'tarde'})
+    job = store.get('perdido')
+    assert job['status'] == 'failed' and job['result']['status'] == 'error'
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1:8080/hook', 'http://localhost/hook', 'http://10.0.0.5/hook',
+    'http://169.254.169.254/latest/meta-data', 'http://[::1]/hook',
+    'ftp://93.184.216.34/hook', 'file:///etc/passwd', 'http:///sin-host',
+])
+def test_internal_or_non_http_callbacks_are_rejected(store, url):
+    client = app.app.test_client()
+    response = client.post('/jobs', json={'image': 'aGVsbG8=', 'callback_url': url})
+    assert response.status_code == 400
+    assert 'callback_url' in response.get_json()['error']
+
+
+def test_public_and_allowlisted_callbacks_are_accepted(monkeypatch):
+    assert app.validate_callback_url('https://93.184.216.34/hook')
+    monkeypatch.setattr(app, 'JOBS_CALLBACK_HOSTS', {'localhost'})
+    assert app.validate_callback_url('http://localhost:9000/hook')
+
+
+def test_webhook_to_internal_address_is_not_sent(store, monkeypatch):
+    posts = []
+    monkeypatch.setattr(app.get_http_session(), 'post', lambda *a, **k: posts.append(a))
+    store.create({'id': 'cb', 'status': 'done', 'created_at': time.time(),
+                  'callback_url': 'http://127.0.0.1/hook'})
+    app.send_job_webhook(store.get('cb'))
+    assert posts == []
+    assert store.get('cb')['callback'] == 'rejected'
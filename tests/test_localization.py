@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+
+import app
+
+
+def qr(text, module=6):
+    code = cv2.QRCodeEncoder.create().encode(text)
+    return cv2.resize(code, None, fx=module, fy=module, interpolation=cv2.INTER_NEAREST)
+
+
+def scene(position=(1100, 700), size=(1200, 1600)):
+    """Fondo en degradé con rayas horizontales (bordes en una sola dirección) y un QR"""
+    h, w = size
+    image = np.tile(np.linspace(90, 200, w, dtype=np.float64), (h, 1))
+    image[::40] = 30
+    image = image.astype(np.uint8)
+    code = qr('localizado')
+    x, y = position
+    image[y:y + code.shape[0], x:x + code.shape[1]] = code
+    return image, (x, y, code.shape[1], code.shape[0])
+
+
+def contains(region, box):
+    x, y, w, h = region
+    bx, by, bw, bh = box
+    return x <= bx and y <= by and x + w >= bx + bw and y + h >= by + bh
+
+
+def test_strongest_region_covers_the_code():
+    image, box = scene()
+    regions = app.locate_candidate_regions(image)
+    assert regions
+    assert contains(regions[0], box)
+    for x, y, w, h in regions:
+        assert x >= 0 and y >= 0 and x + w <= image.shape[1] and y + h <= image.shape[0]
+
+
+def test_region_count_is_bounded():
+    image, _ = scene()
+    assert len(app.locate_candidate_regions(image, max_regions=1)) == 1
+
+
+def test_one_directional_edges_are_not_candidates():
+    image, _ = scene()
+    image[:, 1000:] = image[:, :600].copy()  # sin el QR: solo rayas y degradé
+    assert app.locate_candidate_regions(image) == []
+
+
+def test_small_or_disabled_images_are_not_localized(monkeypatch):
+    image, _ = scene(position=(100, 100), size=(600, 700))
+    assert app.localized_crops(app.PreprocessGraph(image)) == []
+    big, _ = scene()
+    monkeypatch.setattr(app, 'LOCALIZATION_ENABLED', False)
+    assert app.localized_crops(app.PreprocessGraph(big)) == []
+
+
+def test_search_decodes_the_localized_crop_first():
+    image, box = scene()
+    result = app.run_strategy_search(image, 'qr', app.Deadline(30), parallel=False)
+    assert result.text == 'localizado'
+    assert result.technique.startswith('región=')
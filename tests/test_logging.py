@@ -0,0 +1,26 @@
+import json
+import logging
+from logging.handlers import RotatingFileHandler, WatchedFileHandler
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('workers,handler_type', [(1, RotatingFileHandler),
+                                                  (4, WatchedFileHandler)])
+def test_file_handler_depends_on_worker_count(tmp_path, monkeypatch, workers, handler_type):
+    monkeypatch.setattr(app, 'LOG_FILE', str(tmp_path / 'qr_scanner.log'))
+    monkeypatch.setattr(app, 'SERVER_WORKERS', workers)
+    handlers = app._log_handlers()
+    assert type(handlers[-1]) is handler_type
+    for handler in handlers:
+        handler.close()
+
+
+def test_json_formatter_uses_summary_fields():
+    record = logging.LogRecord('app.requests', logging.INFO, __file__, 1, '%s', ('x',), None)
+    record.fields = {'event': 'request', 'status': 200}
+    entry = json.loads(app.JsonFormatter().format(record))
+    assert entry['event'] == 'request' and entry['status'] == 200
+    assert 'message' not in entry
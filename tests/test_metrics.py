@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cada proceso hace un /scan con un backend QR fijo y lee /metrics, como un worker de gunicorn
+WORKER = """
+import cv2, numpy as np, app
+app.QR_BACKEND_REGISTRY['stub'] = lambda img, deadline: [
+    app._qr_symbol('desde-stub', [(10, 10), (50, 10), (50, 50), (10, 50)])]
+app.QR_BACKEND_ORDER[:] = ['stub']
+client = app.app.test_client()
+png = cv2.imencode('.png', np.full((120, 120), 255, np.uint8))[1].tobytes()
+assert client.post('/scan', data=png, content_type='image/png').status_code == 200
+print(client.get('/metrics').get_data(as_text=True))
+"""
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app.QR_BACKEND_REGISTRY, 'stub', lambda img, deadline: [
+        app._qr_symbol('desde-stub', [(10, 10), (50, 10), (50, 50), (10, 50)])])
+    monkeypatch.setattr(app, 'QR_BACKEND_ORDER', ['stub'])
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    return app.app.test_client()
+
+
+def blank_png():
+    return cv2.imencode('.png', np.full((120, 120), 255, np.uint8))[1].tobytes()
+
+
+def sample(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_metrics_exposes_request_and_backend_series(client):
+    assert client.post('/scan', data=blank_png(), content_type='image/png').status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == app.CONTENT_TYPE_LATEST
+    text = response.get_data(as_text=True)
+    assert sample(text, 'qr_scanner_requests_total{endpoint="/scan",outcome="ok"}') >= 1
+    assert sample(text, 'qr_scanner_qr_backend_calls_total{backend="stub",outcome="hit"}') >= 1
+    assert 'qr_scanner_request_duration_seconds_bucket{endpoint="/scan"' in text
+    assert 'qr_scanner_technique_wins_total{' in text
+
+
+def test_metrics_requests_are_not_counted(client):
+    client.get('/metrics')
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'endpoint="/metrics"' not in text
+
+
+def test_multiprocess_mode_aggregates_every_worker(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    outputs = []
+    for _ in range(2):
+        completed = subprocess.run([sys.executable, '-c', WORKER], cwd=ROOT, env=env,
+                                   capture_output=True, text=True, timeout=120)
+        assert completed.returncode == 0, completed.stderr
+        outputs.append(completed.stdout)
+    assert os.listdir(tmp_path)
+    # El segundo worker también ve la request del primero
+    assert sample(outputs[0], 'qr_scanner_requests_total{endpoint="/scan",outcome="ok"}') == 1
+    assert sample(outputs[1], 'qr_scanner_requests_total{endpoint="/scan",outcome="ok"}') == 2
@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+
+import app
+
+
+def qr(text, module=4):
+    code = cv2.QRCodeEncoder.create().encode(text)
+    return cv2.resize(code, None, fx=module, fy=module, interpolation=cv2.INTER_NEAREST)
+
+
+def canvas(placements, size=(400, 600)):
+    image = np.full(size, 255, np.uint8)
+    for text, (x, y) in placements:
+        code = qr(text)
+        image[y:y + code.shape[0], x:x + code.shape[1]] = code
+    return image
+
+
+def test_every_distinct_code_is_returned_once_with_its_position():
+    placements = [('primero', (30, 40)), ('segundo', (420, 250)), ('primero', (300, 30))]
+    image = canvas(placements)
+    result = app.decode_all_result(image, 'qr', timeout=20)
+
+    texts = sorted(symbol['text'] for symbol in result.symbols)
+    assert texts == ['primero', 'segundo']
+    assert result.text == result.symbols[0]['text']
+
+    second = next(symbol for symbol in result.symbols if symbol['text'] == 'segundo')
+    # Caja de los módulos oscuros (el código generado trae su zona de silencio)
+    ys, xs = np.nonzero(qr('segundo') == 0)
+    left, top = 420 + xs.min(), 250 + ys.min()
+    side = xs.max() - xs.min() + 1
+    rect = second['rect']
+    assert abs(rect['left'] - left) <= 6 and abs(rect['top'] - top) <= 6
+    assert abs(rect['width'] - side) <= 10 and abs(rect['height'] - side) <= 10
+    assert len(second['polygon']) == 4
+    assert second['type'] == 'QRCODE'
+
+
+def test_positions_are_scaled_back_from_reduced_loads():
+    symbols = [{'rect': {'left': 10, 'top': 5, 'width': 20, 'height': 20},
+                'polygon': [[10, 5], [30, 5], [30, 25], [10, 25]]}]
+    app._scale_symbols(symbols, 4)
+    assert symbols[0]['rect'] == {'left': 40, 'top': 20, 'width': 80, 'height': 80}
+    assert symbols[0]['polygon'][2] == [120, 100]
+
+
+def test_datamatrix_rects_are_flipped_to_top_left_origin():
+    class Decoded:
+        rect = (10, 20, 30, 40)
+        polygon = None
+        type = None
+    points = app._decoded_points(Decoded(), (200, 100))
+    # libdmtx mide 'top' desde abajo: 200 - 20 - 40 = 140
+    assert points.tolist() == [[10, 140], [40, 140], [40, 180], [10, 180]]
+
+
+def test_multi_endpoint_returns_symbols():
+    image = canvas([('primero', (30, 40)), ('segundo', (420, 250))])
+    body = cv2.imencode('.png', image)[1].tobytes()
+    response = app.app.test_client().post('/scan?multi=1', data=body,
+                                          content_type='image/png')
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['count'] == 2
+    assert sorted(symbol['text'] for symbol in payload['symbols']) == ['primero', 'segundo']
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('value', ['0', '-3', 'abc', 'nan', 'inf'])
+def test_invalid_timeout_is_rejected_before_decoding(client, value):
+    response = client.post(f'/scan?timeout={value}', data=b'x', content_type='image/jpeg')
+    assert response.status_code == 400
+    assert 'timeout' in response.get_json()['error']
+
+
+def test_invalid_timeout_in_json_body(client):
+    response = client.post('/scan-base64', json={'image': 'AAAA', 'timeout': 0})
+    assert response.status_code == 400
+
+
+def test_timeout_is_capped():
+    assert app.parse_timeout('1e9', app.MAX_DECODE_TIMEOUT) == app.MAX_DECODE_TIMEOUT
+    assert app.parse_timeout(2, 10) == 2.0
+    assert app.parse_timeout(None, 10) is None
+    assert app.parse_timeout('50', 0) == 50.0
+
+
+def blank_png():
+    return cv2.imencode('.png', np.full((120, 120), 255, np.uint8))[1].tobytes()
+
+
+@pytest.mark.parametrize('endpoint', ['/scan-datamatrix', '/scan-any'])
+def test_datamatrix_budget_reports_the_effective_timeout(client, monkeypatch, endpoint):
+    monkeypatch.setattr(app, 'DATAMATRIX_BUDGET', 5)
+    response = client.post(f'{endpoint}?timeout=30', data=blank_png(),
+                           content_type='image/png')
+    assert response.status_code in (404, 504)
+    assert response.get_json()['effective_timeout'] == 5
+    response = client.post(f'{endpoint}?timeout=4', data=blank_png(),
+                           content_type='image/png')
+    assert 'effective_timeout' not in response.get_json()
+
+
+def test_auto_does_not_report_the_datamatrix_stage_budget(monkeypatch):
+    monkeypatch.setattr(app, 'DATAMATRIX_BUDGET', 5)
+    image = np.full((120, 120), 255, np.uint8)
+    assert app.decode_datamatrix_result(image, timeout=30).effective_timeout == 5
+    assert app.decode_auto_result(image, timeout=30).effective_timeout is None
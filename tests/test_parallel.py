@@ -0,0 +1,67 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import app
+
+Decoded = app.QRSymbol
+
+
+@pytest.fixture
+def plan():
+    def technique(i):
+        return app.Technique(f't{i}', 0.0, None, frozenset())
+    return [(1.0, 0, technique(i)) for i in range(100)]
+
+
+def test_first_success_cancels_the_remaining_candidates(plan, monkeypatch):
+    monkeypatch.setattr(app, 'DECODE_POOL_SIZE', 4)
+    started = []
+    lock = threading.Lock()
+
+    def attempt(candidate):
+        with lock:
+            started.append(candidate[2].name)
+        time.sleep(0.02)
+        if candidate[2].name == 't5':
+            return [Decoded(b'hallado', 'QRCODE', (0, 0, 1, 1), [])]
+        return None
+
+    result = app.DecodeResult(stage='ultra', symbology='qr')
+    app._parallel_search(plan, attempt, 'qr', app.Deadline(10), result)
+    assert result.text == 'hallado'
+    assert 'técnica=t5' in result.technique
+
+    time.sleep(0.2)
+    # Solo las variantes ya encoladas en la ventana llegan a correr (y cortan al ver
+    # la señal de parada); el resto del plan nunca se envía al pool
+    assert len(started) <= 5 + app.DECODE_POOL_SIZE * 2
+    assert result.attempts == len(started)
+    assert not result.timed_out
+
+
+def test_deadline_ends_a_parallel_search_without_success(plan, monkeypatch):
+    monkeypatch.setattr(app, 'DECODE_POOL_SIZE', 4)
+
+    def attempt(candidate):
+        time.sleep(0.05)
+        return None
+
+    result = app.DecodeResult(stage='ultra', symbology='qr')
+    start = time.monotonic()
+    app._parallel_search(plan, attempt, 'qr', app.Deadline(0.2), result)
+    assert result.timed_out and result.text is None
+    assert time.monotonic() - start < 1.0
+    assert result.attempts < len(plan)
+
+
+def test_parallel_and_sequential_searches_agree(monkeypatch):
+    monkeypatch.setattr(app, 'DECODE_POOL_SIZE', 4)
+    rng = np.random.default_rng(1)
+    image = rng.integers(0, 256, (200, 200), dtype=np.uint8)
+    sequential = app.run_strategy_search(image, 'qr', app.Deadline(30), parallel=False)
+    parallel = app.run_strategy_search(image, 'qr', app.Deadline(30), parallel=True)
+    assert sequential.text is None and parallel.text is None
+    assert sequential.attempts == parallel.attempts
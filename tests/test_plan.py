@@ -0,0 +1,12 @@
+import app
+
+
+def test_any_uses_datamatrix_geometry():
+    angles = {angle for _, angle, _ in app.plan_candidates('any')}
+    assert angles == set(app.SYMBOLOGIES['datamatrix']['angles'])
+
+
+def test_any_runs_libdmtx_only_at_datamatrix_scales():
+    config = app.SYMBOLOGIES['any']
+    dmtx_scales = set(config['scales']) - set(config['zbar_only_scales'])
+    assert dmtx_scales == set(app.SYMBOLOGIES['datamatrix']['scales'])
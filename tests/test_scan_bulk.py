@@ -0,0 +1,85 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import zipfile
+
+import scan_bulk
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_tar(path, members):
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def test_iter_tar_streams_image_members(tmp_path):
+    path = str(tmp_path / 'lote.tar.gz')
+    write_tar(path, {'a/1.jpg': b'uno', 'notas.txt': b'x', 'b/2.PNG': b'dos'})
+    assert list(scan_bulk.iter_source(path)) == [
+        (f'{path}!a/1.jpg', b'uno'), (f'{path}!b/2.PNG', b'dos')]
+
+
+def test_iter_zip_reads_image_members(tmp_path):
+    path = str(tmp_path / 'lote.zip')
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('carpeta/', b'')
+        archive.writestr('carpeta/1.jpeg', b'uno')
+        archive.writestr('leeme.md', b'x')
+    assert list(scan_bulk.iter_source(path)) == [(f'{path}!carpeta/1.jpeg', b'uno')]
+
+
+def test_iter_directory_is_sorted_and_recursive(tmp_path):
+    for name in ('b.jpg', 'a.png', 'sub/c.jpg', 'sub/d.txt'):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_bytes(b'x')
+    items = [item for item, _ in scan_bulk.iter_source(str(tmp_path))]
+    assert items == [str(tmp_path / name) for name in ('a.png', 'b.jpg', 'sub/c.jpg')]
+
+
+def test_resume_drops_a_truncated_jsonl_line(tmp_path):
+    path = tmp_path / 'resultados.jsonl'
+    path.write_text('{"item": "a.jpg", "status": "ok"}\n'
+                    '{"item": "b.jpg", "status": "ok"}\n'
+                    '{"item": "c.jp', encoding='utf-8')
+    writer = scan_bulk.ResultWriter(str(path), 'jsonl', resume=True)
+    assert writer.done == {'a.jpg', 'b.jpg'}
+    writer.write({'item': 'c.jpg', 'status': 'not_found'})
+    writer.close()
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['item'] for line in lines] == ['a.jpg', 'b.jpg', 'c.jpg']
+
+
+def test_resume_drops_a_truncated_csv_row(tmp_path):
+    path = tmp_path / 'resultados.csv'
+    writer = scan_bulk.ResultWriter(str(path), 'csv', resume=False)
+    writer.write({'item': 'a.jpg', 'status': 'ok', 'text': 'hola'})
+    writer.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('b.jpg,o')
+
+    writer = scan_bulk.ResultWriter(str(path), 'csv', resume=True)
+    assert writer.done == {'a.jpg'}
+    writer.write({'item': 'b.jpg', 'status': 'ok'})
+    writer.close()
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert len(lines) == 3 and lines[0].startswith('item,') and lines[2].startswith('b.jpg,')
+
+
+def test_bulk_run_leaves_no_logs_or_stats_behind(tmp_path):
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('LOG_FILE', 'TECHNIQUE_STATS_PATH', 'ADAPTIVE_ORDERING',
+                          'CACHE_BACKEND')}
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    completed = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'scan_bulk.py'), os.path.join(ROOT, 'qr.jpg'),
+         '-o', 'resultados.jsonl', '--workers', '1', '--progress', '0'],
+        cwd=tmp_path, env=env, capture_output=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    assert sorted(os.listdir(tmp_path)) == ['resultados.jsonl']
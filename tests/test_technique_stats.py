@@ -0,0 +1,68 @@
+import json
+import os
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def stats(tmp_path, monkeypatch):
+    stats = app.TechniqueStats(str(tmp_path / 'stats' / 'technique_stats.json'))
+    monkeypatch.setattr(app, 'technique_stats', stats)
+    monkeypatch.setattr(app, 'ADAPTIVE_ORDERING', True)
+    return stats
+
+
+def test_recorded_wins_move_to_the_front_of_the_plan(stats):
+    baseline = app.plan_candidates('qr')
+    datamatrix = app.plan_candidates('datamatrix')
+    scale, angle, technique = baseline[len(baseline) // 2]
+    assert baseline[0] != (scale, angle, technique)
+    for _ in range(50):
+        stats.record('qr', scale, angle, technique.name)
+    assert app.plan_candidates('qr')[0] == (scale, angle, technique)
+    # Las otras simbologías no se reordenan
+    assert app.plan_candidates('datamatrix') == datamatrix
+
+
+def test_flush_merges_counts_from_several_processes(stats, tmp_path):
+    stats.record('qr', 1.0, 0, 'otsu')
+    stats.flush()
+    # Otro proceso con su propia vista del mismo archivo
+    other = app.TechniqueStats(stats.path)
+    other.record('qr', 1.0, 0, 'otsu')
+    other.record('datamatrix', 2.0, 0, 'original')
+    other.flush()
+    stats.record('qr', 1.0, 0, 'otsu')
+    stats.flush()
+
+    with open(stats.path) as f:
+        assert json.load(f) == {'qr|1.0|0|otsu': 3, 'datamatrix|2.0|0|original': 1}
+    assert stats.top('qr') == [{'scale': '1.0', 'angle': '0', 'technique': 'otsu',
+                                'hits': 3}]
+    assert not [name for name in os.listdir(tmp_path / 'stats') if name.endswith('.tmp')]
+
+
+def test_pending_wins_survive_an_unwritable_path(tmp_path):
+    blocker = tmp_path / 'archivo'
+    blocker.write_text('')
+    stats = app.TechniqueStats(str(blocker / 'stats.json'))
+    stats.record('qr', 1.0, 0, 'otsu')
+    stats.flush()
+    assert stats.pending == {'qr|1.0|0|otsu': 1}
+    assert stats.top('qr')[0]['hits'] == 1
+
+
+@pytest.mark.parametrize('limit', ['abc', '0', '-1', '1.5'])
+def test_invalid_limit_is_rejected(limit):
+    response = app.app.test_client().get(f'/technique-stats?limit={limit}')
+    assert response.status_code == 400
+
+
+def test_limit_bounds_the_ranking(stats):
+    for technique in ('otsu', 'clahe', 'unsharp'):
+        stats.record('qr', 1.0, 0, technique)
+    body = app.app.test_client().get('/technique-stats?limit=2').get_json()
+    assert len(body['qr']) == 2
+    assert body['datamatrix'] == []
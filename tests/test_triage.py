@@ -0,0 +1,65 @@
+import dataclasses
+
+import cv2
+import numpy as np
+
+import app
+
+
+def qr_scene(module, size):
+    code = cv2.QRCodeEncoder.create().encode('triage')
+    code = cv2.resize(code, None, fx=module, fy=module, interpolation=cv2.INTER_NEAREST)
+    image = np.full((size, size), 255, np.uint8)
+    image[40:40 + code.shape[0], 40:40 + code.shape[1]] = code
+    return image
+
+
+def first_position(plan, predicate):
+    return next(i for i, candidate in enumerate(plan) if predicate(*candidate))
+
+
+def test_sharp_clean_image_demotes_deblur_and_denoise():
+    profile = app.analyze_image(qr_scene(20, 1200))
+    assert {'deblur', 'denoise'} <= profile.demoted_tags
+    assert profile.code_located
+
+
+def test_blurred_image_keeps_deblur():
+    profile = app.analyze_image(cv2.GaussianBlur(qr_scene(20, 1200), (0, 0), 6))
+    assert 'deblur' not in profile.demoted_tags
+
+
+def test_sharp_profile_moves_deblur_techniques_after_plain_ones():
+    profile = app.analyze_image(qr_scene(20, 1200))
+    plan = app.plan_candidates('qr', profile)
+    deblur = first_position(plan, lambda scale, angle, technique: 'deblur' in technique.tags)
+    plain = [i for i, (scale, angle, technique) in enumerate(plan)
+             if scale == 1.0 and angle == 0 and not technique.tags]
+    assert deblur > max(plain)
+    assert deblur > first_position(app.plan_candidates('qr'),
+                                   lambda scale, angle, technique: 'deblur' in technique.tags)
+
+
+def test_large_code_moves_upscaling_after_unscaled_candidates():
+    profile = app.analyze_image(qr_scene(20, 1200))
+    assert profile.code_size >= app.TRIAGE_LARGE_CODE
+    medium = dataclasses.replace(profile, code_size=app.TRIAGE_LARGE_CODE - 1)
+    upscaled = lambda scale, angle, technique: scale > 1.0
+    assert (first_position(app.plan_candidates('qr', profile), upscaled) >
+            first_position(app.plan_candidates('qr', medium), upscaled))
+    technique = app.TECHNIQUES['qr'][0]
+    assert profile.penalty(2.0, technique) == app.TRIAGE_DEMOTION * medium.penalty(2.0, technique)
+
+
+def test_small_code_is_not_downscaled_first():
+    profile = app.analyze_image(qr_scene(5, 300))
+    assert profile.code_size < app.TRIAGE_SMALL_CODE
+    plan = app.plan_candidates('qr', profile)
+    assert plan[0][0] >= 1.0
+    assert profile.penalty(0.5, plan[0][2]) > profile.penalty(1.0, plan[0][2])
+
+
+def test_triage_disabled_returns_no_profile(monkeypatch):
+    image = qr_scene(20, 1200)
+    monkeypatch.setattr(app, 'TRIAGE_ENABLED', False)
+    assert app.image_profile(app.PreprocessGraph(image), 'gray', image) is None
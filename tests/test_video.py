@@ -0,0 +1,42 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app
+
+
+def animated_gif(count=4):
+    frames = [Image.fromarray(np.full((64, 64), i * 40, np.uint8)) for i in range(count)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:])
+    return buffer.getvalue()
+
+
+def test_streamed_scan_holds_admission_slot_until_closed():
+    controller = app.admission_controller('/scan-video')
+    response = app.app.test_client().post('/scan-video?stream=1', data=animated_gif(),
+                                          content_type='image/gif', buffered=False)
+    assert controller.active == 1
+    response.get_data()
+    response.close()
+    assert controller.active == 0
+
+
+def test_video_timeout_is_capped():
+    assert app.parse_timeout(1e9, app.MAX_VIDEO_TIMEOUT) == app.MAX_VIDEO_TIMEOUT
+
+
+@pytest.mark.parametrize('query', ['fps=abc', 'fps=-1', 'fps=nan', 'fps=inf', 'timeout=abc'])
+def test_invalid_video_options_are_rejected(query):
+    response = app.app.test_client().post(f'/scan-video?{query}', data=animated_gif(),
+                                          content_type='image/gif')
+    assert response.status_code == 400
+    assert app.admission_controller('/scan-video').active == 0
+
+
+def test_fps_zero_means_every_frame():
+    assert app.parse_fps('0') == 0
+    assert app.parse_fps(None) is None
+    assert app.VideoScanner('qr', app.parse_fps('0')).interval == 0